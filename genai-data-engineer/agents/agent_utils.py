@@ -58,5 +58,10 @@ def parse_plan_steps(data: dict) -> list:
     steps_data = plan.get("steps", [])
     return [PlanStep(**step_data) for step_data in steps_data]
 
+def usage_update(*responses) -> dict:
+    # LLM call records attached by utils_llm.llm, appended to the request's usage by its reducer
+    from utils_llm.llm import get_call_record
+    return {"calls": [r for r in (get_call_record(resp) for resp in responses) if r]}
+
 # Load configuration once at module import
 AGENT_STATE_REF = load_agent_state_ref()
\ No newline at end of file
@@ -1,9 +1,10 @@
 import logging
 import json
 from langchain_core.messages import AIMessage
-from state.state import AgentState, AnalysisSummary
-from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response
-from utils_llm.llm import call_llm, get_text_content
+from state.state import AgentState, AnalysisSummary, ExecutionOutput
+from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response, usage_update
+from utils_llm.llm import call_llm, acall_llm, get_text_content
+from utils.blob_store import load_content
 
 logger = logging.getLogger(__name__)
 
@@ -13,44 +14,49 @@ def load_analyzer_state_ref():
 
 ANALYZER_STATE_REF = load_analyzer_state_ref()
 
-def analyzer_agent(state: AgentState) -> dict:
-    logger.info("Analyzer analyzing results for current step")
-    step = next((s for s in state.plan.steps if not s.completed and not s.failed), None)
+def _get_analyzer_step(state: AgentState):
+    step = state.plan.current_step()
     if not step:
         logger.warning("Analyzer called but no pending step found")
-        return {}
-    
+    return step
+
+
+def _prompt_output(output):
+    # File bytes (inline or spilled to the blob store) are only resolved for the prompt
+    if not isinstance(output, ExecutionOutput):
+        return output
+    dumped = output.model_dump(exclude={"content", "content_ref"})
+    content = load_content(output)
+    if content is not None:
+        dumped["content"] = content.decode("utf-8", errors="replace")
+    return dumped
+
+
+def _build_analyzer_prompt(state: AgentState, step) -> str:
     logger.info(f"STEP_ID = {step.step_id}")
 
-    execution = next((e for e in state.execution.executions if e.step_id == step.execution_outputs_step_id), None)
+    execution = state.execution.latest(step.execution_outputs_step_id)
     if execution:
-        outputs = [
-            o.model_dump() if hasattr(o, "model_dump") else o
-            for o in execution.output_content
-        ]
-        logger.info(f"EXECUTION OUTPUTS = {outputs}")
+        logger.info(f"EXECUTION OUTPUTS = {[o.model_dump(exclude={'content'}) if isinstance(o, ExecutionOutput) else o for o in execution.output_content]}")
+        outputs = [_prompt_output(o) for o in execution.output_content]
     else:
         outputs = []
         logger.info(f"No execution found for step {step.step_id}")
 
     template = load_prompt_template("analyzer")
-    prompt = build_prompt(template, {
+    return build_prompt(template, {
         "step_description": step.description,
         "outputs": outputs,
         "context": state.request.original_prompt,
         "agent_state_ref": ANALYZER_STATE_REF
     })
 
-    response = call_llm(agent_name="analyzer", prompt=prompt)
+
+def _analyzer_update(state: AgentState, step, response) -> dict:
     raw_response = get_text_content(response)
     logger.info(f"Raw LLM response: {raw_response}")
     analysis_data = parse_json_response(raw_response)
 
-    updated_steps = [
-        s.model_copy(update={"completed": True}) if s.step_id == step.step_id else s
-        for s in state.plan.steps
-    ]
-
     logger.info(f"Analysis complete for step {step.step_id}")
 
     return {
@@ -58,9 +64,27 @@ def analyzer_agent(state: AgentState) -> dict:
             "analysis": AnalysisSummary(**analysis_data),
             "outputs": state.results.outputs
         },
-        "plan": {
-            **state.plan.model_dump(),
-            "steps": [s.model_dump() for s in updated_steps]
-        },
-        "messages": state.messages + [AIMessage(content=raw_response)]
-    }
\ No newline at end of file
+        "plan": {"step_patches": {step.step_id: {"completed": True}}},
+        "messages": [AIMessage(content=raw_response)],
+        "usage": usage_update(response)
+    }
+
+
+def analyzer_agent(state: AgentState) -> dict:
+    logger.info("Analyzer analyzing results for current step")
+    step = _get_analyzer_step(state)
+    if not step:
+        return {}
+
+    response = call_llm(agent_name="analyzer", prompt=_build_analyzer_prompt(state, step))
+    return _analyzer_update(state, step, response)
+
+
+async def aanalyzer_agent(state: AgentState) -> dict:
+    logger.info("Analyzer analyzing results for current step")
+    step = _get_analyzer_step(state)
+    if not step:
+        return {}
+
+    response = await acall_llm(agent_name="analyzer", prompt=_build_analyzer_prompt(state, step))
+    return _analyzer_update(state, step, response)
@@ -2,8 +2,8 @@ import logging
 import json
 from langchain_core.messages import AIMessage
 from state.state import AgentState, ErrorRefinement, CodeProposal, CallFunction
-from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response
-from utils_llm.llm import call_llm, get_text_content
+from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response, usage_update
+from utils_llm.llm import call_llm, acall_llm, get_text_content
 from utils.get_tool_descriptions import get_tools_description
 from utils.tools import AVAILABLE_TOOLS
 
@@ -16,23 +16,25 @@ def load_error_refiner_state_ref():
 ERROR_REFINER_STATE_REF = load_error_refiner_state_ref()
 
 
-def error_refiner_agent(state: AgentState) -> dict:
-    logger.info("Error refiner analyzing failed step")
-
-    step = next((s for s in state.plan.steps if s.failed), None)
+def _get_failed_step(state: AgentState):
+    step = state.plan.first_failed_step()
     if not step:
         logger.warning("Error refiner called but no failed step found")
-        return {}
+    return step
+
 
+def _build_error_refiner_prompt(step) -> str:
     template = load_prompt_template("error_refiner")
-    prompt = build_prompt(template, {
+    return build_prompt(template, {
         "step_description": step.description,
         "error_message": step.error,
         "code": step.code.content if step.code else "N/A",
+        "cost_estimate": step.cost_estimate.model_dump_json(exclude={"estimated_at"}) if step.cost_estimate else "N/A",
         "agent_state_ref": ERROR_REFINER_STATE_REF
     })
 
-    response = call_llm(agent_name="error_refiner", prompt=prompt)
+
+def _error_refiner_update(state: AgentState, step, response) -> dict:
     raw_response = get_text_content(response)
     logger.info(f"Raw LLM response: {raw_response}")
     refinements = parse_json_response(raw_response)
@@ -43,22 +45,35 @@ def error_refiner_agent(state: AgentState) -> dict:
         resolutions=refinements.get("resolutions")
     )
 
-    updated_steps = [
-        s.model_copy(update={
+    logger.info(f"Error analysis complete for step {step.step_id}")
+
+    return {
+        "plan": {"step_patches": {step.step_id: {
             "failed": False,
             "completed": False,
             "error": None,
             "error_refinement": error_refinement
-        }) if s.step_id == step.step_id else s
-        for s in state.plan.steps
-    ]
+        }}},
+        "messages": [AIMessage(content=raw_response)],
+        "usage": usage_update(response)
+    }
 
-    logger.info(f"Error analysis complete for step {step.step_id}")
 
-    return {
-        "plan": {
-            **state.plan.model_dump(),
-            "steps": [s.model_dump() for s in updated_steps]
-        },
-        "messages": state.messages + [AIMessage(content=raw_response)]
-    }
\ No newline at end of file
+def error_refiner_agent(state: AgentState) -> dict:
+    logger.info("Error refiner analyzing failed step")
+    step = _get_failed_step(state)
+    if not step:
+        return {}
+
+    response = call_llm(agent_name="error_refiner", prompt=_build_error_refiner_prompt(step))
+    return _error_refiner_update(state, step, response)
+
+
+async def aerror_refiner_agent(state: AgentState) -> dict:
+    logger.info("Error refiner analyzing failed step")
+    step = _get_failed_step(state)
+    if not step:
+        return {}
+
+    response = await acall_llm(agent_name="error_refiner", prompt=_build_error_refiner_prompt(step))
+    return _error_refiner_update(state, step, response)
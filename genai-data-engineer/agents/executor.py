@@ -1,102 +1,187 @@
 """
 Executor Agent Flow:
-1. check to see if call function = READ_FILE and if so invoke directly and return resullt (never reaches steps 2 or 3).
-2. check to see if step is a ToolMessage and if so parse and return result 
-3. If call_function != READ_FILE and no existing ToolMessage in last step, call LLM with prompt
+1. check to see if the step can be dispatched directly and if so invoke the tool and return result (never reaches steps 2 or 3).
+   READ_FILE is always invoked directly; other tools are when direct_dispatch is enabled and the
+   plan step's args validate against the tool's args_schema.
+2. check to see if the last messages are the ToolMessages answering this step's tool call and if so parse and return result
+3. If the step could not be dispatched directly and no existing ToolMessage in last step, call LLM with prompt.
+   With executor.context.mode "step" the prompt holds only the current step and summaries of its
+   dependencies' outputs; the message history stays in state but is not sent.
 """
 import json
 import logging
 from datetime import datetime
-from langchain_core.messages import HumanMessage, ToolMessage
-from state.state import AgentState, ExecutionRecord, CallFunction
-from utils_llm.llm import get_llm
-from utils.tools import AVAILABLE_TOOLS, read_file
+from typing import Any, Dict, Optional, Tuple, List
+from pydantic import ValidationError
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from state.state import AgentState, ExecutionRecord, ExecutionOutput, CallFunction
+from utils_llm.llm import invoke_llm, ainvoke_llm
+from utils.tools import AVAILABLE_TOOLS
+from agents.agent_utils import usage_update
+from utils.load_yaml_config import get_workflow_config
+from utils.query_cost import guard_tool_args
 
 logger = logging.getLogger(__name__)
 
-llm_with_tools = get_llm("executor", tools=AVAILABLE_TOOLS)
+TOOLS_BY_NAME = {t.name: t for t in AVAILABLE_TOOLS}
+
+def _direct_dispatch_args(state: AgentState, step) -> Optional[dict]:
+    """
+    Build the tool args for a step from what the generator already wrote
+    (call_function_args, generated SQL, project_id) and validate them against the
+    tool's args_schema. Returns None when the LLM has to work out the tool call.
+    """
+    tool = TOOLS_BY_NAME.get(step.call_function.value)
+    if not tool or not tool.args_schema:
+        return None
+    if step.call_function != CallFunction.READ_FILE and not get_workflow_config("executor").get("direct_dispatch", True):
+        return None
+
+    fields = tool.args_schema.model_fields
+    args = dict(step.call_function_args)
+    if list(fields) == ["params"] and "params" not in args:
+        args = {"params": args}
+    if "sql" in fields and step.code and step.code.language.lower() == "sql" and step.code.content:
+        # the reviewed code wins over any sql echoed into the args
+        args["sql"] = step.code.content
+    if "project_id" in fields and not args.get("project_id"):
+        args["project_id"] = state.meta.project_id
+
+    try:
+        tool.args_schema.model_validate(args)
+    except ValidationError as e:
+        logger.info(f"Step {step.step_id} args do not match {tool.name} schema, falling back to LLM: {e}")
+        return None
+    return args
+
+
+def _direct_dispatch_completed(state: AgentState, step, output, started_at: datetime) -> dict:
+    record = ExecutionRecord(
+        step_id=step.step_id,
+        action_ref=step.code.content[:100] if step.code else str(step.call_function.value),
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        success=True,
+        output_content=[output]
+    )
+    logger.info(f"Step {step.step_id} completed via direct {step.call_function.value} invocation")
+    return {
+        "execution": {"executions": [record]},
+        "plan": {"step_patches": {step.step_id: {"completed": True}}},
+    }
+
+
+def _direct_dispatch_failed(state: AgentState, step, e: Exception, started_at: datetime) -> dict:
+    logger.error(f"Step {step.step_id} {step.call_function.value} failed: {e}")
+    record = ExecutionRecord(
+        step_id=step.step_id,
+        action_ref=step.code.content[:100] if step.code else str(step.call_function.value),
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        success=False,
+        error=str(e),
+        output_content=[str(e)]
+    )
+    return {
+        "execution": {"executions": [record]},
+        "plan": {"step_patches": {step.step_id: {"failed": True, "error": str(e)}}},
+    }
 
 
-def _get_output_content(latest_tool_result: ToolMessage, step) -> list:
+def _tool_results(state: AgentState, step) -> List[ToolMessage]:
     """
-    read file functions invoked directly rather than tool handoff.
-    done to ensure content is passed through correctly.
+    Trailing ToolMessages, if they answer the tool call the executor made for this step.
+    A previous step's results (still the last messages when the next step starts) are ignored.
     """
-    if step.call_function == CallFunction.READ_FILE:
+    results = []
+    for message in reversed(state.messages):
+        if isinstance(message, ToolMessage):
+            results.append(message)
+            continue
+        if isinstance(message, AIMessage) and message.response_metadata.get("step_id") == step.step_id:
+            return list(reversed(results))
+        break
+    return []
+
+
+def _tool_output(message: ToolMessage) -> Any:
+    # Tools returning dicts (execute_query) reach the ToolMessage as JSON; keep them structured
+    if message.status != "error" and isinstance(message.content, str):
         try:
-            full_result = read_file.invoke(step.call_function_args)
-            return [full_result]
-        except Exception as e:
-            logger.warning(f"Could not retrieve full file content: {e}")
-    return [latest_tool_result.content]
+            data = json.loads(message.content)
+        except ValueError:
+            return message.content
+        if isinstance(data, dict):
+            return data
+    return message.content
 
 
-def executor_agent(state: AgentState) -> dict:
-    step = next((s for s in state.plan.steps if not s.completed and not s.failed), None)
-    if not step:
-        logger.info("No pending steps found")
-        return {}
-    logger.info(f"Executing step {step.step_id}: {step.call_function}")
-    last_message = state.messages[-1] if state.messages else None
+def _tool_result_update(state: AgentState, step, tool_results: List[ToolMessage]) -> dict:
+    errors = [m.content for m in tool_results if m.status == "error"]
+    failed = bool(errors)
+    success = not failed
+    error_msg = "; ".join(str(e) for e in errors) if failed else None
+
+    record = ExecutionRecord(
+        step_id=step.step_id,
+        action_ref=step.code.content[:100] if step.code else str(step.call_function.value),
+        started_at=datetime.utcnow(),
+        finished_at=datetime.utcnow(),
+        success=success,
+        error=error_msg,
+        output_content=[_tool_output(m) for m in tool_results]
+    )
+    logger.info(f"Step {step.step_id} {'completed' if success else 'failed'}")
+    return {
+        "execution": {"executions": [record]},
+        "plan": {"step_patches": {step.step_id: {"completed": success, "failed": failed, "error": error_msg}}},
+    }
+
 
-    # Handle read_file directly - bypass ToolNode to preserve bytes
-    if step.call_function == CallFunction.READ_FILE and not isinstance(last_message, ToolMessage):
+def _context_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("executor").get("context") or {}
+    return {
+        "mode": cfg.get("mode", "step"),
+        "max_output_chars": int(cfg.get("max_output_chars", 2000)),
+        "preview_rows": int(cfg.get("preview_rows", 5)),
+    }
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars] + "...(truncated)"
+
+
+def _summarize_output(output, cfg: Dict[str, Any]) -> Any:
+    # What a later step's tool call may need from an output: where it is and its shape, never the bytes
+    if isinstance(output, dict):
         try:
-            full_result = read_file.invoke(step.call_function_args)
-            record = ExecutionRecord(
-                step_id=step.step_id,
-                action_ref=str(step.call_function.value),
-                started_at=datetime.utcnow(),
-                finished_at=datetime.utcnow(),
-                success=True,
-                output_content=[full_result]
-            )
-            updated_steps = [
-                s.model_copy(update={"completed": True}) if s.step_id == step.step_id else s
-                for s in state.plan.steps
-            ]
-            logger.info(f"Step {step.step_id} completed via direct read_file invocation")
-            return {
-                "execution": {"executions": state.execution.executions + [record]},
-                "plan": {**state.plan.model_dump(), "steps": [s.model_dump() for s in updated_steps]},
-            }
-        except Exception as e:
-            logger.error(f"Step {step.step_id} read_file failed: {e}")
-            updated_steps = [
-                s.model_copy(update={"failed": True, "error": str(e)}) if s.step_id == step.step_id else s
-                for s in state.plan.steps
-            ]
-            return {
-                "plan": {**state.plan.model_dump(), "steps": [s.model_dump() for s in updated_steps]},
-            }
+            output = ExecutionOutput.model_validate(output)
+        except ValidationError:
+            return _truncate(json.dumps(output, default=str), cfg["max_output_chars"])
+    if not isinstance(output, ExecutionOutput):
+        return _truncate(str(output), cfg["max_output_chars"])
+    summary = {"type": output.type, "uri": output.uri, "description": output.description}
+    if output.preview:
+        summary["total_rows"] = output.preview.total_rows
+        summary["columns"] = [f"{c.name}:{c.type}" for c in output.preview.columns]
+        summary["rows"] = output.preview.rows[:cfg["preview_rows"]]
+    if output.content_ref or output.content:
+        summary["content_bytes"] = output.content_ref.size if output.content_ref else len(output.content)
+    text = json.dumps(summary, default=str)
+    return summary if len(text) <= cfg["max_output_chars"] else _truncate(text, cfg["max_output_chars"])
 
-    # Returning from ToolNode
-    if isinstance(last_message, ToolMessage):
-        failed = last_message.status == "error"
-        success = not failed
-        error_msg = None if success else last_message.content
-
-        record = ExecutionRecord(
-            step_id=step.step_id,
-            action_ref=step.code.content[:100] if step.code else str(step.call_function.value),
-            started_at=datetime.utcnow(),
-            finished_at=datetime.utcnow(),
-            success=success,
-            error=error_msg,
-            output_content=[last_message.content]
-        )
-        updated_steps = [
-            s.model_copy(update={"completed": success, "failed": failed, "error": error_msg})
-            if s.step_id == step.step_id else s
-            for s in state.plan.steps
-        ]
-        logger.info(f"Step {step.step_id} {'completed' if success else 'failed'}")
-        return {
-            "execution": {"executions": state.execution.executions + [record]},
-            "plan": {**state.plan.model_dump(), "steps": [s.model_dump() for s in updated_steps]},
-        }
 
-    # Ask LLM to make a tool call
+def _dependency_summaries(state: AgentState, step, cfg: Dict[str, Any]) -> Dict[str, list]:
+    summaries = {}
+    for dep_id in sorted(state.plan.dependencies(step.step_id)):
+        record = state.execution.latest(dep_id)
+        if record and record.success:
+            summaries[dep_id] = [_summarize_output(o, cfg) for o in record.output_content]
+    return summaries
+
+
+def _build_tool_call_messages(state: AgentState, step) -> list:
+    cfg = _context_config()
     prompt = f"""Execute the following step using the available tools.
     Step ID: {step.step_id}
     Description: {step.description}
@@ -105,12 +190,194 @@ def executor_agent(state: AgentState) -> dict:
     Code: {step.code.content if step.code else 'N/A'}
     Project ID: {state.meta.project_id}
     """
-    messages = state.messages + [HumanMessage(content=prompt)]
-    response = llm_with_tools.invoke(messages)
+    if cfg["mode"] == "full":
+        return state.messages + [HumanMessage(content=prompt)]
+
+    # Only this step and what it depends on: prompt size stays flat as the plan and history grow
+    dependencies = _dependency_summaries(state, step, cfg)
+    if dependencies:
+        prompt += f"Outputs of the steps it depends on: {json.dumps(dependencies, default=str)}\n"
+    return [HumanMessage(content=prompt)]
+
+
+def _auto_approved(state: AgentState) -> bool:
+    decision = next((d for d in reversed(state.meta.approval_decisions) if d.stage == "generation"), None)
+    return decision is not None and decision.decision == "auto_approved"
+
+
+def _executor_tools(state: AgentState, step) -> list:
+    """
+    Tools the LLM fallback may call for a step. When the approval policy approved execution
+    it vetted each step's call_function, so the step gets only that tool.
+    """
+    if not _auto_approved(state):
+        return AVAILABLE_TOOLS
+    tool = TOOLS_BY_NAME.get(step.call_function.value)
+    return [tool] if tool else []
+
+
+def _guard_tool_calls(state: AgentState, response, tools: list, concurrent: int = 1):
+    # The bytes-billed limit is injected here; it is hidden from the LLM's tool schema
+    allowed = {t.name for t in tools}
+    for tool_call in response.tool_calls:
+        if tool_call["name"] not in allowed:
+            raise ValueError(f"Executor LLM called {tool_call['name']}, which this step may not use")
+        tool_call["args"] = guard_tool_args(state, tool_call["name"], tool_call["args"], concurrent)
+
+
+def _tool_call_update(state: AgentState, step, messages: list, response) -> dict:
+    try:
+        _guard_tool_calls(state, response, _executor_tools(state, step))
+    except Exception as e:
+        return {**_direct_dispatch_failed(state, step, e, datetime.utcnow()), "usage": usage_update(response)}
+    # Tags the tool-call pair, so the ToolMessages that follow are matched to this step
+    response.response_metadata["step_id"] = step.step_id
+    # The history is already in state; append only this step's prompt and the response
+    update = {"messages": [messages[-1], response], "usage": usage_update(response)}
+    if not response.tool_calls:
+        # Fail the step so it goes to refine; left pending, execute would pick it up again forever
+        failed = _direct_dispatch_failed(state, step, ValueError("Executor LLM produced no tool calls"), datetime.utcnow())
+        return {**update, **failed}
+    logger.info(f"Step {step.step_id} invoking tools: {[t['name'] for t in response.tool_calls]}")
+    return update
+
+
+def _get_pending_step(state: AgentState):
+    step = state.plan.current_step()
+    if not step:
+        logger.info("No pending steps found")
+        return None
+    logger.info(f"Executing step {step.step_id}: {step.call_function}")
+    return step
+
+
+def executor_agent(state: AgentState) -> dict:
+    step = _get_pending_step(state)
+    if not step:
+        return {}
+    tool_results = _tool_results(state, step)
+
+    # Dispatch directly when the plan already holds valid args - skips the LLM round trip
+    # and the ToolNode hop (and preserves read_file bytes)
+    if not tool_results:
+        args = _direct_dispatch_args(state, step)
+        if args is not None:
+            started_at = datetime.utcnow()
+            try:
+                name = step.call_function.value
+                output = TOOLS_BY_NAME[name].invoke(guard_tool_args(state, name, args))
+                return _direct_dispatch_completed(state, step, output, started_at)
+            except Exception as e:
+                return _direct_dispatch_failed(state, step, e, started_at)
+
+    # Returning from ToolNode
+    if tool_results:
+        return _tool_result_update(state, step, tool_results)
+
+    # Ask LLM to make a tool call
+    messages = _build_tool_call_messages(state, step)
+    response = invoke_llm(agent_name="executor", messages=messages, tools=_executor_tools(state, step))
+    return _tool_call_update(state, step, messages, response)
+
+
+async def aexecutor_agent(state: AgentState) -> dict:
+    step = _get_pending_step(state)
+    if not step:
+        return {}
+    tool_results = _tool_results(state, step)
+
+    # Dispatch directly when the plan already holds valid args - skips the LLM round trip
+    # and the ToolNode hop (and preserves read_file bytes)
+    if not tool_results:
+        args = _direct_dispatch_args(state, step)
+        if args is not None:
+            started_at = datetime.utcnow()
+            try:
+                name = step.call_function.value
+                output = await TOOLS_BY_NAME[name].ainvoke(guard_tool_args(state, name, args))
+                return _direct_dispatch_completed(state, step, output, started_at)
+            except Exception as e:
+                return _direct_dispatch_failed(state, step, e, started_at)
+
+    # Returning from ToolNode
+    if tool_results:
+        return _tool_result_update(state, step, tool_results)
+
+    # Ask LLM to make a tool call
+    messages = _build_tool_call_messages(state, step)
+    response = await ainvoke_llm(agent_name="executor", messages=messages, tools=_executor_tools(state, step))
+    return _tool_call_update(state, step, messages, response)
+
+
+
+def _step_record(step, started_at: datetime, outputs: list, error: Optional[str] = None) -> ExecutionRecord:
+    return ExecutionRecord(
+        step_id=step.step_id,
+        action_ref=step.code.content[:100] if step.code else str(step.call_function.value),
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        success=error is None,
+        error=error,
+        output_content=outputs if error is None else [error]
+    )
+
+
+def _step_patch(record: ExecutionRecord) -> dict:
+    return {"completed": record.success, "failed": not record.success, "error": record.error}
+
+
+def execute_step(state: AgentState, step, concurrent: int = 1) -> Tuple[ExecutionRecord, dict, List]:
+    """
+    Run one EXECUTE step to completion in the calling thread, without the ToolNode hop.
+    Used by the scheduler to run independent steps concurrently; concurrent is how many
+    steps run together, which split the remaining bytes-billed budget.
+    Returns the execution record, the patch for the step and any LLM responses (for usage).
+    """
+    started_at = datetime.utcnow()
+    args = _direct_dispatch_args(state, step)
+    try:
+        if args is not None:
+            name = step.call_function.value
+            outputs = [TOOLS_BY_NAME[name].invoke(guard_tool_args(state, name, args, concurrent))]
+            record = _step_record(step, started_at, outputs)
+            return record, _step_patch(record), []
+
+        tools = _executor_tools(state, step)
+        response = invoke_llm(agent_name="executor", messages=_build_tool_call_messages(state, step), tools=tools)
+        if not response.tool_calls:
+            record = _step_record(step, started_at, [], error="Executor LLM produced no tool calls")
+            return record, _step_patch(record), [response]
+        _guard_tool_calls(state, response, tools, concurrent)
+        outputs = [TOOLS_BY_NAME[t["name"]].invoke(t["args"]) for t in response.tool_calls]
+        record = _step_record(step, started_at, outputs)
+        return record, _step_patch(record), [response]
+    except Exception as e:
+        logger.error(f"Step {step.step_id} failed: {e}")
+        record = _step_record(step, started_at, [], error=str(e))
+        return record, _step_patch(record), []
+
 
-    if response.tool_calls:
-        logger.info(f"Step {step.step_id} invoking tools: {[t['name'] for t in response.tool_calls]}")
-        return {"messages": messages + [response]}
+async def aexecute_step(state: AgentState, step, concurrent: int = 1) -> Tuple[ExecutionRecord, dict, List]:
+    """Async counterpart of execute_step."""
+    started_at = datetime.utcnow()
+    args = _direct_dispatch_args(state, step)
+    try:
+        if args is not None:
+            name = step.call_function.value
+            outputs = [await TOOLS_BY_NAME[name].ainvoke(guard_tool_args(state, name, args, concurrent))]
+            record = _step_record(step, started_at, outputs)
+            return record, _step_patch(record), []
 
-    logger.warning(f"Step {step.step_id} produced no tool calls")
-    return {"messages": messages + [response]}
\ No newline at end of file
+        tools = _executor_tools(state, step)
+        response = await ainvoke_llm(agent_name="executor", messages=_build_tool_call_messages(state, step), tools=tools)
+        if not response.tool_calls:
+            record = _step_record(step, started_at, [], error="Executor LLM produced no tool calls")
+            return record, _step_patch(record), [response]
+        _guard_tool_calls(state, response, tools, concurrent)
+        outputs = [await TOOLS_BY_NAME[t["name"]].ainvoke(t["args"]) for t in response.tool_calls]
+        record = _step_record(step, started_at, outputs)
+        return record, _step_patch(record), [response]
+    except Exception as e:
+        logger.error(f"Step {step.step_id} failed: {e}")
+        record = _step_record(step, started_at, [], error=str(e))
+        return record, _step_patch(record), []
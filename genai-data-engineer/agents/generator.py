@@ -1,11 +1,15 @@
+import re
+import asyncio
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.messages import AIMessage
 from state.state import AgentState, CodeProposal, StepType, CallFunction
-from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response
-from utils_llm.llm import call_llm, get_text_content
+from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response, usage_update
+from utils_llm.llm import call_llm, acall_llm, get_text_content
 from utils.get_tool_descriptions import get_tools_description
 from utils.tools import AVAILABLE_TOOLS
+from utils.load_yaml_config import get_workflow_config
 
 logger = logging.getLogger(__name__)
 
@@ -16,42 +20,193 @@ def load_generator_state_ref():
 GENERATOR_STATE_REF = load_generator_state_ref()
 
 
-def generator_agent(state: AgentState) -> dict:
-    logger.info("Generator filling code for all EXECUTE steps")
-
+def _build_generator_prompt(state: AgentState) -> str:
     template = load_prompt_template("generator")
-    prompt = build_prompt(template, {
+    return build_prompt(template, {
         "available_tools": get_tools_description(AVAILABLE_TOOLS),
         "plan": state.plan.model_dump_json(),
         "user_request": state.request.original_prompt,
         "agent_state_ref": GENERATOR_STATE_REF
     })
 
-    response = call_llm(agent_name="generator", prompt=prompt)
+
+def _step_patches(state: AgentState, steps_data: list, clear_refinement: bool = False) -> dict:
+    # step_id -> fields the generator filled in, for EXECUTE steps only
+    patches = {}
+    for step_data in steps_data:
+        s = state.plan.get_step(step_data.get("step_id"))
+        if s is None or s.step_type != StepType.EXECUTE:
+            continue
+        patch = {
+            "call_function": CallFunction(step_data["call_function"]) if step_data.get("call_function") else s.call_function,
+            "call_function_args": step_data.get("call_function_args", s.call_function_args),
+            "code": CodeProposal(**step_data["code"]) if step_data.get("code") else s.code
+        }
+        if clear_refinement:
+            patch["error_refinement"] = None
+        patches[s.step_id] = patch
+    return patches
+
+
+def _plan_update(state: AgentState, patches: dict) -> dict:
+    # The human feedback has been applied: clear it so a later refine loop does not regenerate for it again
+    update = {"step_patches": patches}
+    if state.plan.approval.human_feedback:
+        update["approval"] = {"human_feedback": None}
+    return update
+
+
+def _generator_update(state: AgentState, response) -> dict:
     raw_response = get_text_content(response)
     logger.info(f"Raw LLM response: {raw_response}")
     parsed_response = parse_json_response(raw_response)
     plan = parsed_response.get("plan")
 
-    # Build updated steps using model_copy
-    updated_steps = []
-    for s in state.plan.steps:
-        if s.step_type == StepType.EXECUTE:
-            step_data = next((d for d in plan.get("steps", []) if d.get("step_id") == s.step_id), None)
-            if step_data:
-                s = s.model_copy(update={
-                    "call_function": CallFunction(step_data["call_function"]) if step_data.get("call_function") else s.call_function,
-                    "call_function_args": step_data.get("call_function_args", s.call_function_args),
-                    "code": CodeProposal(**step_data["code"]) if step_data.get("code") else s.code
-                })
-        updated_steps.append(s)
+    patches = _step_patches(state, plan.get("steps", []))
 
     logger.info("Generator completed code generation")
 
     return {
-        "plan": {
-            **state.plan.model_dump(),
-            "steps": [s.model_dump() for s in updated_steps]
-        },
-        "messages": state.messages + [AIMessage(content=raw_response)]
-    }
\ No newline at end of file
+        "plan": _plan_update(state, patches),
+        "messages": [AIMessage(content=raw_response)],
+        "usage": usage_update(response)
+    }
+
+
+# ---- Per-step generation ----
+
+def _per_step_enabled() -> bool:
+    return bool(get_workflow_config("generator").get("per_step", False))
+
+
+# "step 2", "steps 2, 3 and 5", "step_id: load_users": the ids listed after "step(s)"
+_STEP_MENTION = re.compile(r"\bsteps?[\s_-]*(?:ids?)?[\s:#=]*", re.IGNORECASE)
+_STEP_ID_ITEM = re.compile(r"\s*(?:,|&|\band\b|\bor\b)?\s*[\"'`]?([\w-]+)[\"'`]?", re.IGNORECASE)
+
+
+def _flagged_step_ids(feedback: str, step_ids: list) -> set:
+    # Step ids the reviewer referred to: id lists after "step(s)" (up to the first word that
+    # is not a step id), or a bare non-numeric id like "load_users" anywhere
+    known = {step_id.lower(): step_id for step_id in step_ids}
+    flagged = set()
+    for mention in _STEP_MENTION.finditer(feedback):
+        pos = mention.end()
+        while (item := _STEP_ID_ITEM.match(feedback, pos)) and item.group(1).lower() in known:
+            flagged.add(known[item.group(1).lower()])
+            pos = item.end()
+    for step_id in step_ids:
+        if not step_id.isdigit() and re.search(rf"\b{re.escape(step_id)}\b", feedback):
+            flagged.add(step_id)
+    return flagged
+
+
+def _steps_to_generate(state: AgentState) -> list:
+    """
+    EXECUTE steps that need (re)generation: steps without code, steps the error refiner
+    flagged and steps named in the human feedback. Everything else keeps its code.
+    Feedback that names no step regenerates every step that is not frozen.
+    """
+    execute_steps = [s for s in state.plan.steps if s.step_type == StepType.EXECUTE and not s.completed]
+    feedback = state.plan.approval.human_feedback or ""
+    flagged  = _flagged_step_ids(feedback, [s.step_id for s in execute_steps]) if feedback else set()
+
+    selected = []
+    for s in execute_steps:
+        if s.code is None or s.error_refinement or s.failed:
+            selected.append(s)
+        elif s.code.frozen:
+            continue
+        elif s.step_id in flagged or (feedback and not flagged):
+            selected.append(s)
+    return selected
+
+
+def _build_step_prompt(state: AgentState, step) -> str:
+    template = load_prompt_template("generator_step")
+    context_steps = [
+        {"step_id": s.step_id, "step_type": s.step_type.value, "description": s.description, "call_function": s.call_function.value}
+        for s in state.plan.steps if s.step_id != step.step_id
+    ]
+    return build_prompt(template, {
+        "available_tools": get_tools_description(AVAILABLE_TOOLS),
+        "user_request": state.request.original_prompt,
+        "goal": state.plan.goal,
+        "human_feedback": state.plan.approval.human_feedback or "None",
+        "context_steps": json.dumps(context_steps),
+        "step": step.model_dump_json(),
+        "agent_state_ref": GENERATOR_STATE_REF
+    })
+
+
+def _parse_step_response(step, response) -> dict:
+    raw_response = get_text_content(response)
+    logger.info(f"Raw LLM response for step {step.step_id}: {raw_response}")
+    parsed_response = parse_json_response(raw_response)
+    step_data = parsed_response.get("step")
+    if step_data is None:
+        # tolerate the whole-plan response shape
+        step_data = next((d for d in parsed_response.get("plan", {}).get("steps", []) if d.get("step_id") == step.step_id), {})
+    return {**step_data, "step_id": step.step_id}
+
+
+def _per_step_update(state: AgentState, steps: list, responses: list) -> dict:
+    steps_data = [_parse_step_response(step, response) for step, response in zip(steps, responses)]
+    patches = _step_patches(state, steps_data, clear_refinement=True)
+
+    logger.info(f"Generator completed code generation for steps {[s.step_id for s in steps]}")
+
+    return {
+        "plan": _plan_update(state, patches),
+        "messages": [AIMessage(content=get_text_content(r)) for r in responses],
+        "usage": usage_update(*responses)
+    }
+
+
+def _max_workers() -> int:
+    return int(get_workflow_config("generator").get("max_workers", 4))
+
+
+def generate_per_step(state: AgentState) -> dict:
+    steps = _steps_to_generate(state)
+    logger.info(f"Generator regenerating steps {[s.step_id for s in steps]}, keeping the rest frozen")
+    if not steps:
+        return {"plan": _plan_update(state, {})}
+
+    with ThreadPoolExecutor(max_workers=min(_max_workers(), len(steps))) as pool:
+        responses = list(pool.map(
+            lambda step: call_llm(agent_name="generator", prompt=_build_step_prompt(state, step)),
+            steps
+        ))
+    return _per_step_update(state, steps, responses)
+
+
+async def agenerate_per_step(state: AgentState) -> dict:
+    steps = _steps_to_generate(state)
+    logger.info(f"Generator regenerating steps {[s.step_id for s in steps]}, keeping the rest frozen")
+    if not steps:
+        return {"plan": _plan_update(state, {})}
+
+    semaphore = asyncio.Semaphore(_max_workers())
+
+    async def _generate(step):
+        async with semaphore:
+            return await acall_llm(agent_name="generator", prompt=_build_step_prompt(state, step))
+
+    responses = await asyncio.gather(*(_generate(step) for step in steps))
+    return _per_step_update(state, steps, responses)
+
+
+def generator_agent(state: AgentState) -> dict:
+    if _per_step_enabled():
+        return generate_per_step(state)
+    logger.info("Generator filling code for all EXECUTE steps")
+    response = call_llm(agent_name="generator", prompt=_build_generator_prompt(state))
+    return _generator_update(state, response)
+
+
+async def agenerator_agent(state: AgentState) -> dict:
+    if _per_step_enabled():
+        return await agenerate_per_step(state)
+    logger.info("Generator filling code for all EXECUTE steps")
+    response = await acall_llm(agent_name="generator", prompt=_build_generator_prompt(state))
+    return _generator_update(state, response)
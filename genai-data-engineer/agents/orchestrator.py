@@ -3,10 +3,10 @@ import yaml
 import json
 from langchain_core.messages import AIMessage
 from state.state import AgentState, PlanStep, Approval
-from utils_llm.llm import call_llm, get_text_content
-from utils.load_json_from_gcs import load_json_from_gcs
+from utils_llm.llm import call_llm, acall_llm, get_text_content
+from utils.load_json_from_gcs import load_json_from_gcs, aload_json_from_gcs
 from utils.get_tool_descriptions import get_tools_description
-from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response
+from agents.agent_utils import load_prompt_template, build_prompt, parse_json_response, usage_update
 from utils.tools import AVAILABLE_TOOLS
 
 logger = logging.getLogger(__name__)
@@ -17,33 +17,20 @@ def load_orchestrator_state_ref():
 
 ORCHESTRATOR_STATE_REF = load_orchestrator_state_ref()
 
-def orchestrator_agent(state: AgentState) -> dict:
-    logger.info(f"Orchestrator creating plan for request: {state.meta.request_id}")
+def _build_orchestrator_prompt(state: AgentState) -> str:
+    template = load_prompt_template("orchestrator")
+    return build_prompt(template, {
+        "available_tools": get_tools_description(AVAILABLE_TOOLS),
+        "user_request": state.request.original_prompt,
+        "agent_state_ref": ORCHESTRATOR_STATE_REF
+    })
 
-    if state.meta.plan_path and not state.meta.plan_loaded:
-        logger.info(f"Loading predefined plan from: {state.meta.plan_path}")
-        plan = load_json_from_gcs(state.meta.plan_path).get("plan")
-        plan_loaded = True
-        raw_response = "Loaded predefined plan"
-    else:
-        template = load_prompt_template("orchestrator")
-        prompt = build_prompt(template, {
-            "available_tools": get_tools_description(AVAILABLE_TOOLS),
-            "user_request": state.request.original_prompt,
-            "agent_state_ref": ORCHESTRATOR_STATE_REF
-        })
-
-        response     = call_llm(agent_name="orchestrator", prompt=prompt)
-        raw_response = get_text_content(response)
-        logger.info(f"Raw LLM response: {raw_response}")
-        parsed_response = parse_json_response(raw_response)
-        plan = parsed_response.get("plan")
-        plan_loaded = False
 
+def _orchestrator_update(state: AgentState, plan: dict, plan_loaded: bool, raw_response: str, response=None) -> dict:
     steps = [PlanStep(**step_data) for step_data in plan.get("steps", [])]
     logger.info(f"Created plan with {len(steps)} steps")
 
-    return {
+    update = {
         "meta": {**state.meta.model_dump(), "plan_loaded": plan_loaded or state.meta.plan_loaded},
         "plan": {
             "steps": [s.model_dump() for s in steps],
@@ -51,5 +38,40 @@ def orchestrator_agent(state: AgentState) -> dict:
             "agent_comments": plan.get("agent_comments"),
             "approval": {"status": Approval.PENDING}
         },
-        "messages": state.messages + [AIMessage(content=raw_response)]
-    }
\ No newline at end of file
+        "messages": [AIMessage(content=raw_response)]
+    }
+    if response is not None:
+        update["usage"] = usage_update(response)
+    return update
+
+
+def _parse_plan(raw_response: str) -> dict:
+    logger.info(f"Raw LLM response: {raw_response}")
+    parsed_response = parse_json_response(raw_response)
+    return parsed_response.get("plan")
+
+
+def orchestrator_agent(state: AgentState) -> dict:
+    logger.info(f"Orchestrator creating plan for request: {state.meta.request_id}")
+
+    if state.meta.plan_path and not state.meta.plan_loaded:
+        logger.info(f"Loading predefined plan from: {state.meta.plan_path}")
+        plan = load_json_from_gcs(state.meta.plan_path).get("plan")
+        return _orchestrator_update(state, plan, True, "Loaded predefined plan")
+
+    response     = call_llm(agent_name="orchestrator", prompt=_build_orchestrator_prompt(state))
+    raw_response = get_text_content(response)
+    return _orchestrator_update(state, _parse_plan(raw_response), False, raw_response, response)
+
+
+async def aorchestrator_agent(state: AgentState) -> dict:
+    logger.info(f"Orchestrator creating plan for request: {state.meta.request_id}")
+
+    if state.meta.plan_path and not state.meta.plan_loaded:
+        logger.info(f"Loading predefined plan from: {state.meta.plan_path}")
+        plan = (await aload_json_from_gcs(state.meta.plan_path)).get("plan")
+        return _orchestrator_update(state, plan, True, "Loaded predefined plan")
+
+    response     = await acall_llm(agent_name="orchestrator", prompt=_build_orchestrator_prompt(state))
+    raw_response = get_text_content(response)
+    return _orchestrator_update(state, _parse_plan(raw_response), False, raw_response, response)
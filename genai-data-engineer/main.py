@@ -2,9 +2,16 @@ print(">>> module import start")
 
 import os
 import json
+import base64
 import logging
-from flask import Flask, request, jsonify
-from workflows.workflow import WorkflowRunner
+from flask import Flask, request, jsonify, Response, stream_with_context
+from workflows.workflow import WorkflowRunner, StaleApprovalResponse
+from workflows.jobs import JobManager, JobQueueFull
+from workflows.approval import approvals_mode
+from workflows.checkpointing import require_durable_checkpointer
+from utils.load_yaml_config import get_workflow_config, load_config
+from utils.approval_router import get_approval_router, router_config
+from utils.notifications import approval_responses_subscription, republish_approval_response
 
 # ---- Logging setup ----
 logging.basicConfig(
@@ -22,9 +29,84 @@ config = {
     "max_retries": int(os.getenv("MAX_RETRIES", "2"))
 }
 
-# Lazy initialization - only create WorkflowRunner on first request
+# Built at process startup (see the entry point) so the first request does not pay for
+# graph compilation and LLM client construction; created on demand if imported elsewhere
 workflow_runner = None
 
+def get_workflow_runner() -> WorkflowRunner:
+    global workflow_runner
+    if workflow_runner is None:
+        logger.info("Initializing WorkflowRunner...")
+        workflow_runner = WorkflowRunner(config)
+        logger.info("WorkflowRunner initialized successfully")
+    return workflow_runner
+
+
+job_manager = None
+
+def get_job_manager() -> JobManager:
+    global job_manager
+    if job_manager is None:
+        jobs_config = get_workflow_config("jobs")
+        job_manager = JobManager(
+            get_workflow_runner(),
+            max_workers=int(os.getenv("JOB_WORKERS", jobs_config.get("max_workers", 4))),
+            max_queued=int(jobs_config.get("max_queued", 100)),
+            max_retained=int(jobs_config.get("max_retained", 1000)),
+            on_resume_failed=_republish_response
+        )
+    return job_manager
+
+
+def _republish_response(response: dict):
+    """
+    A resume job failed with the workflow still paused at the approval the response answers.
+    The push was acked when the job was queued, so put the response (with that stage and
+    interrupt_id) back on the topic for another attempt.
+    """
+    attempts = int(response.get("resume_attempts", 0)) + 1
+    max_attempts = int(get_workflow_config("jobs").get("resume_attempts", 3))
+    if attempts >= max_attempts:
+        logger.error(f"Giving up on resuming {response['request_id']} after {attempts} attempts; the response must be sent again")
+        return
+    try:
+        republish_approval_response({**response, "resume_attempts": attempts}, os.getenv("PROJECT_ID"))
+    except Exception as e:
+        logger.error(f"Could not re-publish the response for {response['request_id']}: {e}", exc_info=True)
+
+
+def _resume_from_router(response: dict) -> bool:
+    """Default approval-router handler: resume the workflow if it is paused for this response."""
+    request_id = response["request_id"]
+    if "action" not in response:
+        return False
+    try:
+        get_job_manager().submit_resume(request_id, response)
+    except StaleApprovalResponse:
+        return False
+    logger.info(f"Queued resume of {request_id} with action {response['action']} (subscription)")
+    return True
+
+
+def start_approval_router():
+    """In interrupt mode, optionally resume paused workflows straight from the responses subscription."""
+    if approvals_mode() != "interrupt" or not router_config()["resume_paused"]:
+        return
+    project_id = os.getenv("PROJECT_ID") or load_config("config/agent_llm_config.yaml").get("defaults", {}).get("project_id")
+    router = get_approval_router(approval_responses_subscription(project_id))
+    router.default_handler = _resume_from_router
+    router.start()
+
+
+def _accepted(job):
+    body = job.to_dict(include_result=False)
+    body["links"] = {
+        "status": f"/jobs/{job.job_id}",
+        "events": f"/jobs/{job.job_id}/events",
+        "request": f"/requests/{job.request_id}",
+    }
+    return jsonify(body), 202, {"Location": f"/jobs/{job.job_id}"}
+
 # ---- Routes ----
 
 @app.route("/health", methods=["GET"])
@@ -42,15 +124,10 @@ def run_workflow():
       # OR
       "plan_path" : "gs://<my-bucket>/<path to file>.json"
     }
+    Returns 202 with a job id; poll /jobs/<job_id> or stream /jobs/<job_id>/events.
     """
-    global workflow_runner
-    
-    # Initialize workflow runner on first request (lazy loading)
-    if workflow_runner is None:
-        logger.info("Initializing WorkflowRunner (first request)...")
-        workflow_runner = WorkflowRunner(config)
-        logger.info("WorkflowRunner initialized successfully")
-    
+    jobs = get_job_manager()
+
     payload = request.get_json(silent=True)
     if not payload or "id" not in payload or ("prompt" not in payload and "plan_path" not in payload):
         return jsonify({"error": "Invalid request - missing id or prompt / plan_path"}), 400
@@ -64,22 +141,68 @@ def run_workflow():
         return jsonify({"error": "PROJECT_ID not configured"}), 500
 
     try:
-        logger.info(f"Starting workflow for request: {request_id}")
-        result = workflow_runner.run(
-            user_request=user_prompt,
+        logger.info(f"Queueing workflow for request: {request_id}")
+        job = jobs.submit_run(
             request_id=request_id,
+            user_request=user_prompt,
             project_id=project_id,
             plan_path=plan_path
         )
-        
+        return _accepted(job)
+
+    except JobQueueFull as e:
+        logger.warning(f"Rejecting {request_id}: {e}")
+        return jsonify({"status": "error", "request_id": request_id, "error": str(e)}), 429
+    except Exception as e:
+        logger.error(f"Workflow error: {str(e)}", exc_info=True)
         return jsonify({
-            "status": result["status"],
+            "status": "error",
             "request_id": request_id,
-            "plan": result.get("plan"),
-            "execution": result.get("execution"),
-            "results": result.get("results")
-        }), 200
+            "error": str(e)
+        }), 500
+
+
+@app.route("/resume", methods=["POST"])
+def resume_workflow():
+    """
+    Continue a workflow paused for approval from its checkpoint.
+    Expected JSON payload (as published to approval-responses by the approval CLI):
+    {
+      "request_id": "request-123",
+      "stage": "initial | generation | proceed",
+      "interrupt_id": "<interrupt_id from the approval request>",
+      "action": "approve | recreate_plan | refine_generation | proceed | reject",
+      "feedback": "optional"
+    }
+    or a Pub/Sub push envelope carrying that JSON in message.data.
+    Returns 202 with a job id (acking the push straight away; if the resume then fails with the
+    workflow still paused, the response is re-published for another attempt). A response that
+    does not answer the pending approval (a redelivery, or the workflow moved on) is dropped
+    with 200, so Pub/Sub acks it instead of redelivering it to the dead-letter topic.
+    """
+    jobs = get_job_manager()
+
+    payload = request.get_json(silent=True) or {}
+    if "message" in payload:
+        try:
+            payload = json.loads(base64.b64decode(payload["message"].get("data", "")).decode("utf-8"))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": f"Invalid Pub/Sub message: {e}"}), 400
+    if any(key not in payload for key in ("request_id", "stage", "action")):
+        return jsonify({"error": "Invalid request - missing request_id, stage or action"}), 400
 
+    request_id = payload["request_id"]
+    try:
+        job = jobs.submit_resume(request_id, payload)
+        logger.info(f"Queued resume of {request_id} with action {payload['action']}")
+        return _accepted(job)
+
+    except StaleApprovalResponse as e:
+        logger.warning(f"Dropping {payload['action']} response for {request_id}: {e}")
+        return jsonify({"status": "dropped", "request_id": request_id, "error": str(e)}), 200
+    except JobQueueFull as e:
+        logger.warning(f"Rejecting resume of {request_id}: {e}")
+        return jsonify({"status": "error", "request_id": request_id, "error": str(e)}), 429
     except Exception as e:
         logger.error(f"Workflow error: {str(e)}", exc_info=True)
         return jsonify({
@@ -89,8 +212,59 @@ def run_workflow():
         }), 500
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Job status; includes the workflow result once the job is COMPLETE or WAITING_APPROVAL.
+    Jobs are held in memory, so ids from before a restart are 404: use /requests/<request_id>.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route("/requests/<request_id>", methods=["GET"])
+def request_status(request_id):
+    """A request's status from its checkpoint; survives restarts, unlike job records."""
+    runner = get_workflow_runner()
+    state = runner.current_state(request_id)
+    if state is None:
+        return jsonify({"error": f"Unknown request {request_id}"}), 404
+    pending = runner.pending_approval(request_id) or {}
+    return jsonify({
+        "request_id": request_id,
+        "status": state.meta.status.value,
+        "awaiting": pending.get("stage"),
+        "interrupt_id": pending.get("interrupt_id"),
+        "created_at": state.meta.created_at.isoformat(),
+    }), 200
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-sent events, one per graph node as it completes, ending when the job
+    finishes or pauses for approval. ?from=<n> skips the first n events.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    start = request.args.get("from", 0, type=int)
+
+    def stream():
+        for event in job.iter_events(start=start):
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ---- Entry point ----
 if __name__ == "__main__":
+    require_durable_checkpointer(approvals_mode())
+    get_workflow_runner()  # warms the LLM clients before the server accepts traffic
+    start_approval_router()
     port = int(os.environ.get("PORT", 8080))
     logger.info(f"Starting Flask server on port {port}...")
-    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=port, threaded=True)
\ No newline at end of file
@@ -11,7 +11,7 @@ import logging
 import argparse
 import uuid
 from dotenv import load_dotenv
-from workflows.workflow import WorkflowRunner
+from workflows.workflow import WorkflowRunner, response_matches
 
 load_dotenv()
 
@@ -52,6 +52,19 @@ def main():
         plan_path=args.plan_path
     )
 
+    # Interrupt-based approvals: wait for each response here and resume from the checkpoint
+    while result.get("awaiting"):
+        from utils.notifications import get_approval_response
+        logger.info(f"Waiting for {result['awaiting']} approval for {request_id}")
+        response = get_approval_response(runner.current_state(request_id), timeout=config["approval_timeout"])
+        if not response:
+            logger.error(f"No approval response received for {request_id}; workflow left paused")
+            break
+        if not response_matches(runner.pending_approval(request_id), response):
+            logger.warning(f"Ignoring response for {response.get('stage')}; still waiting for {result['awaiting']}")
+            continue
+        result = runner.resume(request_id, response)
+
     print("\n--- RESULT ---")
     print(json.dumps(result, indent=2, default=str))
 
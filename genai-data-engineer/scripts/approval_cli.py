@@ -3,23 +3,57 @@ import argparse
 import os
 import sys
 import json
+import gzip
+import hashlib
+import threading
 from datetime import datetime
+from functools import lru_cache
 from google.cloud import pubsub_v1
 
-def print_state_summary(state: dict):
+def decode_approval_message(message) -> dict:
+    """Approval payload from a Pub/Sub message: fetched if offloaded, then gunzipped."""
+    attributes = message.attributes or {}
+    data = message.data
+    if attributes.get('payload_ref'):
+        data = fetch_payload(attributes['payload_ref'])
+        if hashlib.sha256(data).hexdigest() != attributes.get('payload_sha256'):
+            raise ValueError(f"Approval payload at {attributes['payload_ref']} failed its sha256 check")
+    if attributes.get('content_encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def fetch_payload(uri: str) -> bytes:
+    if uri.startswith('file://'):
+        with open(uri[len('file://'):], 'rb') as f:
+            return f.read()
+    from google.cloud import storage
+    bucket_name, name = uri[len('gs://'):].split('/', 1)
+    return storage.Client().bucket(bucket_name).blob(name).download_as_bytes()
+
+
+def print_state_summary(payload: dict):
     print(f"\n{'='*80}")
-    print(f"APPROVAL REQUEST")
+    print(f"APPROVAL REQUEST ({payload['stage']})")
     print(f"{'='*80}")
-    print(f"Request ID:  {state['meta']['request_id']}")
-    print(f"Status:      {state['meta']['status']}")
-    print(f"Created:     {state['meta']['created_at']}")
-    print(f"\nUser Request:\n{state['request']['original_prompt']}")
+    print(f"Request ID:  {payload['request_id']}")
+    print(f"Status:      {payload['status']}")
+    print(f"Created:     {payload['created_at']}")
+    print(f"\nUser Request:\n{payload['user_request']}")
     
-    plan = state['plan']
+    plan = payload['plan']
     print(f"\n--- PLAN (Version {plan['version']}) ---")
-    print(f"Goal: {plan.get('goal', 'N/A')}")
+    print(f"Goal: {plan.get('goal') or 'N/A'}")
     print(f"Steps: {len(plan['steps'])}")
     
+    changes = payload.get('changes')
+    if changes:
+        for kind in ('added', 'changed', 'removed'):
+            if changes[kind]:
+                print(f"{kind.capitalize()} since last review: {', '.join(changes[kind])}")
+        if not any(changes.values()):
+            print("No changes since last review")
+    
     for i, step in enumerate(plan['steps'], 1):
         print(f"\n  Step {i}: {step['step_id']}")
         print(f"    Type: {step['step_type']}")
@@ -32,15 +66,40 @@ def print_state_summary(state: dict):
             print(f"      {code['content'][:200]}{'...' if len(code['content']) > 200 else ''}")
             if code.get('rationale'):
                 print(f"      Rationale: {code['rationale']}")
+
+        estimate = step.get('cost_estimate')
+        if estimate:
+            if estimate.get('bytes_processed') is not None:
+                print(f"    Estimate: {estimate['bytes_processed'] / 1024**3:.2f} GiB, ~${estimate.get('estimated_cost_usd') or 0:.4f} ({estimate.get('status', 'ok')})")
+                if estimate.get('referenced_tables'):
+                    print(f"      Tables: {', '.join(estimate['referenced_tables'])}")
+            else:
+                print(f"    Estimate: {estimate.get('status', 'ok')} - {estimate.get('error')}")
+
+        for output in step.get('outputs', []):
+            rows = f" ({output['total_rows']} rows)" if output.get('total_rows') is not None else ""
+            print(f"    Output: {output['uri']}{rows}")
+    
+    if payload.get('estimated_bytes'):
+        print(f"\nEstimated total: {payload['estimated_bytes'] / 1024**3:.2f} GiB")
     
     print(f"\n{'='*80}\n")
 
+@lru_cache(maxsize=1)
+def get_subscriber() -> pubsub_v1.SubscriberClient:
+    return pubsub_v1.SubscriberClient()
+
+@lru_cache(maxsize=1)
+def get_publisher() -> pubsub_v1.PublisherClient:
+    # Responses sent together (batch mode) go out in one publish request
+    return pubsub_v1.PublisherClient(pubsub_v1.types.BatchSettings(max_messages=100, max_latency=0.05))
+
+def requests_subscription(project_id: str, environment: str) -> str:
+    return get_subscriber().subscription_path(project_id, f"approval-requests-pull-{environment}")
+
 def get_pending_approval(project_id: str, environment: str, request_id: str = None):
-    subscriber = pubsub_v1.SubscriberClient()
-    subscription_path = subscriber.subscription_path(
-        project_id,
-        f"approval-requests-pull-{environment}"
-    )
+    subscriber = get_subscriber()
+    subscription_path = requests_subscription(project_id, environment)
     
     response = subscriber.pull(
         request={"subscription": subscription_path, "max_messages": 10},
@@ -51,31 +110,30 @@ def get_pending_approval(project_id: str, environment: str, request_id: str = No
         return None, None
     
     for message in response.received_messages:
-        data = json.loads(message.message.data.decode('utf-8'))
-        
-        if request_id and data.get('request_id') != request_id:
-            subscriber.modify_ack_deadline(
-                request={
-                    "subscription": subscription_path,
-                    "ack_ids": [message.ack_id],
-                    "ack_deadline_seconds": 0
-                }
-            )
+        # Other requests are left alone (not nacked): they come back after the ack
+        # deadline instead of being redelivered to this loop straight away
+        if request_id and message.message.attributes.get('request_id') != request_id:
             continue
         
-        return data, message.ack_id
+        return decode_approval_message(message.message), message.ack_id
     
     return None, None
 
-def send_approval_response(project_id: str, environment: str, request_id: str, action: str, feedback: str = None):
-    publisher = pubsub_v1.PublisherClient()
+def publish_approval_response(project_id: str, environment: str, payload: dict, action: str, feedback: str = None):
+    """
+    Publish a response to the approval request payload; returns the publish future.
+    It names the stage and interrupt it answers so the workflow ignores it at any other pause.
+    """
+    publisher = get_publisher()
     topic_path = publisher.topic_path(
         project_id,
         f"approval-responses-{environment}"
     )
     
     response_data = {
-        "request_id": request_id,
+        "request_id": payload['request_id'],
+        "stage": determine_approval_stage(payload),
+        "interrupt_id": payload.get('interrupt_id'),
         "action": action,
         "timestamp": datetime.utcnow().isoformat()
     }
@@ -83,28 +141,184 @@ def send_approval_response(project_id: str, environment: str, request_id: str, a
     if feedback:
         response_data["feedback"] = feedback
     
-    publisher.publish(topic_path, json.dumps(response_data).encode('utf-8'))
+    return publisher.publish(topic_path, json.dumps(response_data).encode('utf-8'))
+
+def send_approval_response(project_id: str, environment: str, payload: dict, action: str, feedback: str = None):
+    publish_approval_response(project_id, environment, payload, action, feedback).result(timeout=60)
 
 def acknowledge_message(project_id: str, environment: str, ack_id: str):
-    subscriber = pubsub_v1.SubscriberClient()
-    subscription_path = subscriber.subscription_path(
-        project_id,
-        f"approval-requests-pull-{environment}"
-    )
-    subscriber.acknowledge(request={"subscription": subscription_path, "ack_ids": [ack_id]})
+    get_subscriber().acknowledge(request={"subscription": requests_subscription(project_id, environment), "ack_ids": [ack_id]})
 
-def determine_approval_stage(state: dict):
-    has_code = any(step.get('code') for step in state['plan']['steps'])
+def determine_approval_stage(payload: dict):
+    if payload.get('stage'):
+        return payload['stage']
+    has_code = any(step.get('code') for step in payload['plan']['steps'])
     return 'generation' if has_code else 'initial'
 
+# ---- Batch mode: streaming subscription, live queue, bulk decisions ----
+
+BATCH_ACTIONS = {'a': 'approve', 'g': 'refine_generation', 'p': 'recreate_plan', 'x': 'reject'}
+STAGE_ACTIONS = {
+    'initial': {'approve', 'recreate_plan', 'reject'},
+    'generation': {'approve', 'refine_generation', 'recreate_plan', 'reject'},
+    'proceed': {'proceed', 'reject'},
+}
+
+def _request_age_key(payload: dict):
+    # Newer approval requests for a workflow have a later timestamp (and a plan version no lower)
+    return (payload.get('timestamp') or '', payload.get('plan', {}).get('version') or 0)
+
+class PendingQueue:
+    """Approval requests received on the streaming pull, held (leased) until decided."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def on_message(self, message):
+        try:
+            payload = decode_approval_message(message)
+        except Exception as e:
+            # Nack rather than hold it: a held message keeps its lease extended and a flow-control slot
+            print(f"\nCould not decode approval request {message.message_id}: {e}")
+            message.nack()
+            return
+        with self._lock:
+            previous = self._pending.get(payload['request_id'])
+            if previous is None or _request_age_key(payload) >= _request_age_key(previous[0]):
+                self._pending[payload['request_id']] = (payload, message)
+                superseded = previous[1] if previous is not None else None
+            else:
+                superseded = message  # a stale request redelivered after another reviewer's lease lapsed
+        if superseded is not None:
+            superseded.ack()  # only the newest request for a workflow can still be answered
+
+    def items(self):
+        with self._lock:
+            return sorted(self._pending.values(), key=lambda item: item[0].get('timestamp') or '')
+
+    def remove(self, request_id: str):
+        with self._lock:
+            return self._pending.pop(request_id, None)
+
+def print_queue_table(items):
+    print(f"\n{'#':>3}  {'REQUEST ID':<36}  {'STAGE':<10}  {'STEPS':>5}  {'CHANGED':>7}  {'EST GiB':>8}  {'AGE':>6}  PROMPT")
+    now = datetime.utcnow()
+    for i, (payload, _) in enumerate(items, 1):
+        changes = payload.get('changes') or {}
+        changed = sum(len(changes.get(k, [])) for k in ('added', 'changed', 'removed')) if changes else '-'
+        estimated = f"{payload['estimated_bytes'] / 1024**3:.2f}" if payload.get('estimated_bytes') else '-'
+        try:
+            age = f"{int((now - datetime.fromisoformat(payload['timestamp'])).total_seconds() // 60)}m"
+        except (KeyError, TypeError, ValueError):
+            age = '-'
+        prompt = (payload.get('user_request') or '').replace('\n', ' ')[:40]
+        print(f"{i:>3}  {payload['request_id']:<36}  {payload['stage']:<10}  {len(payload['plan']['steps']):>5}  "
+              f"{changed:>7}  {estimated:>8}  {age:>6}  {prompt}")
+    if not items:
+        print("     (no pending approvals)")
+
+def parse_selection(text: str, count: int):
+    """'all', or row numbers and ranges like 1,3-5 -> 0-based indexes."""
+    if text.strip() == 'all':
+        return list(range(count))
+    indexes = []
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        for n in range(int(start), int(end or start) + 1):
+            if not 1 <= n <= count:
+                raise ValueError(f"No row {n}")
+            indexes.append(n - 1)
+    return sorted(set(indexes))
+
+def decide(queue: PendingQueue, selected, action: str, feedback: str, project_id: str, environment: str):
+    """Publish one response per selected request (batched), then ack the requests that were sent."""
+    sent = []
+    for payload, message in selected:
+        stage_action = 'proceed' if action == 'approve' and payload['stage'] == 'proceed' else action
+        if stage_action not in STAGE_ACTIONS.get(payload['stage'], STAGE_ACTIONS['generation']):
+            print(f"  {payload['request_id']}: {action} is not available at the {payload['stage']} stage, skipped")
+            continue
+        future = publish_approval_response(project_id, environment, payload, stage_action, feedback or None)
+        sent.append((payload, message, stage_action, future))
+    for payload, message, action, future in sent:
+        try:
+            future.result(timeout=60)
+        except Exception as e:
+            print(f"  {payload['request_id']}: publish failed ({e}), left pending")
+            continue
+        message.ack()
+        queue.remove(payload['request_id'])
+        print(f"  \u2713 {action.upper()} {payload['request_id']}")
+
+def run_batch(args):
+    queue = PendingQueue()
+    flow_control = pubsub_v1.types.FlowControl(max_messages=args.max_pending, max_lease_duration=args.max_lease_seconds)
+    streaming = get_subscriber().subscribe(
+        requests_subscription(args.project_id, args.environment), queue.on_message, flow_control=flow_control
+    )
+    print("Commands: a|x <rows>  approve/reject   g|p <rows> [feedback]  refine generation/recreate plan")
+    print("          v <row>  view   r  refresh   q  quit      (rows: 1,3-5 or all)")
+    try:
+        items = queue.items()
+        print_queue_table(items)
+        while True:
+            command = input("\nbatch> ").strip()
+            if not command or command == 'r':
+                items = queue.items()
+                print_queue_table(items)
+                continue
+            if command == 'q':
+                break
+            verb, _, rest = command.partition(' ')
+            rows, _, feedback = rest.strip().partition(' ')
+            try:
+                indexes = parse_selection(rows, len(items))
+            except ValueError as e:
+                print(f"Invalid selection: {e}")
+                continue
+            if verb == 'v':
+                for i in indexes:
+                    print_state_summary(items[i][0])
+                continue
+            if verb not in BATCH_ACTIONS or not indexes:
+                print("Unknown command")
+                continue
+            action = BATCH_ACTIONS[verb]
+            if action in ('refine_generation', 'recreate_plan') and not feedback:
+                feedback = input("Feedback for all selected (optional): ").strip()
+            decide(queue, [items[i] for i in indexes], action, feedback, args.project_id, args.environment)
+            items = queue.items()
+            print_queue_table(items)
+    except (KeyboardInterrupt, EOFError):
+        print()
+    finally:
+        # Undecided requests are released when their leases lapse
+        streaming.cancel()
+        try:
+            streaming.result(timeout=10)
+        except Exception:
+            pass
+    print("\nExiting...")
+
 def main():
     parser = argparse.ArgumentParser(description='Human approval tool for workflow')
     parser.add_argument('--environment', default=os.getenv('ENVIRONMENT', 'dev'))
     parser.add_argument('--project-id', default=os.getenv('PROJECT_ID'))
     parser.add_argument('--request-id', help='Filter by specific request ID (e.g., T001)')
     parser.add_argument('--auto-refresh', action='store_true')
+    parser.add_argument('--batch', action='store_true',
+                        help='Stream pending approvals into a live table and decide on many at once')
+    parser.add_argument('--max-pending', type=int, default=200, help='Batch mode: requests held at once')
+    parser.add_argument('--max-lease-seconds', type=int, default=3600,
+                        help='Batch mode: how long an undecided request stays leased to this reviewer')
     
     args = parser.parse_args()
+    if args.batch and args.request_id:
+        # The streaming pull would hold every other request, leased, in this reviewer's flow control
+        parser.error("--request-id cannot be used with --batch")
     
     if not args.project_id:
         print("Error: PROJECT_ID required")
@@ -116,6 +330,10 @@ def main():
         print(f"  Filtering for Request ID: {args.request_id}")
     print(f"{'*'*80}\n")
     
+    if args.batch:
+        run_batch(args)
+        return
+    
     while True:
         approval_data, ack_id = get_pending_approval(args.project_id, args.environment, args.request_id)
         
@@ -137,12 +355,9 @@ def main():
             else:
                 sys.exit(0)
         
-        state = approval_data['state']
-        request_id = approval_data['request_id']
-        
-        print_state_summary(state)
+        print_state_summary(approval_data)
         
-        approval_stage = determine_approval_stage(state)
+        approval_stage = determine_approval_stage(approval_data)
         
         if approval_stage == 'initial':
             print("\nOptions (Initial Plan):")
@@ -192,7 +407,7 @@ def main():
         send_approval_response(
             args.project_id,
             args.environment,
-            request_id,
+            approval_data,
             action,
             feedback if feedback else None
         )
@@ -1,7 +1,8 @@
 from langgraph.graph import StateGraph
+from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
-from typing import List, Optional, Dict, Any, Literal, Union
-from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Any, Literal, Union, Annotated
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from enum import Enum
 from datetime import datetime
 
@@ -35,6 +36,16 @@ class CallFunction(str, Enum):
     READ_FILE          = "read_file"
     WRITE_FILE         = "write_file"
 
+class ApprovalDecision(BaseModel):
+    """Outcome of the auto-approval policy for one approval stage (audit trail)."""
+    stage: str
+    decision: Literal["auto_approved", "human"]
+    rule: Optional[str] = None
+    reasons: List[str] = []       # why each rule did not match
+    action: Optional[str] = None  # the response applied (approve, reject, ...)
+    plan_version: int = 1
+    decided_at: datetime = Field(default_factory=datetime.utcnow)
+
 class MetaState(BaseModel):
     request_id: str
     project_id: str
@@ -42,8 +53,10 @@ class MetaState(BaseModel):
     plan_loaded: bool = False
     schema_version: str = "0.1"
     status: WorkflowStatus = WorkflowStatus.RUNNING
-    current_step_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # step_id -> hash of each step as last shown to a reviewer; approval requests list what changed since
+    reviewed_steps: Dict[str, str] = {}
+    approval_decisions: List[ApprovalDecision] = []
     @field_validator("status", mode="before")
     def normalize_status(cls, v):
         if isinstance(v, str):
@@ -63,12 +76,25 @@ class CodeProposal(BaseModel):
     content: str
     rationale: Optional[str] = None
     confidence: Optional[float] = None
+    # frozen code is never regenerated by per-step generation unless its step failed
+    frozen: bool = False
 
 class ErrorRefinement(BaseModel):
     description: str
     evidence: Optional[str] = None
     resolutions: Optional[str] = None
 
+class CostEstimate(BaseModel):
+    # ok | invalid (dry run rejected the SQL) | over_budget | unavailable (e.g. reads tables an earlier step creates)
+    status: Literal["ok", "invalid", "over_budget", "unavailable"] = "ok"
+    bytes_processed: Optional[int] = None
+    estimated_cost_usd: Optional[float] = None
+    referenced_tables: List[str] = []
+    statement_type: Optional[str] = None
+    error: Optional[str] = None
+    sql_fingerprint: Optional[str] = None
+    estimated_at: datetime = Field(default_factory=datetime.utcnow)
+
 class PlanApproval(BaseModel):
     status: Approval = Approval.PENDING
     approved_at: Optional[datetime] = None
@@ -90,11 +116,14 @@ class PlanStep(BaseModel):
     call_function_args: Dict[str, Any] = Field(default_factory=dict)
     expected_outputs: List[str] = []
     execution_outputs_step_id: Optional[str] = None
+    # None = runs after the previous step; [] = independent; otherwise the step_ids it waits on
+    depends_on: Optional[List[str]] = None
     code: Optional[CodeProposal] = None
     completed: bool = False
     failed: bool = False
     error: Optional[str] = None
     error_refinement: Optional[ErrorRefinement] = None
+    cost_estimate: Optional[CostEstimate] = None
     @field_validator("step_type", mode="before")
     def normalize_step_type(cls, v):
         if isinstance(v, str):
@@ -103,6 +132,13 @@ class PlanStep(BaseModel):
             except ValueError:
                 raise ValueError(f"Invalid step_type: {v}")
         return v
+    @field_validator("depends_on", mode="before")
+    def normalize_depends_on(cls, v):
+        if v is None:
+            return v
+        if not isinstance(v, list):
+            v = [v]
+        return [str(d) for d in v]
     @field_validator("call_function", mode="before")
     def normalize_call_function(cls, v):
         if isinstance(v, CallFunction):
@@ -118,6 +154,9 @@ class PlanStep(BaseModel):
                 raise ValueError(f"Invalid call_function: {v}")
         raise ValueError(f"Invalid call_function: {v}")
 
+def _is_pending(step: PlanStep) -> bool:
+    return not step.completed and not step.failed
+
 class PlanState(BaseModel):
     goal: Optional[str] = None
     agent_comments: Optional[str] = None
@@ -125,6 +164,90 @@ class PlanState(BaseModel):
     max_steps: int = 20
     version: int = 1
     approval: PlanApproval = Field(default_factory=PlanApproval)
+    # Cursor: first step that is neither completed nor failed, kept current by with_patches()
+    current_step_id: Optional[str] = None
+    # step_id -> position, and positions of failed steps; rebuilt on validation and checkpoint load
+    _positions: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _failed: frozenset = PrivateAttr(default_factory=frozenset)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._positions = {s.step_id: i for i, s in enumerate(self.steps)}
+        self._failed = frozenset(i for i, s in enumerate(self.steps) if s.failed)
+        if self.current_step_id is None:
+            self.current_step_id = self._next_pending(0)
+
+    def _next_pending(self, start: int) -> Optional[str]:
+        return next((s.step_id for s in self.steps[start:] if _is_pending(s)), None)
+
+    def get_step(self, step_id: Optional[str]) -> Optional[PlanStep]:
+        position = self._positions.get(step_id)
+        return self.steps[position] if position is not None else None
+
+    def current_step(self) -> Optional[PlanStep]:
+        return self.get_step(self.current_step_id)
+
+    def dependencies(self, step_id: str) -> set:
+        """
+        step_ids a step waits on: depends_on (None means the previous step) plus
+        execution_outputs_step_id.
+        """
+        position = self._positions[step_id]
+        step = self.steps[position]
+        if step.depends_on is None:
+            deps = {self.steps[position - 1].step_id} if position > 0 else set()
+        else:
+            deps = set(step.depends_on)
+        if step.execution_outputs_step_id:
+            deps.add(step.execution_outputs_step_id)
+        deps.discard(step.step_id)
+        return deps
+
+    def first_failed_step(self) -> Optional[PlanStep]:
+        return self.steps[min(self._failed)] if self._failed else None
+
+    def with_patches(self, patches: Dict[str, Dict[str, Any]]) -> "PlanState":
+        """Copy with fields changed on the given steps; positions stay put, so the indexes carry over."""
+        steps = list(self.steps)
+        failed = set(self._failed)
+        cursor = self._positions.get(self.current_step_id, len(steps))
+        for step_id, fields in patches.items():
+            position = self._positions.get(step_id)
+            if position is None:
+                continue
+            step = PlanStep.model_validate({**dict(steps[position]), **fields})
+            steps[position] = step
+            (failed.add if step.failed else failed.discard)(position)
+            if _is_pending(step):
+                cursor = min(cursor, position)
+        plan = self.model_copy(update={"steps": steps})
+        plan._positions = self._positions
+        plan._failed = frozenset(failed)
+        plan.current_step_id = plan._next_pending(cursor)
+        return plan
+
+class ColumnProfile(BaseModel):
+    # Sample statistics: computed over the preview rows only, not the full result
+    name: str
+    type: str
+    null_count: int = 0
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    distinct_count: Optional[int] = None  # exact over the preview rows; a lower bound for the full result
+    top_values: List[Dict[str, Any]] = []
+
+class ResultPreview(BaseModel):
+    total_rows: Optional[int] = None
+    preview_rows: int = 0  # sample size the column statistics cover
+    truncated: bool = False
+    columns: List[ColumnProfile] = []
+    rows: List[Dict[str, Any]] = []
+
+class ContentRef(BaseModel):
+    # Content spilled to the blob store (utils/blob_store.py); resolve with load_content()
+    uri: str
+    sha256: str
+    size: int
+    media_type: Optional[str] = None
 
 class ExecutionOutput(BaseModel):
     type: str
@@ -132,6 +255,9 @@ class ExecutionOutput(BaseModel):
     role: str
     description: str
     content: Optional[bytes] = None
+    content_ref: Optional[ContentRef] = None
+    preview: Optional[ResultPreview] = None
+    bytes_billed: Optional[int] = None
 
 class ExecutionRecord(BaseModel):
     step_id: str
@@ -150,8 +276,37 @@ class ExecutionRecord(BaseModel):
         return v
     
 class ExecutionState(BaseModel):
+    # Append-only: with_records() returns a copy, never changing this state's list
     executions: List[ExecutionRecord] = []
     blocked_reason: Optional[str] = None
+    # step_id -> positions of its records; rebuilt on validation and checkpoint load
+    _by_step: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        by_step: Dict[str, List[int]] = {}
+        for i, record in enumerate(self.executions):
+            by_step.setdefault(record.step_id, []).append(i)
+        self._by_step = by_step
+
+    def for_step(self, step_id: Optional[str]) -> List[ExecutionRecord]:
+        return [self.executions[i] for i in self._by_step.get(step_id, [])]
+
+    def latest(self, step_id: Optional[str]) -> Optional[ExecutionRecord]:
+        positions = self._by_step.get(step_id)
+        return self.executions[positions[-1]] if positions else None
+
+    def with_records(self, records: List[ExecutionRecord], **changes) -> "ExecutionState":
+        """
+        Copy with records appended, leaving this state untouched (earlier snapshots, e.g.
+        stream_mode="values", keep their history). Only the index entries of the records'
+        steps are copied; the rest of the index is shared.
+        """
+        by_step = dict(self._by_step)
+        for i, record in enumerate(records, start=len(self.executions)):
+            by_step[record.step_id] = [*by_step.get(record.step_id, []), i]
+        execution = self.model_copy(update={**changes, "executions": [*self.executions, *records]})
+        execution._by_step = by_step
+        return execution
 
 class AnalysisSummary(BaseModel):
     summary: str
@@ -162,18 +317,128 @@ class ResultsState(BaseModel):
     outputs: List[str] = []
     analysis: Optional[AnalysisSummary] = None
 
+class LLMCallRecord(BaseModel):
+    agent_name: str
+    model: str
+    provider: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+    cached: bool = False
+    called_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UsageState(BaseModel):
+    # Append-only: append_usage() returns a copy with a new list
+    calls: List[LLMCallRecord] = []
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate LLM calls per agent and for the whole request."""
+        def _empty():
+            return {"calls": 0, "cache_hits": 0, "input_tokens": 0, "output_tokens": 0, "latency_ms": 0.0, "cost_usd": 0.0}
+
+        totals = _empty()
+        by_agent: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            for agg in (totals, by_agent.setdefault(call.agent_name, _empty())):
+                agg["calls"]         += 1
+                agg["cache_hits"]    += int(call.cached)
+                agg["input_tokens"]  += call.input_tokens
+                agg["output_tokens"] += call.output_tokens
+                agg["latency_ms"]    += call.latency_ms
+                agg["cost_usd"]      += call.cost_usd
+        return {
+            "totals": totals,
+            "by_agent": by_agent,
+            "calls": [c.model_dump(mode="json") for c in self.calls],
+        }
+
 class FileLoadParameters(BaseModel):
     path: str
+    # Optional sampling for large objects (reads are always capped at files.read_max_bytes)
+    max_bytes: Optional[int] = None
+    offset: int = 0
+    length: Optional[int] = None
+    max_records: Optional[int] = None  # first N lines of CSV/JSONL/text, or rows of Parquet
+    format: Optional[str] = None       # overrides detection from the file extension
 
 class FileWriteParameters(BaseModel):
     path: str
     content: Any
     format: str = "text"
+    compression: Optional[str] = None  # gzip or zstd (Parquet: page codec); defaults from .gz/.zst suffix
+    indent: Optional[int] = None       # JSON is written compact unless set
+
+# ---- Reducers ----
+# Nodes return deltas; these merge them into the current value so a node's cost does not
+# grow with the size of the plan or the history. Executions and usage calls are append-only
+# lists; appending builds a new list so states already handed out (stream snapshots, states
+# without a checkpointer) never change under their holders.
+
+# Step fields that make up what a reviewer approves; patching any of them makes a new plan version
+PLAN_CONTENT_FIELDS = {"step_type", "description", "call_function", "call_function_args", "depends_on", "code"}
+
+
+def merge_plan(current: PlanState, update: Union[PlanState, Dict[str, Any], None]) -> PlanState:
+    """
+    A PlanState, or a dict with "steps", replaces the plan (the orchestrator's new plans).
+    Any other dict is a delta: "step_patches" maps step_id -> fields to change on that step,
+    "approval" fields are merged into the plan approval and remaining keys are set on the plan.
+    version goes up when a plan with steps is replaced (recreated) or its steps' content is
+    patched (generated, regenerated); status patches such as completed/failed keep it.
+    """
+    if update is None:
+        return current
+    if isinstance(update, PlanState):
+        return update
+    if "steps" in update:
+        plan = PlanState.model_validate(update)
+        if current.steps and "version" not in update:
+            plan.version = current.version + 1
+        return plan
+
+    changes = dict(update)
+    patches = changes.pop("step_patches", None) or {}
+    if "version" not in changes and any(PLAN_CONTENT_FIELDS & fields.keys() for fields in patches.values()):
+        changes["version"] = current.version + 1
+    plan = current.with_patches(patches) if patches else current
+    if "approval" in changes:
+        changes["approval"] = PlanApproval.model_validate({**dict(current.approval), **changes["approval"]})
+    if not changes:
+        return plan
+    updated = plan.model_copy(update=changes)
+    updated._positions, updated._failed = plan._positions, plan._failed
+    return updated
+
+
+def append_executions(current: ExecutionState, update: Union[ExecutionState, Dict[str, Any], None]) -> ExecutionState:
+    """An ExecutionState replaces; a dict's "executions" are appended and other keys set."""
+    if update is None:
+        return current
+    if isinstance(update, ExecutionState):
+        return update
+    changes = dict(update)
+    records = [ExecutionRecord.model_validate(r) for r in changes.pop("executions", [])]
+    return current.with_records(records, **changes)
+
+
+def append_usage(current: UsageState, update: Union[UsageState, Dict[str, Any], None]) -> UsageState:
+    """A UsageState replaces; a dict's "calls" are appended."""
+    if update is None:
+        return current
+    if isinstance(update, UsageState):
+        return update
+    calls = [LLMCallRecord.model_validate(c) for c in update.get("calls", [])]
+    if not calls:
+        return current
+    return current.model_copy(update={"calls": [*current.calls, *calls]})
+
 
 class AgentState(BaseModel):
     meta: MetaState
     request: RequestState
-    plan: PlanState = Field(default_factory=PlanState)
-    execution: ExecutionState = Field(default_factory=ExecutionState)
+    plan: Annotated[PlanState, merge_plan] = Field(default_factory=PlanState)
+    execution: Annotated[ExecutionState, append_executions] = Field(default_factory=ExecutionState)
     results: ResultsState = Field(default_factory=ResultsState)
-    messages: List[BaseMessage] = Field(default_factory=list)
\ No newline at end of file
+    usage: Annotated[UsageState, append_usage] = Field(default_factory=UsageState)
+    messages: Annotated[List[BaseMessage], add_messages] = Field(default_factory=list)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Modules load config/ and prompts relative to the app directory
+APP_DIR = Path(__file__).resolve().parent.parent
+os.chdir(APP_DIR)
+sys.path.insert(0, str(APP_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
@@ -0,0 +1,81 @@
+import pytest
+from state.state import AgentState, MetaState, RequestState, PlanState, PlanStep, CodeProposal, CostEstimate
+from utils import approval_policy
+
+
+def _query(sql=None, estimate=None, step_id="1"):
+    code = CodeProposal(language="sql", content=sql) if sql else None
+    return PlanStep(step_id=step_id, step_type="EXECUTE", description="d", call_function="execute_query",
+                    code=code, cost_estimate=estimate)
+
+
+def _estimate(bytes_processed=100, tables=("p.sales.orders",), statement_type="SELECT", status="ok"):
+    return CostEstimate(status=status, bytes_processed=bytes_processed, referenced_tables=list(tables),
+                        statement_type=statement_type)
+
+
+def _state(*steps):
+    return AgentState(meta=MetaState(request_id="r", project_id="p"), request=RequestState(original_prompt="x"),
+                      plan=PlanState(steps=list(steps)))
+
+
+@pytest.mark.parametrize("sql, statement_type, expected", [
+    (None, None, {"pending"}),
+    ("SELECT * FROM sales.orders", "SELECT", {"read_only"}),
+    ("WITH recent AS (SELECT * FROM sales.orders) SELECT * FROM recent", "SELECT", {"read_only"}),
+    ("SELECT 1; DROP TABLE sales.orders", "SCRIPT", {"read_only", "ddl"}),
+    ("CREATE TABLE sales.totals AS SELECT 1", "CREATE_TABLE_AS_SELECT", {"ddl"}),
+    ("INSERT INTO sales.totals SELECT 1", "INSERT", {"dml"}),
+    # the dry run's statement type counts even where sqlparse sees a SELECT
+    ("SELECT 1", "CREATE_TABLE_AS_SELECT", {"read_only", "ddl"}),
+])
+def test_statement_classes(sql, statement_type, expected):
+    estimate = _estimate(statement_type=statement_type) if statement_type else None
+    assert approval_policy.statement_classes(_query(sql, estimate)) == expected
+
+
+def test_step_datasets():
+    select = _query("SELECT * FROM sales.orders", _estimate())
+    assert approval_policy.step_datasets(select, "p") == {"p.sales"}
+    ctas = _query("CREATE TABLE reports.totals AS SELECT * FROM sales.orders", _estimate(statement_type="CREATE_TABLE_AS_SELECT"))
+    assert approval_policy.step_datasets(ctas, "p") == {"p.sales", "p.reports"}
+    assert approval_policy.step_datasets(_query("SELECT 1"), "p") is None
+    assert approval_policy.step_datasets(_query("SELECT 1", _estimate(status="unavailable")), "p") is None
+
+
+RULE = {
+    "stages": ["generation"],
+    "statement_classes": ["read_only"],
+    "max_bytes_per_step": 1000,
+    "max_total_bytes": 1500,
+    "datasets": ["p.sales"],
+}
+
+
+@pytest.mark.parametrize("steps, reason", [
+    ([_query("SELECT * FROM sales.orders", _estimate())], None),
+    ([_query("WITH o AS (SELECT * FROM sales.orders) SELECT * FROM o", _estimate())], None),
+    ([_query("SELECT 1; DROP TABLE sales.orders", _estimate(statement_type="SCRIPT"))], "step 1 SQL is ddl"),
+    ([_query("CREATE TABLE sales.t AS SELECT 1", _estimate(statement_type="CREATE_TABLE_AS_SELECT"))], "step 1 SQL is ddl"),
+    ([_query("SELECT * FROM sales.orders")], "step 1 has no dry-run estimate"),
+    ([_query("SELECT * FROM sales.orders", _estimate(bytes_processed=None, status="unavailable"))], "step 1 has no dry-run estimate"),
+    ([_query("SELECT * FROM sales.orders", _estimate(bytes_processed=2000))], "step 1 processes 2000 bytes"),
+    ([_query("SELECT 1", _estimate(900)), _query("SELECT 2", _estimate(900), step_id="2")], "plan processes 1800 bytes"),
+    ([_query("SELECT * FROM hr.salaries", _estimate(tables=["p.hr.salaries"]))], "step 1 uses p.hr"),
+])
+def test_check_generation_rule(steps, reason):
+    assert approval_policy._check(RULE, _state(*steps), "generation") == reason
+
+
+def test_check_skips_other_stages():
+    assert approval_policy._check(RULE, _state(_query()), "initial") == "stage initial not in ['generation']"
+
+
+def test_evaluate_policy_records_why_no_rule_matched(monkeypatch):
+    monkeypatch.setattr(approval_policy, "load_policy", lambda: {"enabled": True, "rules": [{"name": "cheap", **RULE}]})
+    state = _state(_query("SELECT 1; DROP TABLE sales.orders", _estimate(statement_type="SCRIPT")))
+    decision = approval_policy.evaluate_policy(state, "generation")
+    assert decision.decision == "human"
+    assert decision.reasons == ["cheap: step 1 SQL is ddl"]
+    approved = approval_policy.evaluate_policy(_state(_query("SELECT 1", _estimate())), "generation")
+    assert (approved.decision, approved.rule) == ("auto_approved", "cheap")
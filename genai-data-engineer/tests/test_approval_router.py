@@ -0,0 +1,32 @@
+import asyncio
+from utils.approval_router import ApprovalRouter
+
+
+def _router():
+    router = ApprovalRouter("projects/p/subscriptions/s")
+    router.start = lambda: None
+    return router
+
+
+def test_response_after_timeout_is_buffered_for_the_next_wait():
+    router = _router()
+    assert router.wait("r1", timeout=0.01) is None
+    router.deliver({"request_id": "r1", "action": "approve"})
+    assert router.wait("r1", timeout=0.01) == {"request_id": "r1", "action": "approve"}
+
+
+def test_response_delivered_while_abandoning_is_returned():
+    router = _router()
+    future = router.register("r1")
+    router.deliver({"request_id": "r1", "action": "approve"})
+    # the waiter timed out just before the delivery landed
+    assert router._abandon("r1", future) == {"request_id": "r1", "action": "approve"}
+
+
+def test_abandoned_async_wait_leaves_the_response_to_the_default_handler():
+    router = _router()
+    handled = []
+    router.default_handler = lambda data: handled.append(data) or True
+    assert asyncio.run(router.await_response("r1", timeout=0.01)) is None
+    router.deliver({"request_id": "r1", "action": "approve"})
+    assert handled == [{"request_id": "r1", "action": "approve"}]
@@ -0,0 +1,20 @@
+from google.cloud.bigquery import _helpers
+from utils.bq_schema import modified_millis, modified_signature, table_modified_signature
+
+
+class FakeTable:
+    def __init__(self, modified):
+        self.modified = modified
+
+
+def test_table_signature_matches_tables_last_modified_time():
+    # Table.modified is built from the API's lastModifiedTime milliseconds; the signature must
+    # round-trip to that integer, as __TABLES__.last_modified_time reports it
+    for ms in range(1700000000000, 1700000000000 + 20000, 7):
+        modified = _helpers._datetime_from_microseconds(1000.0 * float(ms))
+        assert modified_millis(modified) == ms
+        assert table_modified_signature(FakeTable(modified)) == modified_signature(1, ms)
+
+
+def test_table_without_modified_time_has_no_signature():
+    assert table_modified_signature(FakeTable(None)) is None
@@ -0,0 +1,45 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from state.state import AgentState, MetaState, RequestState, PlanState, PlanStep, CodeProposal, ApprovalDecision, merge_plan
+from workflows.routing import route_from_execution
+from agents import executor
+
+
+def _state():
+    step = PlanStep(step_id="1", step_type="EXECUTE", description="d", call_function="execute_query",
+                    code=CodeProposal(language="sql", content="SELECT 1"))
+    return AgentState(meta=MetaState(request_id="r", project_id="p"), request=RequestState(original_prompt="x"),
+                      plan=PlanState(steps=[step]))
+
+
+def test_fallback_without_tool_calls_fails_the_step():
+    state = _state()
+    update = executor._tool_call_update(state, state.plan.steps[0], [HumanMessage(content="run")],
+                                        AIMessage(content="I cannot help with that"))
+
+    plan = merge_plan(state.plan, update["plan"])
+    assert plan.get_step("1").failed
+    assert not update["execution"]["executions"][0].success
+    # the step goes to refine instead of back to execute
+    after = state.model_copy(update={"plan": plan, "messages": update["messages"]})
+    assert route_from_execution(after) == "refine"
+
+
+def _auto_approved(state):
+    decision = ApprovalDecision(stage="generation", decision="auto_approved", rule="read-only")
+    return state.model_copy(update={"meta": state.meta.model_copy(update={"approval_decisions": [decision]})})
+
+
+def test_auto_approved_step_only_binds_its_call_function():
+    state = _state()
+    step = state.plan.steps[0]
+    assert executor._executor_tools(state, step) == executor.AVAILABLE_TOOLS
+    assert [t.name for t in executor._executor_tools(_auto_approved(state), step)] == ["execute_query"]
+
+
+def test_auto_approved_step_fails_on_other_tool_calls():
+    state = _auto_approved(_state())
+    response = AIMessage(content="", tool_calls=[{"name": "write_file", "args": {}, "id": "c1"}])
+    update = executor._tool_call_update(state, state.plan.steps[0], [HumanMessage(content="run")], response)
+
+    assert update["plan"]["step_patches"]["1"]["failed"]
+    assert "messages" not in update
@@ -0,0 +1,57 @@
+import gzip
+import pytest
+import pyarrow as pa
+from types import SimpleNamespace
+from google.cloud.storage.fileio import BlobWriter
+from state.state import FileWriteParameters
+from utils import gcs_io
+
+
+class _Upload:
+    def __init__(self, blob, stream):
+        self.blob, self.stream = blob, stream
+
+    def transmit_next_chunk(self, transport, **kwargs):
+        self.blob.uploaded = self.stream.read()
+
+
+class _Blob:
+    """Just enough of storage.Blob for a real BlobWriter; the object exists once the upload is finalized."""
+    bucket = SimpleNamespace(client=None)
+
+    def __init__(self):
+        self.uploaded = None
+
+    def open(self, mode, **kwargs):
+        return BlobWriter(self, **kwargs)
+
+    def _initiate_resumable_upload(self, client, stream, content_type, size, **kwargs):
+        return _Upload(self, stream), None
+
+
+@pytest.mark.parametrize("path", ["gs://b/out.jsonl", "gs://b/out.jsonl.gz"])
+def test_written_object_is_finalized(path):
+    blob = _Blob()
+    gcs_io.write_blob(blob, FileWriteParameters(path=path, format="jsonl", content=[{"a": 1}]))
+    data = gzip.decompress(blob.uploaded) if path.endswith(".gz") else blob.uploaded
+    assert data == b'{"a":1}\n'
+
+
+@pytest.mark.parametrize("path", ["gs://b/out.jsonl", "gs://b/out.jsonl.gz"])
+def test_failing_write_leaves_no_object(path):
+    blob = _Blob()
+    params = FileWriteParameters(path=path, format="jsonl", content=[{"a": 1}, {"b": object()}])
+    with pytest.raises(TypeError):
+        gcs_io.write_blob(blob, params)
+    assert blob.uploaded is None
+
+
+def test_csv_within_keeps_whole_rows():
+    table = pa.table({"id": list(range(100)), "name": [f"name-{i}" for i in range(100)]})
+    full, rows = gcs_io.csv_within(table, 1 << 20)
+    assert rows == 100
+    content, rows = gcs_io.csv_within(table, len(full) // 3)
+    assert 0 < rows < 100
+    assert len(content) <= len(full) // 3
+    assert content.endswith(b"\n") and full.startswith(content)
+    assert content.count(b"\n") == rows + 1  # header plus whole rows
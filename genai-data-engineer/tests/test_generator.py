@@ -0,0 +1,53 @@
+import json
+import pytest
+from langchain_core.messages import AIMessage
+from state.state import AgentState, MetaState, RequestState, PlanState, PlanStep, CodeProposal, merge_plan
+from agents import generator
+
+STEP_IDS = ["1", "2", "3", "load_users"]
+
+
+@pytest.mark.parametrize("feedback, expected", [
+    ("regenerate step 2", {"2"}),
+    ("regenerate steps 2 and 3", {"2", "3"}),
+    ("steps 1, 2 & 3 need better joins", {"1", "2", "3"}),
+    ("Steps 1,3 or 2 are wrong", {"1", "2", "3"}),
+    ("step_id: load_users is slow", {"load_users"}),
+    ("fix load_users", {"load_users"}),
+    ("steps 2 and then add a filter", {"2"}),
+    ("use fewer tables", set()),
+    ("step 7 is wrong", set()),
+])
+def test_flagged_step_ids(feedback, expected):
+    assert generator._flagged_step_ids(feedback, STEP_IDS) == expected
+
+
+def _state(feedback):
+    steps = [
+        PlanStep(step_id=step_id, step_type="EXECUTE", description="d", call_function="execute_query",
+                 code=CodeProposal(language="sql", content=f"SELECT {step_id}"))
+        for step_id in ("1", "2", "3")
+    ]
+    plan = PlanState(steps=steps)
+    plan.approval.human_feedback = feedback
+    return AgentState(meta=MetaState(request_id="r", project_id="p"), request=RequestState(original_prompt="x"), plan=plan)
+
+
+def test_steps_to_generate_follows_listed_ids():
+    state = _state("regenerate steps 2 and 3")
+    assert [s.step_id for s in generator._steps_to_generate(state)] == ["2", "3"]
+
+
+def test_generation_clears_applied_feedback():
+    state = _state("regenerate steps 2 and 3")
+    response = AIMessage(content=json.dumps({"plan": {"steps": [
+        {"step_id": "2", "code": {"language": "sql", "content": "SELECT 22"}},
+    ]}}))
+    update = generator._generator_update(state, response)
+    plan = merge_plan(state.plan, update["plan"])
+
+    assert plan.approval.human_feedback is None
+    assert plan.get_step("2").code.content == "SELECT 22"
+    # a later refine loop without new feedback leaves reviewed code alone
+    refined = state.model_copy(update={"plan": plan})
+    assert generator._steps_to_generate(refined) == []
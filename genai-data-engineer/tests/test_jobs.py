@@ -0,0 +1,62 @@
+import pytest
+from workflows.jobs import JobManager, JobStatus
+from workflows.workflow import StaleApprovalResponse
+
+INITIAL = {"stage": "initial", "interrupt_id": "i1"}
+GENERATION = {"stage": "generation", "interrupt_id": "g1"}
+
+
+class FakeRunner:
+    def __init__(self, fail_resume=False, paused_after_failure=INITIAL):
+        self.fail_resume = fail_resume
+        self.pending = INITIAL
+        self.paused_after_failure = paused_after_failure
+
+    def run(self, **kwargs):
+        return {"status": "COMPLETE"}
+
+    def resume(self, request_id, response, on_event=None):
+        if self.fail_resume:
+            # The graph may have moved on to the next pause before the failure
+            self.pending = self.paused_after_failure
+            raise RuntimeError("checkpoint store unavailable")
+        return {"status": "COMPLETE"}
+
+    def pending_approval(self, request_id):
+        return self.pending
+
+
+def _wait(job, timeout=5):
+    for _ in job.iter_events(timeout=timeout):
+        pass
+
+
+def test_request_locks_are_released_when_jobs_finish():
+    manager = JobManager(FakeRunner(), max_workers=2)
+    jobs = [manager.submit_run("r1", "prompt", "p") for _ in range(3)] + [manager.submit_run("r2", "prompt", "p")]
+    for job in jobs:
+        _wait(job)
+    manager._pool.shutdown(wait=True)
+    assert all(job.status == JobStatus.COMPLETE for job in jobs)
+    assert manager._request_locks == {}
+    assert manager._request_jobs == {}
+
+
+@pytest.mark.parametrize("paused_after_failure, republished", [(INITIAL, 1), (GENERATION, 0), (None, 0)])
+def test_failed_resume_hands_back_unconsumed_response(paused_after_failure, republished):
+    calls = []
+    manager = JobManager(FakeRunner(fail_resume=True, paused_after_failure=paused_after_failure),
+                         on_resume_failed=calls.append)
+    job = manager.submit_resume("r1", {"request_id": "r1", "action": "approve", **INITIAL})
+    _wait(job)
+    assert job.status == JobStatus.ERROR
+    assert len(calls) == republished
+    assert all(call["stage"] == "initial" and call["interrupt_id"] == "i1" for call in calls)
+
+
+@pytest.mark.parametrize("answers", [GENERATION, {"stage": "initial", "interrupt_id": "i0"}, {}])
+def test_resume_for_another_pause_is_not_queued(answers):
+    manager = JobManager(FakeRunner())
+    with pytest.raises(StaleApprovalResponse):
+        manager.submit_resume("r1", {"request_id": "r1", "action": "approve", **answers})
+    assert manager._jobs == {}
@@ -0,0 +1,42 @@
+import sqlite3
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph.message import add_messages
+from utils_llm import llm_cache
+
+
+def test_cache_operations_close_their_connections(tmp_path, monkeypatch):
+    opened, real_connect = [], sqlite3.connect
+
+    def connect(*args, **kwargs):
+        opened.append(real_connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(llm_cache.sqlite3, "connect", connect)
+    cache = llm_cache.LLMResponseCache(path=str(tmp_path / "cache.sqlite"), mode="read_write")
+    cache.put("k", "executor", AIMessage(content="hi"))
+    assert cache.get("k").content == "hi"
+
+    assert len(opened) == 3
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")  # closed
+
+
+def test_cached_response_is_appended_as_a_new_message(tmp_path):
+    cache = llm_cache.LLMResponseCache(path=str(tmp_path / "cache.sqlite"), mode="read_write")
+    original = AIMessage(content="", id="run-1",
+                         tool_calls=[{"name": "execute_query", "args": {"sql": "SELECT 1"}, "id": "call_abc"}])
+    cache.put("k", "executor", original)
+
+    # the same prompt twice in one thread, each answered from the cache
+    messages = add_messages([HumanMessage(content="run step 1", id="h1")], [original])
+    first, second = cache.get("k"), cache.get("k")
+    messages = add_messages(messages, [HumanMessage(content="run step 1", id="h2"), first])
+    messages = add_messages(messages, [HumanMessage(content="run step 1", id="h3"), second])
+
+    assert [m.type for m in messages] == ["human", "ai", "human", "ai", "human", "ai"]
+    tool_call_ids = [t["id"] for m in messages if m.type == "ai" for t in m.tool_calls]
+    assert len(set(tool_call_ids)) == 3
+    assert all(i.startswith("call_") for i in tool_call_ids)
+    assert second.tool_calls[0]["args"] == {"sql": "SELECT 1"}
@@ -0,0 +1,46 @@
+import pytest
+from datetime import datetime
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt.tool_node import msg_content_output
+from agents import executor
+from state.state import PlanStep
+from state.state import AgentState, MetaState, RequestState, ExecutionState, ExecutionRecord, ExecutionOutput
+from utils import query_cost
+
+
+def _state(*outputs, success=True):
+    record = ExecutionRecord(step_id="1", action_ref="SELECT 1", started_at=datetime.utcnow(),
+                             success=success, output_content=list(outputs))
+    return AgentState(meta=MetaState(request_id="r", project_id="p"), request=RequestState(original_prompt="x"),
+                      execution=ExecutionState(executions=[record]))
+
+
+def _output(billed):
+    return ExecutionOutput(type="result", uri="job://j", role="final", description="bytes_billed=1 rows", bytes_billed=billed)
+
+
+def test_bytes_spent_counts_direct_and_tool_node_results():
+    # execute_query returns a dict, which the ToolNode hop stores as JSON ToolMessage content
+    step = PlanStep(step_id="1", step_type="EXECUTE", description="d", call_function="execute_query")
+    content = msg_content_output(_output(250).model_dump(mode="json"))
+    update = executor._tool_result_update(None, step, [
+        ToolMessage(content=content, tool_call_id="call_1"),
+        ToolMessage(content="3 files listed", tool_call_id="call_2"),
+    ])
+    [record] = update["execution"]["executions"]
+    assert record.output_content[0] == _output(250)
+    state = _state(_output(100), *record.output_content)
+    assert query_cost.bytes_spent(state) == 350
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(query_cost, "cost_config", lambda: {
+        "max_bytes_billed_per_step": 1000, "max_bytes_billed_per_request": 1300,
+    })
+
+
+def test_concurrent_steps_split_the_remaining_budget(budget):
+    state = _state(_output(100))
+    assert query_cost.step_bytes_limit(state) == 1000
+    assert query_cost.step_bytes_limit(state, concurrent=4) == 300
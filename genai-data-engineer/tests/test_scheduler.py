@@ -0,0 +1,57 @@
+import pytest
+from state.state import AgentState, MetaState, RequestState, PlanState, PlanStep
+from workflows import scheduler
+
+DEFAULT = object()  # depends_on left unset: the previous step
+
+
+def _step(step_id, step_type="EXECUTE", depends_on=DEFAULT, outputs_of=None, done=False):
+    fields = {"depends_on": depends_on} if depends_on is not DEFAULT else {}
+    return PlanStep(step_id=step_id, step_type=step_type, description="d", execution_outputs_step_id=outputs_of,
+                    completed=done, **fields)
+
+
+def _state(*steps):
+    return AgentState(meta=MetaState(request_id="r", project_id="p"), request=RequestState(original_prompt="x"),
+                      plan=PlanState(steps=list(steps)))
+
+
+# (steps, ready, steps_to_run)
+CASES = {
+    "depends_on None means the previous step": (
+        [_step("1"), _step("2"), _step("3")], ["1"], ["1"]),
+    "previous step completed": (
+        [_step("1", done=True), _step("2"), _step("3")], ["2"], ["2"]),
+    "independent steps run together": (
+        [_step("1", depends_on=[]), _step("2", depends_on=[]), _step("3", depends_on=["1", "2"])], ["1", "2"], ["1", "2"]),
+    "explicit dependencies completed": (
+        [_step("1", depends_on=[], done=True), _step("2", depends_on=[], done=True), _step("3", depends_on=["1", "2"])],
+        ["3"], ["3"]),
+    "execution_outputs_step_id is an implicit edge": (
+        [_step("1", depends_on=[]), _step("2", depends_on=[]), _step("3", depends_on=[], outputs_of="1")],
+        ["1", "2"], ["1", "2"]),
+    "implicit edge satisfied": (
+        [_step("1", depends_on=[], done=True), _step("2", depends_on=[]), _step("3", depends_on=[], outputs_of="1")],
+        ["2", "3"], ["2", "3"]),
+    "nothing after a pending AWAIT_PROCEED starts": (
+        [_step("1", depends_on=[]), _step("2", "AWAIT_PROCEED"), _step("3", depends_on=[])], ["1"], ["1"]),
+    "pending AWAIT_PROCEED is not run by the scheduler": (
+        [_step("1", done=True), _step("2", "AWAIT_PROCEED"), _step("3", depends_on=[])], [], []),
+    "completed AWAIT_PROCEED releases later steps": (
+        [_step("1", done=True), _step("2", "AWAIT_PROCEED", done=True), _step("3", depends_on=[])], ["3"], ["3"]),
+    "ANALYZE steps are not scheduled": (
+        [_step("1", done=True), _step("2", "ANALYZE"), _step("3")], [], []),
+    "cycle falls back to plan order": (
+        [_step("1", depends_on=["2"]), _step("2", depends_on=["1"])], [], ["1"]),
+    "unknown dependency falls back to plan order": (
+        [_step("1", depends_on=["9"]), _step("2")], [], ["1"]),
+    "self dependency is ignored": (
+        [_step("1", depends_on=["1"])], ["1"], ["1"]),
+}
+
+
+@pytest.mark.parametrize("steps, ready, to_run", CASES.values(), ids=CASES.keys())
+def test_ready_steps(steps, ready, to_run):
+    state = _state(*steps)
+    assert [s.step_id for s in scheduler.get_ready_steps(state)] == ready
+    assert [s.step_id for s in scheduler._steps_to_run(state)] == to_run
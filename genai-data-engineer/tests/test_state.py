@@ -0,0 +1,43 @@
+from datetime import datetime
+from state.state import ExecutionState, UsageState, PlanState, append_executions, append_usage, merge_plan
+
+
+def _record(step_id):
+    return {"step_id": step_id, "action_ref": "a", "started_at": datetime.utcnow(), "output_content": []}
+
+
+def test_appending_executions_leaves_earlier_states_unchanged():
+    states = [ExecutionState()]
+    for step_id in ["1", "2", "1"]:
+        states.append(append_executions(states[-1], {"executions": [_record(step_id)]}))
+
+    assert [len(s.executions) for s in states] == [0, 1, 2, 3]
+    assert [r.step_id for r in states[-1].for_step("1")] == ["1", "1"]
+    assert [r.step_id for r in states[2].for_step("1")] == ["1"]
+    assert states[1].latest("2") is None
+    assert states[-1].latest("2").step_id == "2"
+
+
+def test_appending_usage_leaves_earlier_states_unchanged():
+    states = [UsageState()]
+    for _ in range(3):
+        states.append(append_usage(states[-1], {"calls": [{"agent_name": "executor", "model": "m", "provider": "p"}]}))
+
+    assert [s.summary()["totals"]["calls"] for s in states] == [0, 1, 2, 3]
+
+
+def _plan_dict(*step_ids):
+    return {"steps": [{"step_id": s, "step_type": "EXECUTE", "description": "d"} for s in step_ids]}
+
+
+def test_plan_version_follows_recreation_and_content_patches():
+    plan = merge_plan(PlanState(), _plan_dict("1", "2"))
+    assert plan.version == 1
+
+    plan = merge_plan(plan, {"step_patches": {"1": {"code": {"language": "sql", "content": "SELECT 1"}}}})
+    assert plan.version == 2
+    plan = merge_plan(plan, {"step_patches": {"1": {"completed": True}}})
+    assert plan.version == 2
+
+    plan = merge_plan(plan, _plan_dict("1"))
+    assert plan.version == 3
@@ -0,0 +1,139 @@
+"""
+Compact approval request messages.
+A reviewer gets what they decide on - the plan, generated code, cost estimates and which
+steps changed since they last reviewed this request - rather than the whole AgentState
+with its message history, raw LLM responses and file bytes. The JSON is gzip-compressed
+(attribute content_encoding=gzip); above `approvals.payload.offload_threshold_bytes` it
+is put in the blob store and the message carries only its reference (attributes
+payload_ref and payload_sha256, empty data).
+"""
+import gzip
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from state.state import AgentState, ExecutionOutput, PlanState, PlanStep
+from utils.blob_store import store_bytes
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_FORMAT = "approval-request/2"
+
+# The parts of a step a reviewer approves; a change to any of them shows up in the diff
+REVIEWED_FIELDS = {
+    "step_type": True,
+    "description": True,
+    "call_function": True,
+    "call_function_args": True,
+    "depends_on": True,
+    "code": {"language", "content"},
+}
+STEP_FIELDS = {
+    **REVIEWED_FIELDS,
+    "step_id": True,
+    "code": {"language", "content", "rationale"},
+    "cost_estimate": {"status", "bytes_processed", "estimated_cost_usd", "referenced_tables", "statement_type", "error"},
+    "completed": True,
+    "failed": True,
+    "error": True,
+}
+
+
+def payload_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("approvals").get("payload") or {}
+    return {
+        "compression": cfg.get("compression", "gzip"),
+        "offload_threshold_bytes": int(cfg.get("offload_threshold_bytes", 262144)),
+    }
+
+
+def step_hash(step: PlanStep) -> str:
+    reviewed = step.model_dump(mode="json", include=REVIEWED_FIELDS)
+    return hashlib.sha256(json.dumps(reviewed, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def step_hashes(plan: PlanState) -> Dict[str, str]:
+    return {step.step_id: step_hash(step) for step in plan.steps}
+
+
+def plan_changes(plan: PlanState, reviewed: Dict[str, str]) -> Optional[Dict[str, List[str]]]:
+    """Steps added, removed or changed since the last review; None if nothing was reviewed yet."""
+    if not reviewed:
+        return None
+    current = step_hashes(plan)
+    return {
+        "added": [step_id for step_id in current if step_id not in reviewed],
+        "removed": [step_id for step_id in reviewed if step_id not in current],
+        "changed": [step_id for step_id, h in current.items() if step_id in reviewed and reviewed[step_id] != h],
+    }
+
+
+def _outputs(state: AgentState, step_id: str) -> List[Dict[str, Any]]:
+    # Descriptions and row counts only: previews and content stay in the workflow
+    record = state.execution.latest(step_id)
+    if record is None:
+        return []
+    outputs = []
+    for output in record.output_content:
+        if isinstance(output, dict):
+            output = ExecutionOutput.model_validate(output) if "uri" in output else None
+        if isinstance(output, ExecutionOutput):
+            outputs.append({
+                "uri": output.uri,
+                "description": output.description,
+                "total_rows": output.preview.total_rows if output.preview else None,
+            })
+    return outputs
+
+
+def _step_summary(state: AgentState, step: PlanStep) -> Dict[str, Any]:
+    summary = step.model_dump(mode="json", include=STEP_FIELDS, exclude_none=True, exclude_defaults=True)
+    outputs = _outputs(state, step.step_id)
+    if outputs:
+        summary["outputs"] = outputs
+    return summary
+
+
+def build_payload(state: AgentState, stage: str, interrupt_id: Optional[str] = None) -> Dict[str, Any]:
+    """interrupt_id identifies the pause in interrupt mode; responses echo it with the stage."""
+    plan = state.plan
+    estimated = [s.cost_estimate.bytes_processed for s in plan.steps if s.cost_estimate and s.cost_estimate.bytes_processed]
+    return {
+        "format": PAYLOAD_FORMAT,
+        "request_id": state.meta.request_id,
+        "stage": stage,
+        "interrupt_id": interrupt_id,
+        "status": state.meta.status.value,
+        "created_at": state.meta.created_at.isoformat(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "user_request": state.request.original_prompt,
+        "plan": {
+            "goal": plan.goal,
+            "version": plan.version,
+            "agent_comments": plan.agent_comments,
+            "human_feedback": plan.approval.human_feedback,
+            "steps": [_step_summary(state, step) for step in plan.steps],
+        },
+        "changes": plan_changes(plan, state.meta.reviewed_steps),
+        "estimated_bytes": sum(estimated) if estimated else None,
+    }
+
+
+def encode_payload(payload: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+    """Message data and attributes for a payload: compressed, or offloaded when too large."""
+    cfg = payload_config()
+    data = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    attributes = {"request_id": payload["request_id"], "stage": payload["stage"], "format": PAYLOAD_FORMAT}
+    media_type = "application/json"
+    if cfg["compression"] == "gzip":
+        data = gzip.compress(data)
+        attributes["content_encoding"] = "gzip"
+        media_type = "application/gzip"
+    if len(data) > cfg["offload_threshold_bytes"]:
+        ref = store_bytes(data, media_type)
+        logger.info(f"Approval payload for {payload['request_id']} is {ref.size} bytes; offloaded to {ref.uri}")
+        attributes.update(payload_ref=ref.uri, payload_sha256=ref.sha256)
+        data = b""
+    return data, attributes
@@ -0,0 +1,156 @@
+"""
+Rule-based auto-approval.
+config/approval_policy.yaml lists rules the approval nodes evaluate before publishing an
+approval request. The first rule whose conditions all hold approves the stage without a
+human; otherwise the request goes to a reviewer as before. Either way the outcome is
+recorded as an ApprovalDecision in state.meta.approval_decisions.
+"""
+import os
+import logging
+from fnmatch import fnmatch
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+import sqlparse
+from state.state import AgentState, ApprovalDecision, CallFunction, PlanStep
+from utils.load_yaml_config import load_config
+from utils.schema_cache import modified_targets
+
+logger = logging.getLogger(__name__)
+
+APPROVAL_POLICY_PATH = "config/approval_policy.yaml"
+
+# sqlparse statement types (and BigQuery dry-run statement types) by class
+DML_TYPES = {"INSERT", "UPDATE", "DELETE", "MERGE", "REPLACE", "UPSERT"}
+DDL_TYPES = {"CREATE", "CREATE OR REPLACE", "ALTER", "DROP", "TRUNCATE"}
+
+
+@lru_cache(maxsize=1)
+def load_policy() -> Dict[str, Any]:
+    path = os.getenv("APPROVAL_POLICY_PATH", APPROVAL_POLICY_PATH)
+    if not os.path.exists(path):
+        logger.info(f"No approval policy at {path}; every approval goes to a reviewer")
+        return {"enabled": False, "rules": []}
+    policy = load_config(path) or {}
+    return {"enabled": bool(policy.get("enabled", False)), "rules": policy.get("rules") or []}
+
+
+def _statement_class(statement_type: str) -> str:
+    statement_type = statement_type.upper()
+    if statement_type == "SELECT":
+        return "read_only"
+    if statement_type in DML_TYPES:
+        return "dml"
+    if statement_type in DDL_TYPES or statement_type.split("_")[0] in DDL_TYPES:
+        return "ddl"
+    return "unknown"
+
+
+def step_sql(step: PlanStep) -> Optional[str]:
+    if step.code and step.code.language.lower() == "sql" and step.code.content:
+        return step.code.content
+    return step.call_function_args.get("sql")
+
+
+def statement_classes(step: PlanStep) -> Set[str]:
+    """Classes of the statements in an execute_query step; "pending" before its SQL is generated."""
+    sql = step_sql(step)
+    if not sql:
+        return {"pending"}
+    classes = {_statement_class(s.get_type()) for s in sqlparse.parse(sql) if s.token_first(skip_cm=True)}
+    estimate = step.cost_estimate
+    if estimate and estimate.statement_type and estimate.statement_type != "SCRIPT":
+        classes.add(_statement_class(estimate.statement_type))
+    return classes or {"unknown"}
+
+
+def _dataset(ref: str, project_id: str) -> str:
+    parts = ref.strip("`").split(".")
+    return ".".join(parts[:2]) if len(parts) >= 3 else ".".join([project_id] + parts[:1])
+
+
+def step_datasets(step: PlanStep, project_id: str) -> Optional[Set[str]]:
+    """project.dataset names a step reads or writes; None when they cannot be determined."""
+    args = step.call_function_args
+    if step.call_function == CallFunction.GET_TABLE_SCHEMA:
+        return {_dataset(args["table_fqn"], project_id)} if args.get("table_fqn") else None
+    if step.call_function == CallFunction.GET_DATASET_SCHEMA:
+        fqn = args.get("dataset_fqn")
+        return {fqn if "." in fqn else f"{project_id}.{fqn}"} if fqn else None
+    if step.call_function != CallFunction.EXECUTE_QUERY:
+        return set()
+    sql, estimate = step_sql(step), step.cost_estimate
+    if not sql or not estimate or estimate.status != "ok":
+        return None
+    tables, datasets = modified_targets(sql, project_id)
+    read = {_dataset(t, project_id) for t in estimate.referenced_tables}
+    return read | {_dataset(t, project_id) for t in tables} | set(datasets)
+
+
+def _check(rule: Dict[str, Any], state: AgentState, stage: str) -> Optional[str]:
+    """Why rule does not match, or None if it does."""
+    plan, meta = state.plan, state.meta
+    if "stages" in rule and stage not in rule["stages"]:
+        return f"stage {stage} not in {rule['stages']}"
+
+    if "plan_sources" in rule:
+        source = "plan_path" if meta.plan_path else "prompt"
+        if source not in rule["plan_sources"]:
+            return f"plan source {source} not in {rule['plan_sources']}"
+    if "plan_paths" in rule:
+        if not meta.plan_path or not any(fnmatch(meta.plan_path, p) for p in rule["plan_paths"]):
+            return f"plan_path {meta.plan_path} does not match {rule['plan_paths']}"
+
+    queries = [s for s in plan.steps if s.call_function == CallFunction.EXECUTE_QUERY]
+    if "call_functions" in rule:
+        allowed = set(rule["call_functions"])
+        for step in plan.steps:
+            if step.call_function.value not in allowed:
+                return f"step {step.step_id} calls {step.call_function.value}"
+
+    if "statement_classes" in rule:
+        allowed = set(rule["statement_classes"])
+        for step in queries:
+            classes = statement_classes(step)
+            if not classes <= allowed:
+                return f"step {step.step_id} SQL is {', '.join(sorted(classes - allowed))}"
+
+    if "max_bytes_per_step" in rule or "max_total_bytes" in rule:
+        total = 0
+        for step in queries:
+            if not step_sql(step):
+                continue  # nothing to estimate before generation
+            estimate = step.cost_estimate
+            if not estimate or estimate.status != "ok" or estimate.bytes_processed is None:
+                return f"step {step.step_id} has no dry-run estimate"
+            if "max_bytes_per_step" in rule and estimate.bytes_processed > int(rule["max_bytes_per_step"]):
+                return f"step {step.step_id} processes {estimate.bytes_processed} bytes"
+            total += estimate.bytes_processed
+        if "max_total_bytes" in rule and total > int(rule["max_total_bytes"]):
+            return f"plan processes {total} bytes"
+
+    if "datasets" in rule:
+        for step in plan.steps:
+            datasets = step_datasets(step, meta.project_id)
+            if datasets is None:
+                return f"step {step.step_id} datasets unknown"
+            outside = [d for d in datasets if not any(fnmatch(d, p) for p in rule["datasets"])]
+            if outside:
+                return f"step {step.step_id} uses {', '.join(sorted(outside))}"
+    return None
+
+
+def evaluate_policy(state: AgentState, stage: str) -> ApprovalDecision:
+    """Auto-approve with the first matching rule, or hand the stage to a reviewer."""
+    policy = load_policy()
+    if not policy["enabled"]:
+        return ApprovalDecision(stage=stage, decision="human", plan_version=state.plan.version,
+                                reasons=["approval policy disabled"])
+    reasons: List[str] = []
+    for i, rule in enumerate(policy["rules"]):
+        name = rule.get("name", f"rule-{i}")
+        reason = _check(rule, state, stage)
+        if reason is None:
+            logger.info(f"Auto-approved {stage} for {state.meta.request_id} by policy rule {name}")
+            return ApprovalDecision(stage=stage, decision="auto_approved", rule=name, plan_version=state.plan.version)
+        reasons.append(f"{name}: {reason}")
+    return ApprovalDecision(stage=stage, decision="human", plan_version=state.plan.version, reasons=reasons)
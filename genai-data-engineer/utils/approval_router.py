@@ -0,0 +1,177 @@
+"""
+In-process approval response router.
+One streaming-pull subscriber per process receives every message on
+approval-responses-pull-{env}, acks it straight away and hands it to the workflow
+waiting on its request_id through a future, so concurrent waits no longer steal or
+delay each other's responses. A response that arrives before anyone waits for it is
+buffered for `buffer_ttl_seconds`, unless a default handler (e.g. resume a workflow
+paused at an interrupt) claims it.
+"""
+import json
+import time
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional, Tuple
+from google.cloud import pubsub_v1
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+# Called with a response nobody is waiting for; returns True if it handled it
+DefaultHandler = Callable[[dict], bool]
+
+
+def router_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("approvals").get("router") or {}
+    return {
+        "max_outstanding_messages": int(cfg.get("max_outstanding_messages", 100)),
+        "buffer_ttl_seconds": int(cfg.get("buffer_ttl_seconds", 600)),
+        "resume_paused": bool(cfg.get("resume_paused", False)),
+    }
+
+
+class ApprovalRouter:
+    def __init__(self, subscription_path: str, max_outstanding_messages: int = 100, buffer_ttl_seconds: int = 600):
+        self.subscription_path = subscription_path
+        self.max_outstanding_messages = max_outstanding_messages
+        self.buffer_ttl_seconds = buffer_ttl_seconds
+        self.default_handler: Optional[DefaultHandler] = None
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Future] = {}
+        self._buffered: Dict[str, Tuple[dict, float]] = {}
+        self._subscriber = None
+        self._streaming = None
+
+    def start(self):
+        """Open the streaming pull (again, if it stopped)."""
+        with self._lock:
+            if self._streaming is not None and not self._streaming.done():
+                return
+            if self._subscriber is None:
+                self._subscriber = pubsub_v1.SubscriberClient()
+            flow_control = pubsub_v1.types.FlowControl(max_messages=self.max_outstanding_messages)
+            self._streaming = self._subscriber.subscribe(self.subscription_path, self._on_message, flow_control=flow_control)
+            self._streaming.add_done_callback(self._on_stream_done)
+            logger.info(f"Approval router listening on {self.subscription_path}")
+
+    def close(self):
+        with self._lock:
+            if self._streaming is not None:
+                self._streaming.cancel()
+                self._streaming = None
+            if self._subscriber is not None:
+                self._subscriber.close()
+                self._subscriber = None
+
+    def _on_stream_done(self, streaming):
+        if not streaming.cancelled() and streaming.exception() is not None:
+            logger.error(f"Approval router stream stopped: {streaming.exception()}; restarting on next wait")
+
+    def _on_message(self, message):
+        # Ack first: the response is routed in-process, redelivery would only duplicate it
+        message.ack()
+        try:
+            data = json.loads(message.data.decode("utf-8"))
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Dropping unreadable approval response {message.message_id}: {e}")
+            return
+        self.deliver(data)
+
+    def deliver(self, data: dict):
+        """Route a response to its waiter, the default handler or the buffer."""
+        request_id = data.get("request_id")
+        if not request_id:
+            logger.warning(f"Dropping approval response without request_id: {data}")
+            return
+        with self._lock:
+            # Under the lock so a waiter timing out cannot abandon the future in between;
+            # an abandoned (cancelled) future falls through to the handler or the buffer
+            waiter = self._waiters.pop(request_id, None)
+            if waiter is not None and waiter.set_running_or_notify_cancel():
+                waiter.set_result(data)
+                return
+        handler = self.default_handler
+        if handler is not None:
+            try:
+                if handler(data):
+                    return
+            except Exception as e:
+                logger.error(f"Default approval handler failed for {request_id}: {e}")
+        with self._lock:
+            self._purge_expired()
+            self._buffered[request_id] = (data, time.monotonic())
+        logger.info(f"Buffered approval response for {request_id}")
+
+    def _purge_expired(self):
+        # Caller holds _lock
+        cutoff = time.monotonic() - self.buffer_ttl_seconds
+        for request_id in [r for r, (_, at) in self._buffered.items() if at < cutoff]:
+            del self._buffered[request_id]
+
+    def register(self, request_id: str) -> Future:
+        """Future resolved with the response for request_id (immediately if it is buffered)."""
+        self.start()
+        with self._lock:
+            self._purge_expired()
+            future = self._waiters.get(request_id)
+            if future is None:
+                future = Future()
+                buffered = self._buffered.pop(request_id, None)
+                if buffered is not None:
+                    future.set_result(buffered[0])
+                else:
+                    self._waiters[request_id] = future
+            return future
+
+    def _abandon(self, request_id: str, future: Future) -> Optional[dict]:
+        """
+        Stop waiting after a timeout. Returns a response delivered in the meantime; otherwise
+        the future is cancelled so a later delivery is handled or buffered instead of lost.
+        """
+        with self._lock:
+            if self._waiters.get(request_id) is future:
+                del self._waiters[request_id]
+            if future.done() and not future.cancelled():
+                return future.result()
+            future.cancel()
+            return None
+
+    def wait(self, request_id: str, timeout: float) -> Optional[dict]:
+        future = self.register(request_id)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return self._abandon(request_id, future)
+
+    async def await_response(self, request_id: str, timeout: float) -> Optional[dict]:
+        future = self.register(request_id)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            return self._abandon(request_id, future)
+
+
+_LOCK = threading.Lock()
+_ROUTERS: Dict[str, ApprovalRouter] = {}
+
+
+def get_approval_router(subscription_path: str) -> ApprovalRouter:
+    """Shared router for a subscription; its stream starts on first use."""
+    with _LOCK:
+        router = _ROUTERS.get(subscription_path)
+        if router is None:
+            cfg = router_config()
+            router = ApprovalRouter(subscription_path, cfg["max_outstanding_messages"], cfg["buffer_ttl_seconds"])
+            _ROUTERS[subscription_path] = router
+        return router
+
+
+@atexit.register
+def close_routers():
+    with _LOCK:
+        for router in _ROUTERS.values():
+            router.close()
+        _ROUTERS.clear()
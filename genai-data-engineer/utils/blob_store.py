@@ -0,0 +1,122 @@
+"""
+Content-addressed store for large ExecutionOutput payloads.
+Content over `blob_store.spill_threshold_bytes` is written once under its SHA-256, in a
+local directory or under a gs:// prefix, and the output keeps only a ContentRef. Graph
+state, checkpoints and approval messages then stay small whatever the data size;
+consumers call load_content() when they actually need the bytes.
+"""
+import os
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from google.api_core.exceptions import PreconditionFailed
+from state.state import ContentRef, ExecutionOutput
+from utils.gcp_clients import get_storage_client
+from utils.gcs_io import parse_gcs_path
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SCHEME = "file://"
+
+
+def blob_store_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("blob_store")
+    return {
+        "uri": os.getenv("BLOB_STORE_URI", cfg.get("uri", ".cache/blobs")),
+        "spill_threshold_bytes": int(cfg.get("spill_threshold_bytes", 65536)),
+    }
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore:
+    """Blobs under root/<first two hex chars>/<sha256>."""
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def put(self, digest: str, data: bytes, media_type: Optional[str] = None) -> str:
+        path = self.root / digest[:2] / digest
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # atomic: readers never see a partial blob
+        return f"{LOCAL_SCHEME}{path}"
+
+
+class GcsBlobStore:
+    """Blobs under gs://bucket/prefix/<sha256>."""
+
+    def __init__(self, uri: str):
+        self.bucket_name, prefix = parse_gcs_path(uri)
+        self.prefix = prefix.strip("/")
+
+    def put(self, digest: str, data: bytes, media_type: Optional[str] = None) -> str:
+        name = f"{self.prefix}/{digest}" if self.prefix else digest
+        blob = get_storage_client().bucket(self.bucket_name).blob(name)
+        try:
+            blob.upload_from_string(data, content_type=media_type or "application/octet-stream", if_generation_match=0)
+        except PreconditionFailed:
+            pass  # already stored - same name, same bytes
+        return f"gs://{self.bucket_name}/{name}"
+
+
+_LOCK = threading.Lock()
+_STORE: Optional[Union[LocalBlobStore, GcsBlobStore]] = None
+
+
+def get_blob_store() -> Union[LocalBlobStore, GcsBlobStore]:
+    global _STORE
+    with _LOCK:
+        if _STORE is None:
+            uri = blob_store_config()["uri"]
+            _STORE = GcsBlobStore(uri) if uri.startswith("gs://") else LocalBlobStore(uri)
+            logger.info(f"Blob store at {uri}")
+        return _STORE
+
+
+def store_bytes(data: bytes, media_type: Optional[str] = None) -> ContentRef:
+    digest = content_hash(data)
+    uri = get_blob_store().put(digest, data, media_type)
+    return ContentRef(uri=uri, sha256=digest, size=len(data), media_type=media_type)
+
+
+def fetch_bytes(ref: ContentRef) -> bytes:
+    """Resolve a ContentRef from whichever store wrote it, checking the hash."""
+    if ref.uri.startswith("gs://"):
+        bucket_name, name = parse_gcs_path(ref.uri)
+        data = get_storage_client().bucket(bucket_name).blob(name).download_as_bytes()
+    elif ref.uri.startswith(LOCAL_SCHEME):
+        data = Path(ref.uri[len(LOCAL_SCHEME):]).read_bytes()
+    else:
+        raise ValueError(f"Unsupported content ref: {ref.uri}")
+    if content_hash(data) != ref.sha256:
+        raise ValueError(f"Content at {ref.uri} does not match sha256 {ref.sha256}")
+    return data
+
+
+def spill_content(output: ExecutionOutput, media_type: Optional[str] = None) -> ExecutionOutput:
+    """Move content over the spill threshold into the blob store, leaving a ContentRef."""
+    data = output.content
+    if not data or len(data) <= blob_store_config()["spill_threshold_bytes"]:
+        return output
+    ref = store_bytes(data, media_type)
+    logger.info(f"Spilled {ref.size} bytes of {output.uri} to {ref.uri}")
+    return output.model_copy(update={"content": None, "content_ref": ref})
+
+
+def load_content(output: Union[ExecutionOutput, Dict[str, Any]]) -> Optional[bytes]:
+    """An output's bytes: inline content, or fetched from the blob store."""
+    if isinstance(output, dict):
+        output = ExecutionOutput.model_validate(output)
+    if output.content is not None:
+        return output.content
+    if output.content_ref is None:
+        return None
+    return fetch_bytes(output.content_ref)
@@ -0,0 +1,136 @@
+"""
+Bulk BigQuery dataset schema retrieval via INFORMATION_SCHEMA.
+Two queries (tables + columns), submitted together, replace one get_table() call per
+table and are assembled into the same dict shape as tools._get_table_schema().
+"""
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Tuple, Optional
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+TABLES_SQL = """
+SELECT t.table_name, t.table_type, v.view_definition, s.row_count, s.last_modified_time
+FROM `{project}.{dataset}.INFORMATION_SCHEMA.TABLES` t
+LEFT JOIN `{project}.{dataset}.INFORMATION_SCHEMA.VIEWS` v USING (table_name)
+LEFT JOIN `{project}.{dataset}.__TABLES__` s ON s.table_id = t.table_name
+"""
+
+COLUMNS_SQL = """
+SELECT c.table_name, c.column_name, c.data_type, c.is_nullable, p.description
+FROM `{project}.{dataset}.INFORMATION_SCHEMA.COLUMNS` c
+LEFT JOIN `{project}.{dataset}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS` p
+  ON p.table_name = c.table_name AND p.field_path = c.column_name
+-- Pseudo-columns (_PARTITIONTIME, _PARTITIONDATE) are hidden; get_table() does not report them
+WHERE c.is_hidden = 'NO'
+ORDER BY c.table_name, c.ordinal_position
+"""
+
+LAST_MODIFIED_SQL = """
+SELECT COUNT(*) AS table_count, MAX(last_modified_time) AS last_modified_time
+FROM `{project}.{dataset}.__TABLES__`
+"""
+
+# INFORMATION_SCHEMA names -> the names the Table API (and get_table_schema) reports
+TABLE_TYPES = {
+    "BASE TABLE": "TABLE",
+    "CLONE": "TABLE",
+    "VIEW": "VIEW",
+    "MATERIALIZED VIEW": "MATERIALIZED_VIEW",
+    "EXTERNAL": "EXTERNAL",
+    "SNAPSHOT": "SNAPSHOT",
+}
+
+COLUMN_TYPES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "STRUCT": "RECORD",
+}
+
+
+def split_dataset_ref(dataset_fqn: str, project_id: str) -> Tuple[str, str]:
+    parts = dataset_fqn.split('.')
+    if len(parts) == 1:
+        return project_id, dataset_fqn
+    return parts[0], parts[1]
+
+
+def column_type_and_mode(data_type: str, is_nullable: str) -> Tuple[str, str]:
+    """Map an INFORMATION_SCHEMA data_type (e.g. 'ARRAY<STRUCT<a INT64>>', 'STRING(10)') to (type, mode)."""
+    mode = "NULLABLE" if is_nullable == "YES" else "REQUIRED"
+    if data_type.startswith("ARRAY<"):
+        data_type = data_type[len("ARRAY<"):-1]
+        mode = "REPEATED"
+    base = re.match(r"[A-Z0-9_]+", data_type)
+    base = base.group(0) if base else data_type
+    return COLUMN_TYPES.get(base, base), mode
+
+
+def modified_signature(table_count: int, last_modified_time) -> str:
+    # Changes when any table is created, dropped or modified
+    return f"{table_count}:{last_modified_time}"
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def modified_millis(modified: datetime) -> int:
+    """Table.modified as the integer epoch milliseconds __TABLES__.last_modified_time holds."""
+    return (modified - _EPOCH) // timedelta(milliseconds=1)
+
+
+def table_modified_signature(table: bigquery.Table) -> Optional[str]:
+    return modified_signature(1, modified_millis(table.modified)) if table.modified else None
+
+
+def last_modified(client: bigquery.Client, project: str, dataset: str) -> Optional[str]:
+    """Cheap __TABLES__ check of when any table in a dataset last changed."""
+    job = client.query(LAST_MODIFIED_SQL.format(project=project, dataset=dataset))
+    row = next(iter(job.result()), None)
+    if row is None or not row["table_count"]:
+        return None
+    return modified_signature(row["table_count"], row["last_modified_time"])
+
+
+def dataset_schema_from_information_schema(client: bigquery.Client, project: str, dataset: str) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+    """
+    Schemas for every table in project.dataset from INFORMATION_SCHEMA, plus the
+    dataset's last-modified signature (see last_modified()).
+    Raises google.api_core exceptions when the views are not queryable (permissions, location).
+    """
+    tables_job  = client.query(TABLES_SQL.format(project=project, dataset=dataset))
+    columns_job = client.query(COLUMNS_SQL.format(project=project, dataset=dataset))
+
+    schemas: Dict[str, Dict[str, Any]] = {}
+    modified_times = []
+    for row in tables_job.result():
+        modified_times.append(row["last_modified_time"])
+        table_type = TABLE_TYPES.get(row["table_type"], row["table_type"])
+        schema = {
+            "name": row["table_name"],
+            "type": table_type,
+            "columns": [],
+            "row_count": row["row_count"] if table_type == "TABLE" else None
+        }
+        if table_type == "VIEW":
+            schema["view_definition"] = row["view_definition"]
+        schemas[row["table_name"]] = schema
+
+    for row in columns_job.result():
+        schema = schemas.get(row["table_name"])
+        if schema is None:
+            continue
+        field_type, mode = column_type_and_mode(row["data_type"], row["is_nullable"])
+        schema["columns"].append({
+            "name": row["column_name"],
+            "type": field_type,
+            "mode": mode,
+            "description": row["description"] or ""
+        })
+
+    logger.info(f"Retrieved schemas for {len(schemas)} tables in {project}.{dataset} from INFORMATION_SCHEMA")
+    known = [m for m in modified_times if m is not None]
+    return schemas, modified_signature(len(known), max(known)) if known else None
@@ -0,0 +1,91 @@
+"""
+Shared BigQuery and Cloud Storage clients.
+Credentials are discovered once per process and every client sends its requests through
+a keep-alive AuthorizedSession whose connection pool is sized from workflow_config.yaml
+(`clients`), so tool calls stop paying for credential discovery and TLS setup.
+google-cloud clients are thread-safe, so one client per project serves all workflows.
+"""
+import atexit
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery
+from google.cloud import storage
+from requests.adapters import HTTPAdapter
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+_LOCK = threading.Lock()
+_CREDENTIALS: Optional[Tuple[object, Optional[str]]] = None
+_BIGQUERY_CLIENTS: Dict[str, bigquery.Client] = {}
+_STORAGE_CLIENTS: Dict[Optional[str], storage.Client] = {}
+
+
+def _pool_size() -> int:
+    return int(get_workflow_config("clients").get("http_pool_size", 16))
+
+
+def _max_retries() -> int:
+    return int(get_workflow_config("clients").get("http_max_retries", 3))
+
+
+def _default_credentials() -> Tuple[object, Optional[str]]:
+    # Caller holds _LOCK
+    global _CREDENTIALS
+    if _CREDENTIALS is None:
+        _CREDENTIALS = google.auth.default(scopes=SCOPES)
+        logger.info(f"Discovered GCP credentials (default project: {_CREDENTIALS[1]})")
+    return _CREDENTIALS
+
+
+def _authorized_session(credentials) -> AuthorizedSession:
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=_pool_size(), pool_maxsize=_pool_size(), max_retries=_max_retries())
+    session.mount("https://", adapter)
+    return session
+
+
+def get_bigquery_client(project_id: str) -> bigquery.Client:
+    """Shared BigQuery client billed to project_id."""
+    with _LOCK:
+        client = _BIGQUERY_CLIENTS.get(project_id)
+        if client is None:
+            credentials, _ = _default_credentials()
+            client = bigquery.Client(project=project_id, credentials=credentials, _http=_authorized_session(credentials))
+            _BIGQUERY_CLIENTS[project_id] = client
+            logger.info(f"Created BigQuery client for {project_id}")
+        return client
+
+
+def get_storage_client(project_id: Optional[str] = None) -> storage.Client:
+    """Shared Cloud Storage client (project defaults to the credentials' project)."""
+    with _LOCK:
+        client = _STORAGE_CLIENTS.get(project_id)
+        if client is None:
+            credentials, default_project = _default_credentials()
+            client = storage.Client(
+                project=project_id or default_project,
+                credentials=credentials,
+                _http=_authorized_session(credentials)
+            )
+            _STORAGE_CLIENTS[project_id] = client
+            logger.info(f"Created Cloud Storage client for {project_id or default_project}")
+        return client
+
+
+@atexit.register
+def close_clients():
+    """Close pooled HTTP sessions (on interpreter exit, or in tests)."""
+    with _LOCK:
+        for client in list(_BIGQUERY_CLIENTS.values()) + list(_STORAGE_CLIENTS.values()):
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close client: {e}")
+        _BIGQUERY_CLIENTS.clear()
+        _STORAGE_CLIENTS.clear()
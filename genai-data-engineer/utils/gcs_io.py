@@ -0,0 +1,289 @@
+"""
+Streaming Cloud Storage reads and writes for the file tools.
+Objects are read through BlobReader in fixed-size chunks into a buffer capped at
+`files.read_max_bytes`, so a large object never has to fit in memory. Callers can ask
+for a byte range, the first N lines of CSV/JSONL/text or the first N rows of Parquet.
+Writes go through BlobWriter (resumable upload, one chunk_size buffer), optionally
+gzip/zstd compressed on the fly; Parquet is written one row group at a time.
+"""
+import io
+import json
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+import yaml
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from state.state import FileLoadParameters, FileWriteParameters, ResultPreview
+from utils.result_preview import build_preview
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+LINE_FORMATS = ("csv", "jsonl", "ndjson", "text", "txt", "tsv")
+
+
+def files_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("files")
+    return {
+        "read_max_bytes": int(cfg.get("read_max_bytes", 32 * 1024 * 1024)),
+        "chunk_size": int(cfg.get("chunk_size", 8 * 1024 * 1024)),
+        "on_oversize": cfg.get("on_oversize", "head"),
+        "write_compression": cfg.get("write_compression"),
+        "parquet_compression": cfg.get("parquet_compression", "snappy"),
+        "write_batch_rows": int(cfg.get("write_batch_rows", 100000)),
+    }
+
+
+def parse_gcs_path(path: str) -> Tuple[str, str]:
+    if not path.startswith("gs://"):
+        raise ValueError(f"Path must start with gs://: {path}")
+    path_parts = path[5:].split("/", 1)
+    return path_parts[0], path_parts[1] if len(path_parts) > 1 else ""
+
+
+def detect_format(path: str, explicit: Optional[str] = None) -> Optional[str]:
+    if explicit:
+        return explicit.lower()
+    name = path.lower()
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            return None  # compressed: only byte reads make sense
+    ext = name.rsplit(".", 1)[-1] if "." in name.rsplit("/", 1)[-1] else None
+    return ext
+
+
+@dataclass
+class ReadResult:
+    content: bytes
+    description: str
+    preview: Optional[ResultPreview] = None
+    media_type: Optional[str] = None
+
+
+def read_head(blob, limit: int, chunk_size: int) -> bytes:
+    """First limit bytes, downloaded chunk by chunk into a bounded buffer."""
+    buffer = bytearray()
+    with blob.open("rb", chunk_size=chunk_size) as reader:
+        while len(buffer) < limit:
+            chunk = reader.read(min(chunk_size, limit - len(buffer)))
+            if not chunk:
+                break
+            buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def read_range(blob, offset: int, length: int) -> bytes:
+    return blob.download_as_bytes(start=offset, end=offset + length - 1)
+
+
+def read_lines(blob, max_lines: int, limit: int, chunk_size: int, header: bool) -> Tuple[bytes, int, bool]:
+    """Up to max_lines lines (plus a CSV header), stopping at limit bytes. Returns (bytes, lines, more_available)."""
+    buffer = bytearray()
+    wanted = max_lines + (1 if header else 0)
+    count = 0
+    with blob.open("rb", chunk_size=chunk_size) as reader:
+        while count < wanted:
+            line = reader.readline()
+            if not line:
+                return bytes(buffer), count, False
+            if len(buffer) + len(line) > limit:
+                return bytes(buffer), count, True
+            buffer.extend(line)
+            count += 1
+        more = bool(reader.read(1))
+    return bytes(buffer), count, more
+
+
+def read_parquet_rows(blob, max_rows: int, chunk_size: int) -> Tuple[pa.Table, int]:
+    """First max_rows rows of a Parquet object; only the footer and first row groups are fetched."""
+    with blob.open("rb", chunk_size=chunk_size) as reader:
+        parquet_file = pq.ParquetFile(reader)
+        batch = next(parquet_file.iter_batches(batch_size=max_rows), None)
+        table = pa.Table.from_batches([batch]) if batch is not None else parquet_file.schema_arrow.empty_table()
+        return table, parquet_file.metadata.num_rows
+
+
+def csv_within(table: pa.Table, limit: int) -> Tuple[bytes, int]:
+    """table as CSV, keeping only as many whole rows as fit in limit bytes. Returns (bytes, rows)."""
+    while True:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(table, buffer)
+        content = buffer.getvalue()
+        if len(content) <= limit or table.num_rows == 0:
+            return content, table.num_rows
+        # Estimate from the average row size, always dropping at least one row
+        keep = min(table.num_rows - 1, int(table.num_rows * limit / len(content)))
+        table = table.slice(0, keep)
+
+
+def read_blob(blob, params: FileLoadParameters) -> ReadResult:
+    """Read a blob (metadata already loaded) according to the sampling options in params."""
+    cfg = files_config()
+    limit = min(params.max_bytes or cfg["read_max_bytes"], cfg["read_max_bytes"])
+    size = blob.size or 0
+    fmt = detect_format(params.path, params.format)
+
+    if params.offset or params.length:
+        length = min(params.length or max(size - params.offset, 0), limit)
+        content = read_range(blob, params.offset, length) if length else b""
+        return ReadResult(content, f"Read bytes {params.offset}-{params.offset + len(content)} of {size} from GCS: {params.path}")
+
+    if params.max_records and fmt == "parquet":
+        table, total_rows = read_parquet_rows(blob, params.max_records, cfg["chunk_size"])
+        content, rows = csv_within(table, limit)
+        suffix = f" (trimmed from {table.num_rows} rows to fit {limit} bytes)" if rows < table.num_rows else ""
+        return ReadResult(
+            content,
+            f"Read first {rows} of {total_rows} rows (as CSV) from Parquet file {params.path}{suffix}",
+            build_preview(table, total_rows),
+            "text/csv"
+        )
+
+    if params.max_records and fmt in LINE_FORMATS:
+        content, lines, more = read_lines(blob, params.max_records, limit, cfg["chunk_size"], header=fmt in ("csv", "tsv"))
+        suffix = " (more available)" if more else ""
+        return ReadResult(content, f"Read first {lines} lines of {size} bytes from GCS: {params.path}{suffix}")
+
+    if size > limit:
+        if cfg["on_oversize"] == "error":
+            raise ValueError(f"{params.path} is {size} bytes, over the {limit} byte read limit; use max_records or offset/length")
+        logger.warning(f"{params.path} is {size} bytes; reading the first {limit} bytes")
+        content = read_head(blob, limit, cfg["chunk_size"])
+        return ReadResult(content, f"Read first {len(content)} of {size} bytes (truncated) from GCS: {params.path}")
+
+    content = read_head(blob, limit, cfg["chunk_size"])
+    return ReadResult(content, f"Read file from GCS: {params.path}")
+
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "jsonl": "application/x-ndjson",
+    "yaml": "text/yaml",
+    "parquet": "application/octet-stream",
+}
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+COMPRESSED_CONTENT_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
+
+def write_compression(params: FileWriteParameters) -> Optional[str]:
+    """Stream compression for a write: explicit, from a .gz/.zst suffix, or the configured default."""
+    if params.compression:
+        compression = params.compression.lower()
+    else:
+        suffix = next((s for s in COMPRESSION_SUFFIXES if params.path.lower().endswith(s)), None)
+        compression = COMPRESSION_SUFFIXES[suffix] if suffix else files_config()["write_compression"]
+    if compression in (None, "none") or params.format == "parquet":
+        return None  # Parquet compresses inside its pages instead
+    if compression not in COMPRESSED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return compression
+
+
+@contextmanager
+def open_writer(blob, content_type: Optional[str], compression: Optional[str], chunk_size: int) -> Iterator[Any]:
+    """
+    Binary stream into a resumable upload of chunk_size pieces. The object is only
+    created once the block exits cleanly; on error the upload is abandoned, so a failed
+    write never replaces an existing object with a partial one.
+    """
+    writer = blob.open("wb", chunk_size=chunk_size, ignore_flush=True,
+                       content_type=COMPRESSED_CONTENT_TYPES.get(compression, content_type))
+    stream = pa.CompressedOutputStream(writer, compression) if compression else writer
+    try:
+        yield stream
+    except BaseException:
+        _abort_writer(writer, stream)
+        raise
+    stream.close()
+    writer.close()
+
+
+def _abort_writer(writer, stream):
+    # BlobWriter.close() would finalize the upload, and closing a CompressedOutputStream
+    # closes the writer under it: cancel the upload first, then release the compressor
+    try:
+        if hasattr(writer, "terminate"):
+            writer.terminate()
+        elif hasattr(writer, "_buffer"):
+            writer._buffer.close()
+    except Exception as e:
+        logger.warning(f"Could not cancel upload of failed write: {e}")
+    if stream is not writer:
+        try:
+            stream.close()
+        except (ValueError, OSError):
+            pass  # the writer under it is already closed
+
+
+@contextmanager
+def _text(stream) -> Iterator[io.TextIOWrapper]:
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    yield text
+    text.flush()
+    text.detach()  # leave closing the binary stream to open_writer
+
+
+def _records(content: Any, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(content), chunk_rows):
+        yield content.iloc[start:start + chunk_rows]
+
+
+def _write_parquet(stream, content: Any, compression: str, row_group_rows: int):
+    if isinstance(content, pd.DataFrame):
+        schema = pa.Schema.from_pandas(content, preserve_index=False)
+        batches = (pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+                   for chunk in _records(content, row_group_rows))
+    elif isinstance(content, pa.Table):
+        schema, batches = content.schema, content.to_batches(max_chunksize=row_group_rows)
+    elif isinstance(content, list):
+        table = pa.Table.from_pylist(content)
+        schema, batches = table.schema, table.to_batches(max_chunksize=row_group_rows)
+    else:
+        raise ValueError("Parquet format requires DataFrame, Arrow table or list of records content")
+    with pq.ParquetWriter(stream, schema, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(batch, row_group_size=row_group_rows)
+
+
+def _write_text(stream, params: FileWriteParameters, chunk_rows: int):
+    content = params.content
+    if isinstance(content, bytes):
+        stream.write(content)
+        return
+    with _text(stream) as text:
+        if params.format == "csv" and isinstance(content, pd.DataFrame):
+            content.to_csv(text, index=False, chunksize=chunk_rows)
+        elif params.format == "json" and not isinstance(content, str):
+            # Compact unless an indent is asked for: outputs are read by machines
+            separators = None if params.indent else (",", ":")
+            json.dump(content, text, indent=params.indent, separators=separators)
+        elif params.format == "jsonl" and isinstance(content, pd.DataFrame):
+            for chunk in _records(content, chunk_rows):
+                chunk.to_json(text, orient="records", lines=True, date_format="iso")
+        elif params.format == "jsonl" and isinstance(content, list):
+            for record in content:
+                text.write(json.dumps(record, separators=(",", ":")) + "\n")
+        elif params.format == "yaml" and not isinstance(content, str):
+            yaml.dump(content, text)
+        else:
+            text.write(content if isinstance(content, str) else str(content))
+
+
+def write_blob(blob, params: FileWriteParameters) -> str:
+    """Stream params.content into blob. Returns a description of what was written."""
+    cfg = files_config()
+    compression = write_compression(params)
+    with open_writer(blob, CONTENT_TYPES.get(params.format), compression, cfg["chunk_size"]) as stream:
+        if params.format == "parquet":
+            parquet_compression = params.compression or cfg["parquet_compression"]
+            _write_parquet(stream, params.content, parquet_compression, cfg["write_batch_rows"])
+            compression = parquet_compression
+        else:
+            _write_text(stream, params, cfg["write_batch_rows"])
+    suffix = f", {compression} compressed" if compression else ""
+    return f"File written: {params.format} format{suffix}"
@@ -1,7 +1,8 @@
+import asyncio
 import logging
 import json
 import yaml
-from google.cloud import storage
+from utils.gcp_clients import get_storage_client
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +24,13 @@ def load_json_from_gcs(gcs_uri: str) -> dict:
     
     uri = gcs_uri.replace("gs://", "")
     bucket_name, blob_path = uri.split("/", 1)
-    client = storage.Client()
+    client = get_storage_client()
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(blob_path)
     content = blob.download_as_text()
-    return json.loads(content)
\ No newline at end of file
+    return json.loads(content)
+
+
+async def aload_json_from_gcs(gcs_uri: str) -> dict:
+    """Async counterpart of load_json_from_gcs; the download runs in a worker thread."""
+    return await asyncio.to_thread(load_json_from_gcs, gcs_uri)
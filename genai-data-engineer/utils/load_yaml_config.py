@@ -3,6 +3,7 @@
 import os
 import yaml
 import logging
+from functools import lru_cache
 from typing import Any, Dict
 
 logger = logging.getLogger(__name__)
@@ -22,3 +23,14 @@ def load_config(path: str = "config.yaml") -> Dict[str, Any]:
     except yaml.YAMLError as e:
         logger.error(f"Failed to parse YAML file {path}: {e}")
         raise
+
+
+WORKFLOW_CONFIG_PATH = "config/workflow_config.yaml"
+
+@lru_cache(maxsize=None)
+def _load_workflow_config() -> Dict[str, Any]:
+    return load_config(WORKFLOW_CONFIG_PATH) or {}
+
+def get_workflow_config(section: str) -> Dict[str, Any]:
+    # Return one section of config/workflow_config.yaml (loaded once per process)
+    return _load_workflow_config().get(section) or {}
@@ -1,75 +1,95 @@
 """Simplified approval notifications via Pub/Sub."""
-import yaml
-import json
 import os
+import json
 import logging
-from datetime import datetime
+from functools import lru_cache
 from google.cloud import pubsub_v1
-from state.state import AgentState
+from state.state import AgentState, WorkflowStatus
+from utils.approval_payload import build_payload, encode_payload
 from utils.load_yaml_config import load_config
+from utils.approval_router import get_approval_router
 
 logger = logging.getLogger(__name__)
 
-def send_approval_request(state: AgentState):
-    project_id = load_config("config/agent_llm_config.yaml").get("defaults", {}).get("project_id")
+
+@lru_cache(maxsize=1)
+def _default_project_id():
+    return load_config("config/agent_llm_config.yaml").get("defaults", {}).get("project_id")
+
+
+@lru_cache(maxsize=1)
+def _publisher() -> pubsub_v1.PublisherClient:
+    # One client (channel and batching threads) per process instead of one per request
+    return pubsub_v1.PublisherClient()
+
+
+def _stage(state: AgentState) -> str:
+    if state.meta.status == WorkflowStatus.WAITING_PROCEED:
+        return "proceed"
+    return "generation" if any(step.code for step in state.plan.steps) else "initial"
+
+
+def send_approval_request(state: AgentState, stage: str | None = None, interrupt_id: str | None = None):
+    """Publish the compact approval payload (utils/approval_payload.py) for a paused workflow."""
     environment = os.getenv('ENVIRONMENT', 'dev')
-    publisher = pubsub_v1.PublisherClient()
+    publisher = _publisher()
     topic_path = publisher.topic_path(
-        project_id or state.meta.project_id, 
+        _default_project_id() or state.meta.project_id,
         f"approval-requests-{environment}"
     )
-    
-    message = {
-        "request_id": state.meta.request_id,
-        "timestamp": datetime.utcnow().isoformat(),
-        "user_request": state.request.original_prompt,
-        "state": state.model_dump(mode='json')
-    }
-    
-    publisher.publish(topic_path, json.dumps(message).encode('utf-8'))
-    logger.info(f"Approval request sent for {state.meta.request_id}")
 
+    payload = build_payload(state, stage or _stage(state), interrupt_id)
+    data, attributes = encode_payload(payload)
+    publisher.publish(topic_path, data, **attributes).result(timeout=60)
+    logger.info(f"Approval request sent for {state.meta.request_id} ({len(data)} bytes)")
 
-def get_approval_response(state: AgentState, timeout: int = 300) -> dict:
-    project_id = load_config("config/agent_llm_config.yaml").get("defaults", {}).get("project_id")
+
+def republish_approval_response(response: dict, project_id: str):
+    """
+    Put a response back on approval-responses so its subscriptions deliver it again.
+    It keeps the stage and interrupt_id it answers, so it can only resume that same pause.
+    """
     environment = os.getenv('ENVIRONMENT', 'dev')
-    subscriber = pubsub_v1.SubscriberClient()
-    subscription_path = subscriber.subscription_path(
-        project_id or state.meta.project_id,
-        f"approval-responses-pull-{environment}"
-    )
-    
-    try:
-        start_time = datetime.utcnow()
-        while (datetime.utcnow() - start_time).total_seconds() < timeout:
-            response = subscriber.pull(
-                request={"subscription": subscription_path, "max_messages": 10},
-                timeout=timeout
-            )
-            if not response.received_messages:
-                continue
-            for message in response.received_messages:
-                data = json.loads(message.message.data.decode('utf-8'))
-                
-                if data.get("request_id") == state.meta.request_id:
-                    subscriber.acknowledge(
-                        request={"subscription": subscription_path, "ack_ids": [message.ack_id]}
-                    )                    
-                    if "action" not in data:
-                        logger.warning(f"No action in response for {state.meta.request_id}")
-                        return None
-                    logger.info(f"Received {data['action']} for {state.meta.request_id}")
-                    return data
-                else:
-                    subscriber.modify_ack_deadline(
-                        request={
-                            "subscription": subscription_path,
-                            "ack_ids": [message.ack_id],
-                            "ack_deadline_seconds": 300
-                        }
-                    )
+    publisher = _publisher()
+    topic_path = publisher.topic_path(_default_project_id() or project_id, f"approval-responses-{environment}")
+    data = json.dumps(response, default=str).encode("utf-8")
+    publisher.publish(topic_path, data, request_id=response["request_id"], stage=response["stage"]).result(timeout=60)
+    logger.info(f"Re-published {response.get('action')} response for {response['request_id']}")
+
+
+def approval_responses_subscription(project_id: str) -> str:
+    environment = os.getenv('ENVIRONMENT', 'dev')
+    return pubsub_v1.SubscriberClient.subscription_path(project_id, f"approval-responses-pull-{environment}")
+
+
+def _response_or_none(state: AgentState, data: dict | None) -> dict | None:
+    if data is None:
         logger.error(f"Timeout waiting for approval response for {state.meta.request_id}")
         return None
+    if "action" not in data:
+        logger.warning(f"No action in response for {state.meta.request_id}")
+        return None
+    logger.info(f"Received {data['action']} for {state.meta.request_id}")
+    return data
+
+
+def _router(state: AgentState):
+    return get_approval_router(approval_responses_subscription(_default_project_id() or state.meta.project_id))
+
+
+def get_approval_response(state: AgentState, timeout: int = 300) -> dict:
+    """Wait for this request's response on the process-wide streaming subscriber."""
+    try:
+        return _response_or_none(state, _router(state).wait(state.meta.request_id, timeout))
+    except Exception as e:
+        logger.error(f"Error getting approval response: {e}")
+        return None
+
+
+async def aget_approval_response(state: AgentState, timeout: int = 300) -> dict:
+    """Async counterpart of get_approval_response: awaits the router's future on the event loop."""
+    try:
+        return _response_or_none(state, await _router(state).await_response(state.meta.request_id, timeout))
     except Exception as e:
         logger.error(f"Error getting approval response: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,106 @@
+"""
+BigQuery dry-run cost estimates and bytes-billed guardrails.
+Generated SQL is dry-run before generation approval, and every execute_query call made
+by the executor carries a maximum_bytes_billed derived from the per-step limit and
+what is left of the per-request budget (workflow_config.yaml `cost_guard`). Steps the
+scheduler runs together split what is left of the budget between them.
+"""
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+from google.cloud import bigquery
+from google.api_core.exceptions import BadRequest, Forbidden, NotFound
+from state.state import AgentState, CostEstimate, ExecutionOutput
+from utils.gcp_clients import get_bigquery_client
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+TIB = 1024 ** 4
+
+
+class BytesBudgetExceeded(RuntimeError):
+    """Raised when a request has used up its bytes-billed budget."""
+
+
+def cost_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("cost_guard")
+    return {
+        "dry_run": bool(cfg.get("dry_run", True)),
+        "price_per_tib_usd": float(cfg.get("price_per_tib_usd", 6.25)),
+        "max_bytes_billed_per_step": cfg.get("max_bytes_billed_per_step"),
+        "max_bytes_billed_per_request": cfg.get("max_bytes_billed_per_request"),
+        "max_workers": int(cfg.get("max_workers", 4)),
+    }
+
+
+def sql_fingerprint(sql: str) -> str:
+    return hashlib.sha256(sql.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def dry_run_query(sql: str, project_id: str, later_step: bool = False) -> CostEstimate:
+    """
+    Dry-run sql and return its estimate. later_step marks SQL that runs after other
+    pending steps, whose missing tables may simply not have been created yet.
+    """
+    fingerprint = sql_fingerprint(sql)
+    try:
+        client = get_bigquery_client(project_id)
+        job = client.query(sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    except NotFound as e:
+        status = "unavailable" if later_step else "invalid"
+        return CostEstimate(status=status, error=str(e), sql_fingerprint=fingerprint)
+    except (BadRequest, Forbidden) as e:
+        return CostEstimate(status="invalid", error=str(e), sql_fingerprint=fingerprint)
+    except Exception as e:
+        # No credentials, transient API errors, ...: carry on without an estimate
+        logger.warning(f"Dry run unavailable: {e}")
+        return CostEstimate(status="unavailable", error=str(e), sql_fingerprint=fingerprint)
+
+    bytes_processed = job.total_bytes_processed or 0
+    return CostEstimate(
+        bytes_processed=bytes_processed,
+        estimated_cost_usd=round(bytes_processed / TIB * cost_config()["price_per_tib_usd"], 6),
+        referenced_tables=[f"{t.project}.{t.dataset_id}.{t.table_id}" for t in (job.referenced_tables or [])],
+        statement_type=job.statement_type,
+        sql_fingerprint=fingerprint
+    )
+
+
+def bytes_spent(state: AgentState) -> int:
+    """Bytes billed so far by this request's executed queries, however they were dispatched."""
+    spent = 0
+    for execution in state.execution.executions:
+        for output in execution.output_content:
+            if isinstance(output, ExecutionOutput):
+                spent += output.bytes_billed or 0
+            elif isinstance(output, dict):
+                spent += output.get("bytes_billed") or 0
+    return spent
+
+
+def step_bytes_limit(state: AgentState, concurrent: int = 1) -> Optional[int]:
+    """
+    maximum_bytes_billed for the next query: per-step limit capped by the remaining request
+    budget, of which each of `concurrent` steps running together gets an equal share.
+    """
+    cfg = cost_config()
+    limits = []
+    if cfg["max_bytes_billed_per_step"]:
+        limits.append(int(cfg["max_bytes_billed_per_step"]))
+    if cfg["max_bytes_billed_per_request"]:
+        remaining = int(cfg["max_bytes_billed_per_request"]) - bytes_spent(state)
+        if remaining <= 0:
+            raise BytesBudgetExceeded(
+                f"Request {state.meta.request_id} has used its {cfg['max_bytes_billed_per_request']} bytes-billed budget"
+            )
+        limits.append(max(1, remaining // max(1, concurrent)))
+    return min(limits) if limits else None
+
+
+def guard_tool_args(state: AgentState, tool_name: str, args: dict, concurrent: int = 1) -> dict:
+    """Add maximum_bytes_billed to execute_query args."""
+    if tool_name != "execute_query":
+        return args
+    limit = step_bytes_limit(state, concurrent)
+    return {**args, "maximum_bytes_billed": limit} if limit else args
@@ -0,0 +1,119 @@
+"""
+Bounded query result previews.
+Fetches at most max_rows rows of a BigQuery result as an Arrow table, trims it to a
+memory budget and profiles each column with pyarrow.compute, so ANALYZE steps get a
+sample and per-column statistics without materializing the full result. The statistics
+describe the sample only (ResultPreview.preview_rows rows), not the whole result.
+"""
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+from state.state import ColumnProfile, ResultPreview
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+
+def preview_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("query_preview")
+    return {
+        "default_rows": int(cfg.get("default_rows", 0)),
+        "max_rows": int(cfg.get("max_rows", 1000)),
+        "max_bytes": int(cfg.get("max_bytes", 8 * 1024 * 1024)),
+        "top_values": int(cfg.get("top_values", 5)),
+        "max_cell_chars": int(cfg.get("max_cell_chars", 200)),
+    }
+
+
+def preview_row_limit(preview_rows: Optional[int]) -> int:
+    """Rows to fetch for a requested preview size (None = configured default), capped at max_rows."""
+    cfg = preview_config()
+    requested = cfg["default_rows"] if preview_rows is None else preview_rows
+    return max(0, min(int(requested), cfg["max_rows"]))
+
+
+def _json_value(value: Any, max_chars: int) -> Any:
+    # Keep preview values JSON friendly (state is checkpointed and sent to the LLM)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    if isinstance(value, list):
+        return [_json_value(v, max_chars) for v in value]
+    if isinstance(value, dict):
+        return {k: _json_value(v, max_chars) for k, v in value.items()}
+    return value
+
+
+def _is_orderable(data_type: pa.DataType) -> bool:
+    return (pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type)
+            or pa.types.is_temporal(data_type) or pa.types.is_string(data_type) or pa.types.is_large_string(data_type))
+
+
+def _is_categorical(data_type: pa.DataType) -> bool:
+    return (pa.types.is_integer(data_type) or pa.types.is_boolean(data_type)
+            or pa.types.is_string(data_type) or pa.types.is_large_string(data_type) or pa.types.is_date(data_type))
+
+
+def profile_column(name: str, column: pa.ChunkedArray, top_n: int, max_chars: int) -> ColumnProfile:
+    profile = ColumnProfile(name=name, type=str(column.type), null_count=column.null_count)
+    if len(column) == profile.null_count:
+        return profile
+    try:
+        if _is_orderable(column.type):
+            min_max = pc.min_max(column)
+            profile.min = _json_value(min_max["min"].as_py(), max_chars)
+            profile.max = _json_value(min_max["max"].as_py(), max_chars)
+        if not (pa.types.is_nested(column.type) or pa.types.is_binary(column.type)):
+            profile.distinct_count = pc.count_distinct(column).as_py()
+        if _is_categorical(column.type) and top_n:
+            counts = pc.value_counts(column.drop_null())
+            top = sorted(counts.to_pylist(), key=lambda c: c["counts"], reverse=True)[:top_n]
+            profile.top_values = [{"value": _json_value(c["values"], max_chars), "count": c["counts"]} for c in top]
+    except (pa.ArrowNotImplementedError, pa.ArrowInvalid) as e:
+        logger.debug(f"Skipping statistics for column {name}: {e}")
+    return profile
+
+
+def _trim_to_budget(table: pa.Table, max_bytes: int) -> pa.Table:
+    if table.num_rows == 0 or table.nbytes <= max_bytes:
+        return table
+    keep = max(1, int(table.num_rows * max_bytes / table.nbytes))
+    logger.info(f"Preview trimmed from {table.num_rows} to {keep} rows to stay under {max_bytes} bytes")
+    return table.slice(0, keep)
+
+
+def build_preview(table: pa.Table, total_rows: Optional[int]) -> ResultPreview:
+    """Profile an Arrow table holding the first rows of a result (sample statistics)."""
+    cfg = preview_config()
+    table = _trim_to_budget(table, cfg["max_bytes"])
+    columns = [
+        profile_column(name, table.column(name), cfg["top_values"], cfg["max_cell_chars"])
+        for name in table.column_names
+    ]
+    rows: List[Dict[str, Any]] = [
+        {k: _json_value(v, cfg["max_cell_chars"]) for k, v in row.items()}
+        for row in table.to_pylist()
+    ]
+    return ResultPreview(
+        total_rows=total_rows,
+        preview_rows=table.num_rows,
+        truncated=total_rows is None or table.num_rows < total_rows,
+        columns=columns,
+        rows=rows
+    )
+
+
+def preview_from_rows(rows, row_limit: int) -> Optional[ResultPreview]:
+    """Profile a RowIterator from query_job.result(max_results=row_limit), fetched as Arrow."""
+    if row_limit <= 0 or not rows.schema:
+        return None  # preview off, or DDL/DML and scripts without a final SELECT
+    table = rows.to_arrow(create_bqstorage_client=False)
+    return build_preview(table.slice(0, row_limit), rows.total_rows)
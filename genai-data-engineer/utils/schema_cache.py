@@ -0,0 +1,220 @@
+"""
+Table and dataset schema cache.
+An in-process LRU (optionally backed by a SQLite file shared across restarts) holds
+the dicts returned by get_table_schema / get_dataset_schema, keyed by fully qualified
+name. Table entries older than the TTL are refetched (checking a table's last-modified
+time costs as much as fetching it); dataset entries are first revalidated against the
+dataset's table count and last-modified time from __TABLES__ and only refetched when those
+changed. DDL/DML run through execute_query invalidates its targets.
+"""
+import re
+import copy
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from typing import Optional, Dict, Any, List, Callable, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Statements that change a table's schema, type or row count, and the name they target
+_TABLE_TARGET = re.compile(
+    r"\b(?:"
+    r"CREATE(?:\s+OR\s+REPLACE)?(?:\s+(?:TEMP|TEMPORARY|EXTERNAL|SNAPSHOT|MATERIALIZED))*\s+(?:TABLE|VIEW)(?:\s+IF\s+NOT\s+EXISTS)?"
+    r"|ALTER(?:\s+MATERIALIZED)?\s+(?:TABLE|VIEW)(?:\s+IF\s+EXISTS)?"
+    r"|DROP(?:\s+(?:EXTERNAL|SNAPSHOT|MATERIALIZED))*\s+(?:TABLE|VIEW)(?:\s+IF\s+EXISTS)?"
+    r"|TRUNCATE\s+TABLE|INSERT(?:\s+INTO)?|UPDATE|DELETE(?:\s+FROM)?|MERGE(?:\s+INTO)?"
+    r")\s+(`[^`]+`|[\w.-]+)",
+    re.IGNORECASE,
+)
+_DATASET_TARGET = re.compile(
+    r"\b(?:CREATE(?:\s+OR\s+REPLACE)?|ALTER|DROP)\s+SCHEMA(?:\s+IF(?:\s+NOT)?\s+EXISTS)?\s+(`[^`]+`|[\w.-]+)",
+    re.IGNORECASE,
+)
+
+
+def table_key(table_ref: str) -> str:
+    return f"table:{table_ref}"
+
+
+def dataset_key(dataset_ref: str) -> str:
+    return f"dataset:{dataset_ref}"
+
+
+def _qualify(name: str, project_id: str, parts_expected: int) -> Optional[str]:
+    parts = name.strip("`").split(".")
+    if len(parts) == parts_expected:
+        return ".".join(parts)
+    if len(parts) == parts_expected - 1:
+        return ".".join([project_id] + parts)
+    return None  # unqualified names depend on a default dataset we don't know
+
+
+def modified_targets(sql: str, project_id: str, query_job=None) -> Tuple[List[str], List[str]]:
+    """Tables and datasets a statement may have changed: (table_refs, dataset_refs)."""
+    tables, datasets = set(), set()
+    target = getattr(query_job, "ddl_target_table", None) if query_job is not None else None
+    if target is not None:
+        tables.add(f"{target.project}.{target.dataset_id}.{target.table_id}")
+    for name in _TABLE_TARGET.findall(sql or ""):
+        ref = _qualify(name, project_id, 3)
+        if ref:
+            tables.add(ref)
+    for name in _DATASET_TARGET.findall(sql or ""):
+        ref = _qualify(name, project_id, 2)
+        if ref:
+            datasets.add(ref)
+    return sorted(tables), sorted(datasets)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class SchemaCache:
+    """
+    LRU of schema dicts. get() returns the entry even when stale so callers can
+    revalidate it with a last-modified check instead of refetching the schema.
+    """
+
+    def __init__(self, enabled: bool = True, max_entries: int = 1000, ttl_seconds: int = 600, path: Optional[str] = None):
+        self.enabled     = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path        = Path(path) if path else None
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.enabled and self.path:
+            self._init_db()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "SchemaCache":
+        return cls(
+            enabled=bool(cfg.get("enabled", True)),
+            max_entries=int(cfg.get("max_entries", 1000)),
+            ttl_seconds=int(cfg.get("ttl_seconds", 600)),
+            path=cfg.get("path"),
+        )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # The connection's own context manager only commits or rolls back; close it as well
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def _init_db(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_cache (
+                    key           TEXT PRIMARY KEY,
+                    value         TEXT NOT NULL,
+                    last_modified TEXT,
+                    fetched_at    REAL NOT NULL
+                )
+                """
+            )
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl_seconds
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if not self.path:
+                return None
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, last_modified, fetched_at FROM schema_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if not row:
+                return None
+            entry = CacheEntry(json.loads(row[0]), row[1], row[2])
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, value: Any, last_modified: Optional[str] = None):
+        if not self.enabled:
+            return
+        entry = CacheEntry(copy.deepcopy(value), last_modified, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self.path:
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO schema_cache (key, value, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value, default=str), last_modified, entry.fetched_at),
+                    )
+
+    def touch(self, key: str):
+        """Mark an entry as revalidated (unchanged since it was fetched)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.fetched_at = time.time()
+            if self.path:
+                with self._connect() as conn:
+                    conn.execute("UPDATE schema_cache SET fetched_at = ? WHERE key = ?", (entry.fetched_at, key))
+
+    def _remember(self, key: str, entry: CacheEntry):
+        # Caller holds _lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table_refs: List[str] = (), dataset_refs: List[str] = ()):
+        """Drop tables (and the datasets containing them) and whole datasets."""
+        if not self.enabled or not (table_refs or dataset_refs):
+            return
+        keys = {table_key(t) for t in table_refs}
+        keys |= {dataset_key(t.rsplit(".", 1)[0]) for t in table_refs}
+        keys |= {dataset_key(d) for d in dataset_refs}
+        prefixes = tuple(table_key(f"{d}.") for d in dataset_refs)
+        with self._lock:
+            dropped = [k for k in self._entries if k in keys or (prefixes and k.startswith(prefixes))]
+            for k in dropped:
+                del self._entries[k]
+            if self.path:
+                with self._connect() as conn:
+                    conn.executemany("DELETE FROM schema_cache WHERE key = ?", [(k,) for k in keys])
+                    for prefix in prefixes:
+                        conn.execute("DELETE FROM schema_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        logger.info(f"Invalidated cached schemas for tables {list(table_refs)} datasets {list(dataset_refs)}")
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Tuple[Any, Optional[str]]],
+                     last_modified: Optional[Callable[[], Optional[str]]] = None) -> Any:
+        """
+        Cached value for key. Stale entries are kept when last_modified() still matches
+        the value recorded at fetch time; otherwise fetch() -> (value, last_modified) runs.
+        """
+        entry = self.get(key)
+        if entry is not None and self.is_fresh(entry):
+            return copy.deepcopy(entry.value)
+        if entry is not None and entry.last_modified is not None and last_modified is not None:
+            try:
+                current = last_modified()
+            except Exception as e:
+                logger.warning(f"Last-modified check failed for {key}: {e}")
+                current = None
+            if current is not None and current == entry.last_modified:
+                self.touch(key)
+                return copy.deepcopy(entry.value)
+        value, modified = fetch()
+        self.put(key, value, modified)
+        return value
@@ -1,114 +1,186 @@
+import asyncio
 import logging
-import json
-import yaml
-from typing import Dict, Any
-from io import BytesIO
-import pandas as pd
+from typing import Dict, Any, Optional, Annotated
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core.exceptions import GoogleAPICallError
 from google.cloud import bigquery
-from google.cloud import storage
-from langchain_core.tools import tool
+from langchain_core.tools import tool, InjectedToolArg
 from state.state import FileLoadParameters, FileWriteParameters, ExecutionOutput
+from utils.gcp_clients import get_bigquery_client, get_storage_client
+from utils.bq_schema import split_dataset_ref, dataset_schema_from_information_schema, last_modified, table_modified_signature
+from utils.schema_cache import SchemaCache, table_key, dataset_key, modified_targets
+from utils.result_preview import preview_row_limit, preview_from_rows
+from utils.gcs_io import parse_gcs_path, read_blob, write_blob
+from utils.blob_store import spill_content
+from utils.load_yaml_config import get_workflow_config
 
 logger = logging.getLogger(__name__)
 
+QUERY_POLL_SECONDS = 1.0
+
+SCHEMA_CACHE = SchemaCache.from_config(get_workflow_config("schema").get("cache", {}))
+
+
+def _job_config(maximum_bytes_billed: Optional[int]) -> Optional[bigquery.QueryJobConfig]:
+    if not maximum_bytes_billed:
+        return None
+    return bigquery.QueryJobConfig(maximum_bytes_billed=maximum_bytes_billed)
+
+
+def _invalidate_schemas(sql: str, project_id: str, query_job=None):
+    # DDL/DML changes schemas or row counts of its targets
+    tables, datasets = modified_targets(sql, project_id, query_job)
+    SCHEMA_CACHE.invalidate(tables, datasets)
+
+
+def _query_output(query_job, result, preview=None) -> Dict[str, Any]:
+    # A JSON-serialisable dict, so the ToolNode hop stores it as JSON rather than the model's repr
+    destination_uri = None
+    if query_job.destination:
+        destination_uri = f"bq://{query_job.destination.project}.{query_job.destination.dataset_id}.{query_job.destination.table_id}"
+    rows = result.total_rows if hasattr(result, 'total_rows') else None
+    bytes_processed = query_job.total_bytes_processed or 0
+    logger.info(f"Query executed successfully. Rows: {rows}, Bytes: {bytes_processed}")
+
+    description = f"Query executed: {rows} rows, {bytes_processed} bytes processed"
+    if preview is not None:
+        description += f", preview of {preview.preview_rows} rows with sample statistics attached"
+    return ExecutionOutput(
+        type="table" if destination_uri else "result",
+        uri=destination_uri or f"job://{query_job.job_id}",
+        role="final",
+        description=description,
+        preview=preview,
+        bytes_billed=query_job.total_bytes_billed
+    ).model_dump(mode="json")
+
 
 @tool
-def execute_query(sql: str, project_id: str) -> ExecutionOutput:
+def execute_query(
+    sql: str,
+    project_id: str,
+    preview_rows: Optional[int] = None,
+    maximum_bytes_billed: Annotated[Optional[int], InjectedToolArg] = None
+) -> Dict[str, Any]:
     """
     Execute a SQL query against BigQuery and return execution results.
     
     Args:
         sql: SQL query string to execute on BigQuery
         project_id: GCP project ID containing the BigQuery dataset
+        preview_rows: Number of result rows to return as a preview with per-column statistics
+                      over those rows. Omit for the configured default (none unless configured);
+                      set it when an ANALYZE step reads this step's output.
+        maximum_bytes_billed: Set by the executor from the cost guard; the query fails
+                              instead of billing more than this.
     
     Returns:
-        ExecutionOutput object containing query results information:
+        ExecutionOutput fields as a JSON-serialisable dict:
         - type: 'table' if results saved to table, 'result' otherwise
         - uri: Reference to destination table or job ID
         - description: Summary of rows processed and bytes used
+        - preview: First rows plus null counts, min/max, distinct counts and top values per column,
+                   computed over the preview rows only
     
     Raises:
         Exception: If query execution fails in BigQuery
     """
     try:
-        client    = bigquery.Client(project=project_id)
-        query_job = client.query(sql)
-        result    = query_job.result()
-        
-        destination_uri = None
-        if query_job.destination:
-            destination_uri = f"bq://{query_job.destination.project}.{query_job.destination.dataset_id}.{query_job.destination.table_id}"
-        rows = result.total_rows if hasattr(result, 'total_rows') else None
-        bytes_processed = query_job.total_bytes_processed or 0
-        logger.info(f"Query executed successfully. Rows: {rows}, Bytes: {bytes_processed}")
-        
-        return ExecutionOutput(
-            type="table" if destination_uri else "result",
-            uri=destination_uri or f"job://{query_job.job_id}",
-            role="final",
-            description=f"Query executed: {rows} rows, {bytes_processed} bytes processed"
-        )
+        row_limit = preview_row_limit(preview_rows)
+        client    = get_bigquery_client(project_id)
+        query_job = client.query(sql, job_config=_job_config(maximum_bytes_billed))
+        try:
+            result = query_job.result(max_results=row_limit or None)
+        finally:
+            _invalidate_schemas(sql, project_id, query_job)
+        return _query_output(query_job, result, preview_from_rows(result, row_limit))
     except Exception as e:
         logger.error(f"Query execution failed: {str(e)}")
         raise
 
 
+def _table_ref(table_fqn: str, project_id: str) -> str:
+    parts = table_fqn.strip('`').split('.')
+    if len(parts) == 2:
+        dataset_id, table_id = parts
+        return f"{project_id}.{dataset_id}.{table_id}"
+    return table_fqn.strip('`')
+
+
+def _fetch_table_schema(client, table_ref: str):
+    table = client.get_table(table_ref)
+    schema = {
+        "name": table.table_id,
+        "type": table.table_type,  # TABLE, VIEW, EXTERNAL, etc
+        "columns": [
+            {
+                "name": field.name,
+                "type": field.field_type,
+                "mode": field.mode,
+                "description": field.description or ""
+            }
+            for field in table.schema
+        ],
+        "row_count": table.num_rows if table.table_type == "TABLE" else None
+    }
+    if table.table_type == "VIEW":
+        schema["view_definition"] = table.view_query
+    logger.info(f"Retrieved schema for {table_ref}: {len(schema['columns'])} columns")
+    return schema, table_modified_signature(table)
+
+
 def _get_table_schema(table_fqn: str, project_id: str) -> Dict[str, Any]:
     try:
-        client = bigquery.Client(project=project_id)
-        parts  = table_fqn.split('.')
-        if len(parts) == 2:
-            dataset_id, table_id = parts
-            table_ref = f"{project_id}.{dataset_id}.{table_id}"
-        else:
-            table_ref = table_fqn
-        table = client.get_table(table_ref)        
-        schema = {
-            "name": table.table_id,
-            "type": table.table_type,  # TABLE, VIEW, EXTERNAL, etc
-            "columns": [
-                {
-                    "name": field.name,
-                    "type": field.field_type,
-                    "mode": field.mode,
-                    "description": field.description or ""
-                }
-                for field in table.schema
-            ],
-            "row_count": table.num_rows if table.table_type == "TABLE" else None
-        }
-        if table.table_type == "VIEW":
-            schema["view_definition"] = table.view_query
-        logger.info(f"Retrieved schema for {table_fqn}: {len(schema['columns'])} columns")
-        return schema
+        client    = get_bigquery_client(project_id)
+        table_ref = _table_ref(table_fqn, project_id)
+        # No revalidation: checking a table's last-modified time is the same get_table call
+        # as refetching it, so a stale table is simply refetched
+        return SCHEMA_CACHE.get_or_fetch(
+            table_key(table_ref),
+            lambda: _fetch_table_schema(client, table_ref)
+        )
         
     except Exception as e:
         logger.error(f"Failed to get schema for {table_fqn}: {str(e)}")
         raise
 
+def _dataset_schema_by_table(client, project: str, dataset: str) -> Dict[str, Dict[str, Any]]:
+    # Fallback: one get_table() per table, fanned out on a bounded pool
+    tables = list(client.list_tables(f"{project}.{dataset}"))
+    workers = int(get_workflow_config("schema").get("fanout_workers", 8))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables)))) as pool:
+        results = pool.map(
+            lambda t: _get_table_schema(f"{t.project}.{t.dataset_id}.{t.table_id}", client.project),
+            tables
+        )
+        return {t.table_id: schema for t, schema in zip(tables, results)}
+
+
+def _fetch_dataset_schema(client, project: str, dataset: str):
+    if get_workflow_config("schema").get("information_schema", True):
+        try:
+            return dataset_schema_from_information_schema(client, project, dataset)
+        except GoogleAPICallError as e:
+            logger.warning(f"INFORMATION_SCHEMA lookup failed for {project}.{dataset}, falling back to get_table: {e}")
+    schemas = _dataset_schema_by_table(client, project, dataset)
+    logger.info(f"Retrieved schemas for {len(schemas)} tables in {project}.{dataset}")
+    return schemas, None
+
+
 def _get_dataset_schema(dataset_fqn: str, project_id: str) -> Dict[str, Dict[str, Any]]:
     try:
-        client = bigquery.Client(project=project_id)
-        parts  = dataset_fqn.split('.')
-        if len(parts) == 1:
-            dataset_ref = f"{project_id}.{dataset_fqn}"
-        else:
-            dataset_ref = dataset_fqn
-        tables = client.list_tables(dataset_ref)
-        schemas = {}
-        for table_item in tables:
-            table_fqn = f"{table_item.dataset_id}.{table_item.table_id}"
-            schemas[table_item.table_id] = _get_table_schema(table_fqn, project_id)
-        logger.info(f"Retrieved schemas for {len(schemas)} tables in {dataset_fqn}")
-        return schemas
+        client = get_bigquery_client(project_id)
+        project, dataset = split_dataset_ref(dataset_fqn.strip('`'), project_id)
+        return SCHEMA_CACHE.get_or_fetch(
+            dataset_key(f"{project}.{dataset}"),
+            lambda: _fetch_dataset_schema(client, project, dataset),
+            lambda: last_modified(client, project, dataset)
+        )
     except Exception as e:
         logger.error(f"Failed to get dataset schema for {dataset_fqn}: {str(e)}")
         raise
 
 
-
-
-
 @tool
 def get_table_schema(table_fqn: str, project_id: str) -> dict:
     """
@@ -152,7 +224,6 @@ def get_dataset_schema(dataset_fqn: str, project_id: str) -> dict:
     return _get_dataset_schema(dataset_fqn, project_id)
 
 
-#TODO: add a check on file size and raise error if it is too large
 @tool
 def read_file(params: FileLoadParameters) -> ExecutionOutput:
     """
@@ -161,39 +232,44 @@ def read_file(params: FileLoadParameters) -> ExecutionOutput:
     Args:
         params: FileLoadParameters object containing:
                 - path: GCS URI path in format 'gs://bucket-name/path/to/file'
+                - max_bytes: Optional read limit (never above the configured maximum)
+                - offset / length: Optional byte range to read
+                - max_records: Optional number of lines (CSV/JSONL/text) or rows (Parquet) to sample
+                - format: Optional file format, detected from the extension by default
     
     Returns:
         ExecutionOutput object containing:
         - type: 'file'
         - uri: The GCS path of the read file
-        - content: Raw bytes of the file content
-        - description: Summary of file read operation
+        - content: Raw bytes of the file content (or of the requested range/sample); content over
+                   the blob store's spill threshold is replaced by content_ref (see load_content)
+        - description: Summary of file read operation, noting any truncation
+        - preview: Rows and column statistics of the sample, for Parquet files
     
     Raises:
-        ValueError: If path doesn't start with 'gs://'
+        ValueError: If path doesn't start with 'gs://', or the file is over the size limit
+                    and the configuration says to fail rather than read its head
+        FileNotFoundError: If the object does not exist
         Exception: If file read from GCS fails
     """
     try:
-        if not params.path.startswith("gs://"):
-            raise ValueError(f"Path must start with gs://: {params.path}")
-
-        path_parts = params.path[5:].split("/", 1)
-        bucket_name = path_parts[0]
-        blob_name = path_parts[1] if len(path_parts) > 1 else ""
-
-        client  = storage.Client()
-        bucket  = client.bucket(bucket_name)
-        blob    = bucket.blob(blob_name)
-        content = blob.download_as_bytes()
-        logger.info(f"Read file from {params.path}: {len(content)} bytes")
+        bucket_name, blob_name = parse_gcs_path(params.path)
+
+        client = get_storage_client()
+        blob   = client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"File not found: {params.path}")
+        result = read_blob(blob, params)
+        logger.info(f"Read file from {params.path}: {len(result.content)} of {blob.size} bytes")
         output = ExecutionOutput(
             type="file",
             uri=params.path,
             role="final",  # temp/staging/final depending on context
-            description=f"Read file from GCS: {params.path}",
-            content=content
+            description=result.description,
+            content=result.content,
+            preview=result.preview
         )
-        return output
+        return spill_content(output, result.media_type or blob.content_type)
     except Exception as e:
         logger.error(f"Failed to read from {params.path}: {str(e)}")
         raise
@@ -208,11 +284,14 @@ def write_file(params: FileWriteParameters) -> ExecutionOutput:
                 - path: GCS URI path in format 'gs://bucket-name/path/to/file.ext'
                 - content: File content (format depends on 'format' parameter):
                           - csv: pandas DataFrame or string
-                          - parquet: pandas DataFrame
+                          - parquet: pandas DataFrame, Arrow table or list of records
                           - json: dict, list, or string
+                          - jsonl: pandas DataFrame or list of records
                           - yaml: dict or string
                           - other: string or bytes
-                - format: File format ('csv', 'parquet', 'json', 'yaml', or other)
+                - format: File format ('csv', 'parquet', 'json', 'jsonl', 'yaml', or other)
+                - compression: Optional 'gzip' or 'zstd' (inferred from a .gz/.zst path)
+                - indent: Optional JSON indent (JSON is written compact by default)
     
     Returns:
         ExecutionOutput object containing:
@@ -225,69 +304,66 @@ def write_file(params: FileWriteParameters) -> ExecutionOutput:
         Exception: If file write to GCS fails
     """
     try:
-        # Parse GCS path (gs://bucket/path/file.ext)
-        if not params.path.startswith('gs://'):
-            raise ValueError(f"Path must start with gs://: {params.path}")
-        
-        path_parts = params.path[5:].split('/', 1)
-        bucket_name = path_parts[0]
-        blob_name = path_parts[1] if len(path_parts) > 1 else ""
-        
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob   = bucket.blob(blob_name)
-        
-        if params.format == "csv":
-            # Assume content is DataFrame or string
-            if isinstance(params.content, pd.DataFrame):
-                csv_string = params.content.to_csv(index=False)
-            else:
-                csv_string = params.content
-            blob.upload_from_string(csv_string, content_type='text/csv')
-            logger.info(f"Wrote CSV to {params.path}")
-            
-        elif params.format == "parquet":
-            # Assume content is DataFrame
-            if isinstance(params.content, pd.DataFrame):
-                from io import BytesIO
-                buffer = BytesIO()
-                params.content.to_parquet(buffer)
-                blob.upload_from_string(buffer.getvalue(), content_type='application/octet-stream')
-                logger.info(f"Wrote Parquet to {params.path}")
-            else:
-                raise ValueError("Parquet format requires DataFrame content")
-            
-        elif params.format == "json":
-            # Assume content is dict or string
-            if isinstance(params.content, (dict, list)):
-                json_string = json.dumps(params.content, indent=2)
-            else:
-                json_string = params.content
-            blob.upload_from_string(json_string, content_type='application/json')
-            logger.info(f"Wrote JSON to {params.path}")
-            
-        elif params.format == "yaml":
-            # Assume content is dict or string
-            if isinstance(params.content, dict):
-                yaml_string = yaml.dump(params.content)
-            else:
-                yaml_string = params.content
-            blob.upload_from_string(yaml_string, content_type='text/yaml')
-            logger.info(f"Wrote YAML to {params.path}")
-            
-        else:
-            # Default: write as string or bytes
-            blob.upload_from_string(params.content)
-            logger.info(f"Wrote file to {params.path}")
-        
+        bucket_name, blob_name = parse_gcs_path(params.path)
+        blob = get_storage_client().bucket(bucket_name).blob(blob_name)
+        description = write_blob(blob, params)
+        logger.info(f"Wrote {params.format} to {params.path}")
+
         return ExecutionOutput(
             type="file",
             uri=params.path,
             role="final",
-            description=f"File written: {params.format} format"
+            description=description
         )
     except Exception as e:
         logger.error(f"Failed to write to {params.path}: {str(e)}")
         raise
 
+async def _aexecute_query(
+    sql: str,
+    project_id: str,
+    preview_rows: Optional[int] = None,
+    maximum_bytes_billed: Optional[int] = None
+) -> Dict[str, Any]:
+    # Poll the job from the event loop instead of blocking a thread in result()
+    try:
+        row_limit = preview_row_limit(preview_rows)
+        client    = get_bigquery_client(project_id)
+        query_job = await asyncio.to_thread(client.query, sql, job_config=_job_config(maximum_bytes_billed))
+        try:
+            while not await asyncio.to_thread(query_job.done):
+                await asyncio.sleep(QUERY_POLL_SECONDS)
+            result = await asyncio.to_thread(query_job.result, max_results=row_limit or None)
+        finally:
+            _invalidate_schemas(sql, project_id, query_job)
+        preview = await asyncio.to_thread(preview_from_rows, result, row_limit)
+        return _query_output(query_job, result, preview)
+    except Exception as e:
+        logger.error(f"Query execution failed: {str(e)}")
+        raise
+
+
+async def _aget_table_schema(table_fqn: str, project_id: str) -> dict:
+    return await asyncio.to_thread(_get_table_schema, table_fqn, project_id)
+
+
+async def _aget_dataset_schema(dataset_fqn: str, project_id: str) -> dict:
+    return await asyncio.to_thread(_get_dataset_schema, dataset_fqn, project_id)
+
+
+async def _aread_file(params: FileLoadParameters) -> ExecutionOutput:
+    return await asyncio.to_thread(read_file.func, params)
+
+
+async def _awrite_file(params: FileWriteParameters) -> ExecutionOutput:
+    return await asyncio.to_thread(write_file.func, params)
+
+
+# Async counterparts used by ainvoke (ToolNode and the async executor path)
+execute_query.coroutine      = _aexecute_query
+get_table_schema.coroutine   = _aget_table_schema
+get_dataset_schema.coroutine = _aget_dataset_schema
+read_file.coroutine          = _aread_file
+write_file.coroutine         = _awrite_file
+
 AVAILABLE_TOOLS = [write_file, read_file, get_dataset_schema, get_table_schema, execute_query]
\ No newline at end of file
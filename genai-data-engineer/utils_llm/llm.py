@@ -1,13 +1,21 @@
 import yaml
 import os
+import asyncio
+import logging
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Tuple, Any, List
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from utils_llm.llm_cache import LLMResponseCache, LLMCacheMiss
+from state.state import LLMCallRecord
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 CONFIG_PATH = Path("config/agent_llm_config.yaml")
 
 with open(CONFIG_PATH, "r") as f:
@@ -15,6 +23,9 @@ with open(CONFIG_PATH, "r") as f:
 
 _DEFAULTS = _LLM_CONFIG.get("default", {})
 _AGENTS   = _LLM_CONFIG.get("agents", {})
+_PRICING  = _LLM_CONFIG.get("pricing", {})
+
+LLM_CACHE = LLMResponseCache.from_config(_LLM_CONFIG.get("cache", {}))
 
 def _require_env(var: str) -> str:
     value = os.getenv(var)
@@ -27,11 +38,20 @@ OPENAI_API_KEY    = _require_env("OPENAI_API_KEY")
 
 
 
-def get_llm(agent_name: str, tools: Optional[list] = None):
-    """
-    Instantiate and return an LLM for a given agent, optionally with tools bound.
-    Useful when you want to manage invocation yourself (e.g. in a LangGraph node).
-    """
+# Process-wide registry of chat models keyed by (agent_name, model, provider, tool set).
+# Each base model owns the provider client (and its HTTP connection pool), so building it
+# once and reusing it keeps connections alive across agent hops and requests.
+_LLM_REGISTRY: Dict[Tuple[str, str, str, Tuple[str, ...]], Any] = {}
+_LLM_REGISTRY_LOCK = threading.Lock()
+
+
+def _tool_key(tools: Optional[list]) -> Tuple[str, ...]:
+    if not tools:
+        return ()
+    return tuple(sorted(getattr(t, "name", str(t)) for t in tools))
+
+
+def _resolve_agent_model(agent_name: str) -> Tuple[str, str]:
     agent_cfg = _AGENTS.get(agent_name)
     if not agent_cfg:
         raise ValueError(f"No LLM config found for agent '{agent_name}'")
@@ -43,14 +63,165 @@ def get_llm(agent_name: str, tools: Optional[list] = None):
         raise ValueError(f"Agent '{agent_name}' is not allowed to call LLMs")
     if not provider or provider == "none":
         raise ValueError(f"Agent '{agent_name}' requires an LLM provider")
-    
-    llm = init_chat_model(
-        model_name,
-        model_provider=provider,
-        max_tokens=_DEFAULTS.get("max_output_tokens", 20000),
+    return model_name, provider
+
+
+def get_llm(agent_name: str, tools: Optional[list] = None):
+    """
+    Return the pooled LLM for a given agent, optionally with tools bound.
+    Models are built once per (agent_name, model, provider, tool set) and reused,
+    so callers can fetch them on every invocation without paying client setup again.
+    """
+    model_name, provider = _resolve_agent_model(agent_name)
+    base_key = (agent_name, model_name, provider, ())
+    key      = (agent_name, model_name, provider, _tool_key(tools))
+
+    llm = _LLM_REGISTRY.get(key)
+    if llm is not None:
+        return llm
+
+    with _LLM_REGISTRY_LOCK:
+        llm = _LLM_REGISTRY.get(key)
+        if llm is not None:
+            return llm
+
+        base = _LLM_REGISTRY.get(base_key)
+        if base is None:
+            logger.info(f"Building LLM client for agent '{agent_name}' ({provider}:{model_name})")
+            base = init_chat_model(
+                model_name,
+                model_provider=provider,
+                max_tokens=_DEFAULTS.get("max_output_tokens", 20000),
+                temperature=_DEFAULTS.get("temperature", 0.2),
+            )
+            _LLM_REGISTRY[base_key] = base
+
+        # Tool-bound variants wrap the same base model, so they share its client
+        llm = base.bind_tools(tools) if tools else base
+        _LLM_REGISTRY[key] = llm
+        return llm
+
+
+def warm_llms(agent_tools: Optional[Dict[str, list]] = None) -> None:
+    """
+    Build the pooled LLM for every configured agent up front (e.g. at startup),
+    so the first request does not pay client construction.
+    agent_tools optionally maps agent names to the tools they bind.
+    """
+    agent_tools = agent_tools or {}
+    for agent_name, agent_cfg in _AGENTS.items():
+        if not agent_cfg or agent_cfg.get("model") in (None, "none"):
+            continue
+        try:
+            get_llm(agent_name, agent_tools.get(agent_name))
+        except Exception as e:
+            logger.warning(f"Could not warm LLM for agent '{agent_name}': {e}")
+
+
+def _cache_key(agent_name: str, messages: List[BaseMessage], tools: Optional[list]) -> Optional[str]:
+    if not LLM_CACHE.enabled:
+        return None
+    model_name, provider = _resolve_agent_model(agent_name)
+    return LLM_CACHE.make_key(
+        agent_name=agent_name,
+        model=model_name,
+        provider=provider,
         temperature=_DEFAULTS.get("temperature", 0.2),
+        messages=messages,
+        tools=tools,
+    )
+
+
+def _check_replay(agent_name: str, cache_key: Optional[str]):
+    if cache_key and LLM_CACHE.replay:
+        raise LLMCacheMiss(f"No cached LLM response for agent '{agent_name}' (key {cache_key})")
+
+
+def _record_call(agent_name: str, response: AIMessage, started: float, cached: bool) -> AIMessage:
+    """
+    Attach an LLMCallRecord (tokens, latency, model, estimated cost) to the response
+    under response_metadata["llm_call"] so agents can add it to state.usage.
+    """
+    model_name, provider = _resolve_agent_model(agent_name)
+    usage         = response.usage_metadata or {}
+    input_tokens  = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    price         = _PRICING.get(model_name, {})
+    cost = 0.0 if cached else (
+        input_tokens * price.get("input_per_million", 0.0)
+        + output_tokens * price.get("output_per_million", 0.0)
+    ) / 1_000_000
+
+    record = LLMCallRecord(
+        agent_name=agent_name,
+        model=model_name,
+        provider=provider,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_ms=round((time.perf_counter() - started) * 1000, 2),
+        cost_usd=cost,
+        cached=cached,
     )
-    return llm.bind_tools(tools) if tools else llm
+    response.response_metadata["llm_call"] = record.model_dump(mode="json")
+    logger.info(
+        f"LLM call agent={agent_name} model={model_name} tokens={input_tokens}/{output_tokens} "
+        f"latency_ms={record.latency_ms} cost_usd={cost:.6f} cached={cached}"
+    )
+    return response
+
+
+def get_call_record(response: AIMessage) -> Optional[LLMCallRecord]:
+    """Return the LLMCallRecord attached by invoke_llm/ainvoke_llm, if any."""
+    data = (response.response_metadata or {}).get("llm_call")
+    return LLMCallRecord(**data) if data else None
+
+
+def invoke_llm(
+    *,
+    agent_name: str,
+    messages: List[BaseMessage],
+    tools: Optional[list] = None,
+) -> AIMessage:
+    """
+    Invoke the pooled LLM for an agent with a list of messages, going through the
+    response cache when it is enabled. In replay mode a cache miss raises LLMCacheMiss
+    instead of calling the provider.
+    """
+    started   = time.perf_counter()
+    cache_key = _cache_key(agent_name, messages, tools)
+    if cache_key:
+        hit = LLM_CACHE.get(cache_key)
+        if hit is not None:
+            logger.info(f"LLM cache hit for agent '{agent_name}'")
+            return _record_call(agent_name, hit, started, cached=True)
+    _check_replay(agent_name, cache_key)
+
+    response = get_llm(agent_name, tools).invoke(messages)
+    if cache_key:
+        LLM_CACHE.put(cache_key, agent_name, response)
+    return _record_call(agent_name, response, started, cached=False)
+
+
+async def ainvoke_llm(
+    *,
+    agent_name: str,
+    messages: List[BaseMessage],
+    tools: Optional[list] = None,
+) -> AIMessage:
+    """Async counterpart of invoke_llm using the provider's native ainvoke."""
+    started   = time.perf_counter()
+    cache_key = _cache_key(agent_name, messages, tools)
+    if cache_key:
+        hit = await asyncio.to_thread(LLM_CACHE.get, cache_key)
+        if hit is not None:
+            logger.info(f"LLM cache hit for agent '{agent_name}'")
+            return _record_call(agent_name, hit, started, cached=True)
+    _check_replay(agent_name, cache_key)
+
+    response = await get_llm(agent_name, tools).ainvoke(messages)
+    if cache_key:
+        await asyncio.to_thread(LLM_CACHE.put, cache_key, agent_name, response)
+    return _record_call(agent_name, response, started, cached=False)
 
 
 def call_llm(
@@ -65,9 +236,17 @@ def call_llm(
       - response.content        (text response)
       - response.tool_calls     (tool calls if tools were bound)
     """
-    llm      = get_llm(agent_name, tools)
-    response = llm.invoke([HumanMessage(content=prompt)])
-    return response
+    return invoke_llm(agent_name=agent_name, messages=[HumanMessage(content=prompt)], tools=tools)
+
+
+async def acall_llm(
+    *,
+    agent_name: str,
+    prompt: str,
+    tools: Optional[list] = None,
+) -> AIMessage:
+    """Async counterpart of call_llm."""
+    return await ainvoke_llm(agent_name=agent_name, messages=[HumanMessage(content=prompt)], tools=tools)
 
 def get_text_content(response: AIMessage) -> str:
     """
@@ -0,0 +1,217 @@
+"""Content-addressed LLM response cache backed by SQLite."""
+import os
+import json
+import time
+import sqlite3
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "read_write", "replay")
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a response is not in the cache."""
+
+
+def _normalize_message(message: BaseMessage) -> Dict[str, Any]:
+    # Message/tool call ids are regenerated on every run, so only hash what the model sees
+    data = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        data["tool_calls"] = [{"name": t["name"], "args": t["args"]} for t in tool_calls]
+    if getattr(message, "name", None):
+        data["name"] = message.name
+    return data
+
+
+def _fresh_id(old_id: str) -> str:
+    # Keep the provider's prefix (call_, toolu_) so the id still has the shape it expects
+    prefix = old_id.split("_", 1)[0] if "_" in old_id else "call"
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+
+def _fresh_message(message: AIMessage) -> AIMessage:
+    """
+    A cached response as a new message: no message id and new tool call ids. Replaying the
+    stored ids would make add_messages replace the earlier message in the thread instead of
+    appending, and providers reject tool call ids repeated in one conversation.
+    """
+    ids = {}
+    def renamed(old_id):
+        if old_id and old_id not in ids:
+            ids[old_id] = _fresh_id(old_id)
+        return ids.get(old_id, old_id)
+
+    tool_calls = [{**t, "id": renamed(t.get("id"))} for t in message.tool_calls]
+    invalid = [{**t, "id": renamed(t.get("id"))} for t in message.invalid_tool_calls]
+    additional_kwargs = dict(message.additional_kwargs)
+    if additional_kwargs.get("tool_calls"):
+        additional_kwargs["tool_calls"] = [{**t, "id": renamed(t.get("id"))} for t in additional_kwargs["tool_calls"]]
+    content = message.content
+    if isinstance(content, list):
+        content = [
+            {**block, "id": renamed(block.get("id"))} if isinstance(block, dict) and block.get("type") == "tool_use" else block
+            for block in content
+        ]
+    return message.model_copy(update={
+        "id": None,
+        "content": content,
+        "tool_calls": tool_calls,
+        "invalid_tool_calls": invalid,
+        "additional_kwargs": additional_kwargs,
+    })
+
+
+def _tool_schemas(tools: Optional[list]) -> List[Dict[str, Any]]:
+    if not tools:
+        return []
+    schemas = [convert_to_openai_tool(t) for t in tools]
+    return sorted(schemas, key=lambda s: s.get("function", {}).get("name", ""))
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of AIMessage responses keyed by a hash of agent, model,
+    sampling settings, bound tool schemas and the prompt messages.
+    Entries expire after a per-agent TTL and the least recently used entries
+    are evicted once max_entries is exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "off",
+        max_entries: int = 5000,
+        ttl_seconds: int = 86400,
+        agent_ttls: Optional[Dict[str, int]] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid LLM cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.path        = Path(path)
+        self.mode        = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.agent_ttls  = agent_ttls or {}
+        self._lock       = threading.Lock()
+        if self.enabled:
+            self._init_db()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "LLMResponseCache":
+        agent_ttls = {
+            name: agent_cfg["ttl_seconds"]
+            for name, agent_cfg in (cfg.get("agents") or {}).items()
+            if agent_cfg and "ttl_seconds" in agent_cfg
+        }
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", cfg.get("path", ".cache/llm_cache.sqlite")),
+            mode=os.getenv("LLM_CACHE_MODE", cfg.get("mode", "off")),
+            max_entries=int(cfg.get("max_entries", 5000)),
+            ttl_seconds=int(cfg.get("ttl_seconds", 86400)),
+            agent_ttls=agent_ttls,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # The connection's own context manager only commits or rolls back; close it as well
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def _init_db(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key              TEXT PRIMARY KEY,
+                    agent_name       TEXT NOT NULL,
+                    response         TEXT NOT NULL,
+                    created_at       REAL NOT NULL,
+                    expires_at       REAL NOT NULL,
+                    last_accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_accessed_at)")
+
+    def make_key(
+        self,
+        *,
+        agent_name: str,
+        model: str,
+        provider: str,
+        temperature: Optional[float],
+        messages: List[BaseMessage],
+        tools: Optional[list] = None,
+    ) -> str:
+        payload = {
+            "agent_name": agent_name,
+            "model": model,
+            "provider": provider,
+            "temperature": temperature,
+            "tools": _tool_schemas(tools),
+            "messages": [_normalize_message(m) for m in messages],
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            response, expires_at = row
+            # Replay runs must stay deterministic, so expired entries are still served there
+            if expires_at < now and not self.replay:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET last_accessed_at = ? WHERE key = ?", (now, key))
+        return _fresh_message(messages_from_dict([json.loads(response)])[0])
+
+    def put(self, key: str, agent_name: str, message: AIMessage):
+        if self.mode != "read_write":
+            return
+        now = time.time()
+        ttl = self.agent_ttls.get(agent_name, self.ttl_seconds)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO llm_cache (key, agent_name, response, created_at, expires_at, last_accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, agent_name, json.dumps(message_to_dict(message)), now, now + ttl, now),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    """
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_accessed_at ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,),
+                )
+                logger.info(f"Evicted {count - self.max_entries} LLM cache entries")
@@ -1,95 +1,202 @@
+import os
+import asyncio
 import logging
-from state.state import AgentState, WorkflowStatus, Approval
+from langgraph.types import interrupt
+from state.state import AgentState, ApprovalDecision, WorkflowStatus, Approval
+from utils.load_yaml_config import get_workflow_config
+from utils.approval_payload import step_hashes
+from utils.approval_policy import evaluate_policy
+from workflows.speculation import start_speculation, discard_speculation
 
 logger = logging.getLogger(__name__)
 
-def await_initial_approval(state: AgentState) -> AgentState:
+# Response applied when the approval policy (config/approval_policy.yaml) approves a stage
+AUTO_APPROVE = {"action": "approve"}
+
+
+def approvals_mode() -> str:
+    """
+    poll      - block inside the node polling Pub/Sub for the response
+    interrupt - pause the graph at a checkpoint; WorkflowRunner publishes the request and
+                resume() continues the node with the response when it arrives
+    """
+    return os.getenv("APPROVALS_MODE", get_workflow_config("approvals").get("mode", "interrupt"))
+
+
+def _request_approval(state: AgentState, stage: str) -> dict:
+    if approvals_mode() == "interrupt":
+        # On resume the node re-runs from the top and interrupt() returns the response
+        return interrupt({"request_id": state.meta.request_id, "stage": stage, "status": state.meta.status.value})
     from utils.notifications import send_approval_request, get_approval_response
-    logger.info(f"Awaiting initial plan approval for {state.meta.request_id}")
-    
-    if not state.plan.steps:
-        logger.error("No steps in plan")
-        state.meta.status = WorkflowStatus.ERROR
-        return state
-    
-    state.meta.status = WorkflowStatus.WAITING_APPROVAL
-    send_approval_request(state)
-    response = get_approval_response(state)
+    send_approval_request(state, stage)
+    if stage == "initial":
+        start_speculation(state)
+    return get_approval_response(state)
+
+
+async def _arequest_approval(state: AgentState, stage: str) -> dict:
+    if approvals_mode() == "interrupt":
+        return interrupt({"request_id": state.meta.request_id, "stage": stage, "status": state.meta.status.value})
+    from utils.notifications import send_approval_request, aget_approval_response
+    await asyncio.to_thread(send_approval_request, state, stage)
+    if stage == "initial":
+        start_speculation(state)
+    return await aget_approval_response(state)
+
+
+def _waiting(state: AgentState, status: WorkflowStatus) -> AgentState:
+    # Shallow copy with the waiting status, for the approval request and the node's update
+    return state.model_copy(update={"meta": state.meta.model_copy(update={"status": status})})
+
+
+def _update(state: AgentState, status: WorkflowStatus | None = None, approval: dict | None = None) -> dict:
+    """Delta for an approval node: meta (with an optional new status) and approval fields."""
+    meta = {} if status is None else {"status": status}
+    if approval:
+        # A response was applied: remember what the reviewer saw so the next request can show the diff
+        meta["reviewed_steps"] = step_hashes(state.plan)
+    update = {"meta": state.meta.model_copy(update=meta) if meta else state.meta}
+    if approval:
+        update["plan"] = {"approval": approval}
+    return update
+
+
+def _decided(update: dict, decision: ApprovalDecision, response: dict | None) -> dict:
+    """Record the policy decision, with the action it led to, in meta for audit."""
+    decision = decision.model_copy(update={"action": (response or {}).get("action")})
+    meta = update["meta"]
+    update["meta"] = meta.model_copy(update={"approval_decisions": meta.approval_decisions + [decision]})
+    return update
+
+
+def _with_feedback(status: Approval, feedback: str | None) -> dict:
+    return {"status": status, "human_feedback": feedback} if feedback else {"status": status}
+
+
+def _apply_initial_response(state: AgentState, response: dict) -> dict:
     logger.info(f"approval response = {str(response)}")
 
     if not response:
         logger.error("No approval response received")
-        state.meta.status = WorkflowStatus.ERROR
-        return state
+        discard_speculation(state.meta.request_id)
+        return _update(state, WorkflowStatus.ERROR)
     action   = response.get("action")
     feedback = response.get("feedback")
+    if action != "approve":
+        # Code generated speculatively for this plan is only used if it is approved
+        discard_speculation(state.meta.request_id)
     if action == "approve":
-        state.plan.approval.status = Approval.GENERATION_APPROVED
-    elif action == "recreate_plan":
-        state.plan.approval.status = Approval.RECREATE_PLAN
-        if feedback:
-            state.plan.approval.human_feedback = feedback
-    elif action == "reject":
-        state.plan.approval.status = Approval.ENDWORKFLOW
-        state.meta.status = WorkflowStatus.COMPLETE
-    
-    return state
-
-def await_approval(state: AgentState) -> AgentState:
-    from utils.notifications import send_approval_request, get_approval_response
-    
-    logger.info(f"Awaiting generation approval for {state.meta.request_id}")
-    
-    state.meta.status = WorkflowStatus.WAITING_APPROVAL
-    send_approval_request(state)
-    
-    response = get_approval_response(state)
-    
+        return _update(state, approval={"status": Approval.GENERATION_APPROVED})
+    if action == "recreate_plan":
+        return _update(state, approval=_with_feedback(Approval.RECREATE_PLAN, feedback))
+    if action == "reject":
+        return _update(state, WorkflowStatus.COMPLETE, {"status": Approval.ENDWORKFLOW})
+    return _update(state)
+
+
+def _apply_generation_response(state: AgentState, response: dict) -> dict:
     if not response:
         logger.error("No approval response received")
-        state.meta.status = WorkflowStatus.ERROR
-        return state
-    
+        return _update(state, WorkflowStatus.ERROR)
+
     action = response.get("action")
     feedback = response.get("feedback")
-    
+
     if action == "approve":
-        state.plan.approval.status = Approval.EXECUTION_APPROVED
-    elif action == "refine_generation":
-        state.plan.approval.status = Approval.REFINE_GENERATION
-        if feedback:
-            state.plan.approval.human_feedback = feedback
-    elif action == "recreate_plan":
-        state.plan.approval.status = Approval.RECREATE_PLAN
-        if feedback:
-            state.plan.approval.human_feedback = feedback
-    elif action == "reject":
-        state.plan.approval.status = Approval.ENDWORKFLOW
-        state.meta.status = WorkflowStatus.COMPLETE
-    
-    return state
-
-def await_proceed(state: AgentState) -> AgentState:
-    from utils.notifications import send_approval_request, get_approval_response
-    
-    logger.info(f"Awaiting proceed approval for {state.meta.request_id}")
-    
-    state.meta.status = WorkflowStatus.WAITING_PROCEED
-    send_approval_request(state)
-    
-    response = get_approval_response(state)
-    
+        return _update(state, approval={"status": Approval.EXECUTION_APPROVED})
+    if action == "refine_generation":
+        return _update(state, approval=_with_feedback(Approval.REFINE_GENERATION, feedback))
+    if action == "recreate_plan":
+        return _update(state, approval=_with_feedback(Approval.RECREATE_PLAN, feedback))
+    if action == "reject":
+        return _update(state, WorkflowStatus.COMPLETE, {"status": Approval.ENDWORKFLOW})
+    return _update(state)
+
+
+def _apply_proceed_response(state: AgentState, response: dict) -> dict:
     if not response:
         logger.error("No approval response received")
-        state.meta.status = WorkflowStatus.ERROR
-        return state
-    
+        return _update(state, WorkflowStatus.ERROR)
+
     action = response.get("action")
-    
+
     if action == "proceed":
-        state.plan.approval.status = Approval.PROCEED
-    elif action == "reject":
-        state.plan.approval.status = Approval.ENDWORKFLOW
-        state.meta.status = WorkflowStatus.COMPLETE
-    
-    return state
+        return _update(state, approval={"status": Approval.PROCEED})
+    if action == "reject":
+        return _update(state, WorkflowStatus.COMPLETE, {"status": Approval.ENDWORKFLOW})
+    return _update(state)
+
+
+def await_initial_approval(state: AgentState) -> dict:
+    logger.info(f"Awaiting initial plan approval for {state.meta.request_id}")
+
+    if not state.plan.steps:
+        logger.error("No steps in plan")
+        return _update(state, WorkflowStatus.ERROR)
+
+    decision = evaluate_policy(state, "initial")
+    if decision.decision == "auto_approved":
+        response = AUTO_APPROVE
+    else:
+        state = _waiting(state, WorkflowStatus.WAITING_APPROVAL)
+        response = _request_approval(state, "initial")
+    return _decided(_apply_initial_response(state, response), decision, response)
+
+
+def await_approval(state: AgentState) -> dict:
+    logger.info(f"Awaiting generation approval for {state.meta.request_id}")
+
+    decision = evaluate_policy(state, "generation")
+    if decision.decision == "auto_approved":
+        response = AUTO_APPROVE
+    else:
+        state = _waiting(state, WorkflowStatus.WAITING_APPROVAL)
+        response = _request_approval(state, "generation")
+    return _decided(_apply_generation_response(state, response), decision, response)
+
+
+def await_proceed(state: AgentState) -> dict:
+    logger.info(f"Awaiting proceed approval for {state.meta.request_id}")
+
+    state = _waiting(state, WorkflowStatus.WAITING_PROCEED)
+    response = _request_approval(state, "proceed")
+    return _apply_proceed_response(state, response)
+
+
+# Async counterparts: in poll mode the Pub/Sub publish and pull run in worker threads
+# so the event loop can keep driving other workflows while a human reviews.
+
+async def aawait_initial_approval(state: AgentState) -> dict:
+    logger.info(f"Awaiting initial plan approval for {state.meta.request_id}")
+
+    if not state.plan.steps:
+        logger.error("No steps in plan")
+        return _update(state, WorkflowStatus.ERROR)
+
+    decision = evaluate_policy(state, "initial")
+    if decision.decision == "auto_approved":
+        response = AUTO_APPROVE
+    else:
+        state = _waiting(state, WorkflowStatus.WAITING_APPROVAL)
+        response = await _arequest_approval(state, "initial")
+    return _decided(_apply_initial_response(state, response), decision, response)
+
+
+async def aawait_approval(state: AgentState) -> dict:
+    logger.info(f"Awaiting generation approval for {state.meta.request_id}")
+
+    decision = evaluate_policy(state, "generation")
+    if decision.decision == "auto_approved":
+        response = AUTO_APPROVE
+    else:
+        state = _waiting(state, WorkflowStatus.WAITING_APPROVAL)
+        response = await _arequest_approval(state, "generation")
+    return _decided(_apply_generation_response(state, response), decision, response)
+
+
+async def aawait_proceed(state: AgentState) -> dict:
+    logger.info(f"Awaiting proceed approval for {state.meta.request_id}")
+
+    state = _waiting(state, WorkflowStatus.WAITING_PROCEED)
+    response = await _arequest_approval(state, "proceed")
+    return _apply_proceed_response(state, response)
@@ -0,0 +1,125 @@
+"""
+Checkpointer selection for the compiled workflow.
+Backends (workflow_config.yaml `checkpointer.backend`, or CHECKPOINT_BACKEND):
+  - sqlite   : local SQLite file (default, for local runs; not durable on Cloud Run)
+  - postgres : shared Postgres store (CHECKPOINT_DB_URI), needs langgraph-checkpoint-postgres
+  - memory   : in-process only, lost on restart
+  - none     : no checkpointing (approvals must use poll mode)
+"""
+import os
+import enum
+import inspect
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from utils.load_yaml_config import get_workflow_config
+import state.state as state_models
+
+logger = logging.getLogger(__name__)
+
+_CHECKPOINTER = None
+_CHECKPOINTER_LOCK = threading.Lock()
+
+
+def _checkpointer_config() -> dict:
+    cfg = get_workflow_config("checkpointer")
+    return {
+        "backend": os.getenv("CHECKPOINT_BACKEND", cfg.get("backend", "sqlite")),
+        "path": os.getenv("CHECKPOINT_PATH", cfg.get("path", ".cache/checkpoints.sqlite")),
+        "conn_string": os.getenv("CHECKPOINT_DB_URI", cfg.get("conn_string")),
+    }
+
+
+def _serde() -> JsonPlusSerializer:
+    # Allow the state models (and their enums) to be restored from checkpoints
+    allowed = [
+        (state_models.__name__, name)
+        for name, obj in vars(state_models).items()
+        if inspect.isclass(obj) and obj.__module__ == state_models.__name__
+        and issubclass(obj, (BaseModel, enum.Enum))
+    ]
+    return JsonPlusSerializer(allowed_msgpack_modules=allowed)
+
+
+def _build_checkpointer(cfg: dict):
+    backend = cfg["backend"]
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver(serde=_serde())
+    if backend == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        Path(cfg["path"]).parent.mkdir(parents=True, exist_ok=True)
+        return SqliteSaver(sqlite3.connect(cfg["path"], check_same_thread=False), serde=_serde())
+    if backend == "postgres":
+        from psycopg import Connection
+        from psycopg.rows import dict_row
+        from langgraph.checkpoint.postgres import PostgresSaver
+        if not cfg["conn_string"]:
+            raise ValueError("Postgres checkpointer requires CHECKPOINT_DB_URI")
+        conn = Connection.connect(cfg["conn_string"], autocommit=True, prepare_threshold=0, row_factory=dict_row)
+        saver = PostgresSaver(conn, serde=_serde())
+        saver.setup()
+        return saver
+    raise ValueError(f"Unknown checkpointer backend '{backend}'")
+
+
+def is_durable(cfg: dict | None = None) -> bool:
+    """Whether checkpoints outlive this instance: Postgres always, SQLite only off Cloud Run."""
+    backend = (cfg or _checkpointer_config())["backend"]
+    if backend == "postgres":
+        return True
+    # Cloud Run's disk is in-memory and goes away on scale-to-zero or restart
+    return backend == "sqlite" and not os.getenv("K_SERVICE")
+
+
+def require_durable_checkpointer(mode: str):
+    """Refuse to serve interrupt-based approvals whose paused workflows would be lost."""
+    cfg = _checkpointer_config()
+    if mode == "interrupt" and not is_durable(cfg):
+        raise RuntimeError(
+            f"Interrupt-based approvals need a durable checkpointer, not '{cfg['backend']}' on this host; "
+            "set CHECKPOINT_BACKEND=postgres and CHECKPOINT_DB_URI, or APPROVALS_MODE=poll"
+        )
+
+
+def get_checkpointer():
+    """Process-wide checkpointer for the sync workflow (built once)."""
+    global _CHECKPOINTER
+    with _CHECKPOINTER_LOCK:
+        if _CHECKPOINTER is None:
+            cfg = _checkpointer_config()
+            logger.info(f"Using '{cfg['backend']}' workflow checkpointer")
+            _CHECKPOINTER = _build_checkpointer(cfg) or False
+    return _CHECKPOINTER or None
+
+
+@asynccontextmanager
+async def async_checkpointer():
+    """
+    Checkpointer usable from the running event loop. SQLite and Postgres need their
+    async savers (bound to the loop), so those are opened per call; memory is shared.
+    """
+    cfg = _checkpointer_config()
+    backend = cfg["backend"]
+    if backend == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        Path(cfg["path"]).parent.mkdir(parents=True, exist_ok=True)
+        async with aiosqlite.connect(cfg["path"]) as conn:
+            yield AsyncSqliteSaver(conn, serde=_serde())
+    elif backend == "postgres":
+        from psycopg import AsyncConnection
+        from psycopg.rows import dict_row
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        async with await AsyncConnection.connect(
+            cfg["conn_string"], autocommit=True, prepare_threshold=0, row_factory=dict_row
+        ) as conn:
+            yield AsyncPostgresSaver(conn, serde=_serde())
+    else:
+        yield get_checkpointer()
@@ -0,0 +1,117 @@
+"""
+Dry-run cost estimation node (between generate and await_approval).
+Every pending execute_query step with SQL is dry-run; the estimate is attached to the
+step so it travels with the approval request. Invalid SQL and estimates over the
+per-step or per-request bytes budget fail the step, which routes it to the error
+refiner before anything is billed.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from state.state import AgentState, PlanStep, StepType, CallFunction, CostEstimate
+from utils.query_cost import cost_config, dry_run_query, sql_fingerprint, bytes_spent
+
+logger = logging.getLogger(__name__)
+
+
+def _steps_to_estimate(state: AgentState) -> List[PlanStep]:
+    steps = []
+    for step in state.plan.steps:
+        if step.completed or step.step_type != StepType.EXECUTE or step.call_function != CallFunction.EXECUTE_QUERY:
+            continue
+        if not (step.code and step.code.language.lower() == "sql" and step.code.content):
+            continue
+        estimate = step.cost_estimate
+        if estimate and estimate.status == "ok" and estimate.sql_fingerprint == sql_fingerprint(step.code.content):
+            continue  # SQL unchanged since the last estimate
+        steps.append(step)
+    return steps
+
+
+def _is_later_step(state: AgentState, step: PlanStep) -> bool:
+    # Tables this SQL reads may be created by an earlier step that hasn't run yet
+    for s in state.plan.steps:
+        if s.step_id == step.step_id:
+            return False
+        if not s.completed and s.step_type == StepType.EXECUTE:
+            return True
+    return False
+
+
+def _estimate_patch(step: PlanStep, estimate: CostEstimate) -> dict:
+    patch = {"cost_estimate": estimate}
+    if estimate.status in ("invalid", "over_budget"):
+        logger.warning(f"Step {step.step_id} failed cost check: {estimate.error}")
+        patch.update({"failed": True, "error": f"Dry run: {estimate.error}"})
+    return patch
+
+
+def _apply_budgets(state: AgentState, estimates: Dict[str, CostEstimate]) -> Dict[str, dict]:
+    cfg = cost_config()
+    per_step = cfg["max_bytes_billed_per_step"]
+    per_request = cfg["max_bytes_billed_per_request"]
+    remaining = int(per_request) - bytes_spent(state) if per_request else None
+
+    patches = {}
+    for step in state.plan.steps:
+        if step.completed:
+            continue
+        estimate = estimates.get(step.step_id, step.cost_estimate)
+        if estimate is None:
+            continue
+        if estimate.status == "ok" and estimate.bytes_processed is not None:
+            error = None
+            if per_step and estimate.bytes_processed > int(per_step):
+                error = f"Estimated {estimate.bytes_processed} bytes exceeds the per-step limit of {per_step}"
+            elif remaining is not None:
+                remaining -= estimate.bytes_processed
+                if remaining < 0:
+                    error = f"Plan's estimated bytes exceed the per-request limit of {per_request} at this step"
+            if error:
+                estimate = estimate.model_copy(update={"status": "over_budget", "error": error})
+        if step.step_id in estimates or estimate is not step.cost_estimate:
+            patches[step.step_id] = _estimate_patch(step, estimate)
+    return patches
+
+
+def _estimate_update(state: AgentState, estimates: Dict[str, CostEstimate]) -> dict:
+    patches = _apply_budgets(state, estimates)
+    if not patches:
+        return {}
+    total = sum((p["cost_estimate"].bytes_processed or 0) for p in patches.values())
+    logger.info(f"Dry-run estimates for steps {list(estimates)}: {total} bytes")
+    return {"plan": {"step_patches": patches}}
+
+
+def estimate_costs(state: AgentState) -> dict:
+    if not cost_config()["dry_run"]:
+        return {}
+    steps = _steps_to_estimate(state)
+    if not steps:
+        return _estimate_update(state, {})
+    with ThreadPoolExecutor(max_workers=min(cost_config()["max_workers"], len(steps))) as pool:
+        results = pool.map(
+            lambda s: dry_run_query(s.code.content, state.meta.project_id, _is_later_step(state, s)),
+            steps
+        )
+        estimates = {s.step_id: e for s, e in zip(steps, results)}
+    return _estimate_update(state, estimates)
+
+
+async def aestimate_costs(state: AgentState) -> dict:
+    if not cost_config()["dry_run"]:
+        return {}
+    steps = _steps_to_estimate(state)
+    if not steps:
+        return _estimate_update(state, {})
+    semaphore = asyncio.Semaphore(cost_config()["max_workers"])
+
+    async def _run(step):
+        async with semaphore:
+            return await asyncio.to_thread(
+                dry_run_query, step.code.content, state.meta.project_id, _is_later_step(state, step)
+            )
+
+    results = await asyncio.gather(*(_run(s) for s in steps))
+    return _estimate_update(state, {s.step_id: e for s, e in zip(steps, results)})
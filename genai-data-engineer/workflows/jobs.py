@@ -0,0 +1,199 @@
+"""
+Background job execution for the HTTP API.
+/run and /resume enqueue a job and return straight away; a bounded worker pool runs
+WorkflowRunner.run()/resume() and records node-by-node progress events that
+/jobs/<id> and /jobs/<id>/events expose. Jobs live in this process only: after a restart
+their ids are unknown, and a request's progress is read from its checkpoint instead.
+"""
+import uuid
+import logging
+import threading
+from enum import Enum
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterator, Callable
+from workflows.workflow import WorkflowRunner, StaleApprovalResponse, response_matches
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    WAITING_APPROVAL = "WAITING_APPROVAL"
+    COMPLETE = "COMPLETE"
+    ERROR = "ERROR"
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when the job queue is at capacity."""
+
+
+class Job:
+    def __init__(self, request_id: str, kind: str):
+        self.job_id = str(uuid.uuid4())
+        self.request_id = request_id
+        self.kind = kind
+        self.status = JobStatus.QUEUED
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.WAITING_APPROVAL, JobStatus.COMPLETE, JobStatus.ERROR)
+
+    def add_event(self, event: Dict[str, Any]):
+        with self._changed:
+            self.events.append({**event, "at": datetime.utcnow().isoformat()})
+            self.updated_at = datetime.utcnow()
+            self._changed.notify_all()
+
+    def set_status(self, status: JobStatus, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._changed:
+            self.status = status
+            self.result = result if result is not None else self.result
+            self.error = error
+            self.updated_at = datetime.utcnow()
+            self.events.append({"node": "__job__", "status": status.value, "at": self.updated_at.isoformat()})
+            self._changed.notify_all()
+
+    def iter_events(self, start: int = 0, timeout: float = 30.0) -> Iterator[Dict[str, Any]]:
+        """Yield events from index start as they arrive until the job finishes."""
+        index = start
+        while True:
+            with self._changed:
+                if index >= len(self.events) and not self.finished:
+                    if not self._changed.wait(timeout):
+                        yield {"node": "__heartbeat__", "at": datetime.utcnow().isoformat()}
+                        continue
+                pending = self.events[index:]
+                finished = self.finished
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(self.events):
+                return
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.job_id,
+            "request_id": self.request_id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "events": len(self.events),
+            "error": self.error,
+        }
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    def __init__(self, runner: WorkflowRunner, max_workers: int = 4, max_queued: int = 100, max_retained: int = 1000,
+                 on_resume_failed: Optional[Callable[[dict], None]] = None):
+        self.runner = runner
+        self.max_queued = max_queued
+        self.max_retained = max_retained
+        # Called with the response when a resume fails before the workflow consumed it
+        self.on_resume_failed = on_resume_failed
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # request_id -> lock serialising its jobs, and how many of them are queued or running
+        self._request_locks: Dict[str, threading.Lock] = {}
+        self._request_jobs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit_run(self, request_id: str, user_request: Optional[str], project_id: str, plan_path: Optional[str] = None) -> Job:
+        return self._submit(request_id, "run", lambda on_event: self.runner.run(
+            user_request=user_request,
+            request_id=request_id,
+            project_id=project_id,
+            plan_path=plan_path,
+            on_event=on_event
+        ))
+
+    def submit_resume(self, request_id: str, response: dict) -> Job:
+        """
+        Queue a resume with a response for the approval the request is paused on now.
+        Raises StaleApprovalResponse if the response answers any other pause.
+        """
+        pending = self.runner.pending_approval(request_id)
+        if not response_matches(pending, response):
+            raise StaleApprovalResponse(f"Workflow {request_id} is waiting for {pending}, not this response")
+        # The pause this response answers travels with it, so a re-published copy resumes only that pause
+        response = {**response, **pending}
+
+        def target(on_event):
+            try:
+                return self.runner.resume(request_id, response, on_event=on_event)
+            except StaleApprovalResponse:
+                raise
+            except Exception:
+                if self.on_resume_failed is not None and self._still_paused(request_id, response):
+                    self.on_resume_failed(response)
+                raise
+        return self._submit(request_id, "resume", target)
+
+    def _still_paused(self, request_id: str, response: dict) -> bool:
+        """
+        Whether a failed resume left the response unconsumed: the workflow is still paused at the
+        approval it answers. A resume that moved the graph on and failed at the next pause (e.g.
+        publishing that approval request) consumed it. Assume unconsumed if the checkpoint is unreadable.
+        """
+        try:
+            return response_matches(self.runner.pending_approval(request_id), response)
+        except Exception as e:
+            logger.warning(f"Cannot read checkpoint of {request_id} after a failed resume: {e}")
+            return True
+
+    def _submit(self, request_id: str, kind: str, target) -> Job:
+        job = Job(request_id, kind)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == JobStatus.QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({queued} queued)")
+            self._jobs[job.job_id] = job
+            self._request_locks.setdefault(request_id, threading.Lock())
+            self._request_jobs[request_id] = self._request_jobs.get(request_id, 0) + 1
+            self._prune()
+        self._pool.submit(self._execute, job, target)
+        logger.info(f"Queued {kind} job {job.job_id} for request {request_id}")
+        return job
+
+    def _execute(self, job: Job, target):
+        # Jobs for the same request (run, then resumes) never overlap on its checkpoint thread
+        with self._request_locks[job.request_id]:
+            job.set_status(JobStatus.RUNNING)
+            try:
+                result = target(job.add_event)
+                status = JobStatus.WAITING_APPROVAL if result.get("awaiting") else JobStatus.COMPLETE
+                job.set_status(status, result=result)
+            except Exception as e:
+                logger.error(f"Job {job.job_id} for {job.request_id} failed: {e}", exc_info=True)
+                job.set_status(JobStatus.ERROR, error=str(e))
+        self._release(job.request_id)
+
+    def _release(self, request_id: str):
+        # Forget the request's lock once none of its jobs is queued or running
+        with self._lock:
+            self._request_jobs[request_id] -= 1
+            if self._request_jobs[request_id] == 0:
+                del self._request_jobs[request_id]
+                del self._request_locks[request_id]
+
+    def _prune(self):
+        # Drop the oldest finished jobs beyond max_retained
+        excess = len(self._jobs) - self.max_retained
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished][:max(0, excess)]:
+            del self._jobs[job_id]
@@ -1,9 +1,14 @@
 from langgraph.graph import END
 from langchain_core.messages import AIMessage
 from state.state import AgentState, Approval, StepType
+from workflows.scheduler import scheduler_enabled
 
 def get_current_step(state: AgentState):
-    return next((s for s in state.plan.steps if not s.completed and not s.failed), None)
+    return state.plan.current_step()
+
+def _execute_node() -> str:
+    # EXECUTE steps go through the DAG scheduler when it is enabled
+    return "schedule" if scheduler_enabled() else "execute"
 
 def route_after_initial_approval(state: AgentState) -> str:
     status = state.plan.approval.status
@@ -26,7 +31,7 @@ def route_after_approval(state: AgentState) -> str:
             return END
         
         if step.step_type == StepType.EXECUTE:
-            return "execute"
+            return _execute_node()
         if step.step_type == StepType.ANALYZE:
             return "analyze"
         if step.step_type == StepType.AWAIT_PROCEED:
@@ -50,8 +55,8 @@ def route_from_execution(state: AgentState) -> str:
     if isinstance(last_message, AIMessage) and last_message.tool_calls:
         return "tools"
     
-    step = get_current_step(state)
-    if step and step.failed:
+    # get_current_step skips failed steps, so look for them explicitly
+    if state.plan.first_failed_step():
         return "refine"
     
     next_step = get_current_step(state)
@@ -59,7 +64,7 @@ def route_from_execution(state: AgentState) -> str:
         return END
 
     if next_step.step_type == StepType.EXECUTE:
-        return "execute"
+        return _execute_node()
     if next_step.step_type == StepType.ANALYZE:
         return "analyze"
     if next_step.step_type == StepType.AWAIT_PROCEED:
@@ -73,7 +78,7 @@ def route_from_step(state: AgentState) -> str:
         return END
     
     if step.step_type == StepType.EXECUTE:
-        return "execute"
+        return _execute_node()
     if step.step_type == StepType.ANALYZE:
         return "analyze"
     if step.step_type == StepType.AWAIT_PROCEED:
@@ -92,7 +97,7 @@ def route_from_proceed(state: AgentState) -> str:
             return END
         
         if next_step.step_type == StepType.EXECUTE:
-            return "execute"
+            return _execute_node()
         if next_step.step_type == StepType.ANALYZE:
             return "analyze"
         if next_step.step_type == StepType.AWAIT_PROCEED:
@@ -103,4 +108,21 @@ def route_from_proceed(state: AgentState) -> str:
     if status == Approval.ENDWORKFLOW:
         return END
     
-    return END
\ No newline at end of file
+    return END
+
+def route_from_schedule(state: AgentState) -> str:
+    if state.plan.first_failed_step():
+        return "refine"
+    return route_from_step(state)
+
+def route_from_estimate(state: AgentState) -> str:
+    # Steps whose dry run failed (invalid SQL, over budget) are refined before approval
+    if state.plan.first_failed_step():
+        return "refine"
+    return "await_approval"
+
+def route_from_refine(state: AgentState) -> str:
+    # The refiner handles one failed step per pass
+    if state.plan.first_failed_step():
+        return "refine"
+    return "await_approval"
@@ -0,0 +1,94 @@
+"""
+Plan DAG scheduler.
+Runs every ready EXECUTE step concurrently on a bounded pool and fans their
+ExecutionRecords back into state in one update.
+
+A step is ready when it is pending, all of its dependencies are completed and no
+earlier AWAIT_PROCEED step is still pending. Dependencies are depends_on (None means
+"the previous step", which keeps plans without dependency info sequential) plus
+execution_outputs_step_id as an implicit edge.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from state.state import AgentState, PlanStep, StepType
+from agents.executor import execute_step, aexecute_step
+from agents.agent_utils import usage_update
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+
+def scheduler_enabled() -> bool:
+    return bool(get_workflow_config("scheduler").get("enabled", False))
+
+
+def _max_workers() -> int:
+    return int(get_workflow_config("scheduler").get("max_workers", 4))
+
+
+def get_ready_steps(state: AgentState) -> List[PlanStep]:
+    plan = state.plan
+    completed = {s.step_id for s in plan.steps if s.completed}
+    ready = []
+    for step in plan.steps:
+        if step.completed or step.failed:
+            continue
+        if step.step_type == StepType.AWAIT_PROCEED:
+            break  # barrier: nothing after a pending AWAIT_PROCEED may start
+        if step.step_type == StepType.EXECUTE and plan.dependencies(step.step_id) <= completed:
+            ready.append(step)
+    return ready
+
+
+def _steps_to_run(state: AgentState) -> List[PlanStep]:
+    ready = get_ready_steps(state)
+    if ready:
+        return ready
+    # Unsatisfiable dependencies (forward refs, cycles): fall back to plan order
+    current = state.plan.current_step()
+    return [current] if current and current.step_type == StepType.EXECUTE else []
+
+
+def _fan_in(state: AgentState, results: list) -> dict:
+    patches   = {record.step_id: patch for record, patch, _ in results}
+    records   = [record for record, _, _ in results]
+    responses = [r for _, _, step_responses in results for r in step_responses]
+
+    for record in records:
+        logger.info(f"Step {record.step_id} {'completed' if record.success else 'failed'}")
+    return {
+        "execution": {"executions": records},
+        "plan": {"step_patches": patches},
+        "usage": usage_update(*responses),
+    }
+
+
+def schedule_steps(state: AgentState) -> dict:
+    steps = _steps_to_run(state)
+    if not steps:
+        logger.info("Scheduler found no runnable steps")
+        return {}
+    logger.info(f"Scheduler running steps {[s.step_id for s in steps]} concurrently")
+
+    with ThreadPoolExecutor(max_workers=min(_max_workers(), len(steps))) as pool:
+        results = list(pool.map(lambda s: execute_step(state, s, len(steps)), steps))
+    return _fan_in(state, results)
+
+
+async def aschedule_steps(state: AgentState) -> dict:
+    steps = _steps_to_run(state)
+    if not steps:
+        logger.info("Scheduler found no runnable steps")
+        return {}
+    logger.info(f"Scheduler running steps {[s.step_id for s in steps]} concurrently")
+
+    semaphore = asyncio.Semaphore(_max_workers())
+
+    async def _run(step):
+        async with semaphore:
+            return await aexecute_step(state, step, len(steps))
+
+    results = await asyncio.gather(*(_run(s) for s in steps))
+    return _fan_in(state, results)
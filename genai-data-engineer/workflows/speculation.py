@@ -0,0 +1,127 @@
+"""
+Speculative code generation while the initial plan waits for approval.
+With `generator.speculative.enabled`, publishing an initial approval request also starts
+the generator in the background on the plan under review. The result is keyed by
+request_id and a fingerprint of the plan: if the reviewer approves that same plan, the
+generate node uses it (waiting for it if it is still running) instead of calling the
+LLM again; recreate_plan, reject or a changed plan discard it. Speculations are
+in-process, so a workflow resumed in another process simply generates as usual.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from state.state import AgentState
+from agents.generator import generator_agent, agenerator_agent
+from utils.approval_payload import step_hashes
+from utils.load_yaml_config import get_workflow_config
+
+logger = logging.getLogger(__name__)
+
+
+def speculation_config() -> Dict[str, Any]:
+    cfg = get_workflow_config("generator").get("speculative") or {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "max_workers": int(cfg.get("max_workers", 2)),
+        "ttl_seconds": int(cfg.get("ttl_seconds", 3600)),
+    }
+
+
+def plan_fingerprint(state: AgentState) -> str:
+    """Everything the generator's output depends on, besides the approval status."""
+    plan = state.plan
+    key = {
+        "steps": step_hashes(plan),
+        "goal": plan.goal,
+        "feedback": plan.approval.human_feedback,
+        "prompt": state.request.original_prompt,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+_LOCK = threading.Lock()
+_POOL: Optional[ThreadPoolExecutor] = None
+# request_id -> (plan fingerprint, started at, generator delta future)
+_SPECULATIONS: Dict[str, Tuple[str, float, Future]] = {}
+
+
+def _pool() -> ThreadPoolExecutor:
+    # Caller holds _LOCK
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=speculation_config()["max_workers"], thread_name_prefix="speculative-generate")
+    return _POOL
+
+
+def _purge_expired(ttl_seconds: int):
+    # Caller holds _LOCK: drop speculations whose approval never came
+    cutoff = time.monotonic() - ttl_seconds
+    for request_id in [r for r, (_, started, _) in _SPECULATIONS.items() if started < cutoff]:
+        _SPECULATIONS.pop(request_id)[2].cancel()
+
+
+def start_speculation(state: AgentState):
+    """Generate code for the plan awaiting initial approval in the background."""
+    cfg = speculation_config()
+    if not cfg["enabled"]:
+        return
+    request_id, fingerprint = state.meta.request_id, plan_fingerprint(state)
+    with _LOCK:
+        _purge_expired(cfg["ttl_seconds"])
+        current = _SPECULATIONS.get(request_id)
+        if current is not None and current[0] == fingerprint:
+            return
+        if current is not None:
+            current[2].cancel()
+        _SPECULATIONS[request_id] = (fingerprint, time.monotonic(), _pool().submit(generator_agent, state))
+    logger.info(f"Speculatively generating code for {request_id} while the plan is reviewed")
+
+
+def discard_speculation(request_id: str):
+    with _LOCK:
+        current = _SPECULATIONS.pop(request_id, None)
+    if current is not None:
+        current[2].cancel()
+        logger.info(f"Discarded speculative generation for {request_id}")
+
+
+def _take(state: AgentState) -> Optional[Future]:
+    with _LOCK:
+        current = _SPECULATIONS.pop(state.meta.request_id, None)
+    if current is None:
+        return None
+    if current[0] != plan_fingerprint(state) or current[2].cancelled():
+        current[2].cancel()
+        logger.info(f"Speculative generation for {state.meta.request_id} was for another plan; generating again")
+        return None
+    return current[2]
+
+
+def generate(state: AgentState) -> dict:
+    """generate node: the speculative result for this plan if there is one, else the generator."""
+    future = _take(state)
+    if future is not None:
+        try:
+            update = future.result()
+            logger.info(f"Using speculative generation for {state.meta.request_id}")
+            return update
+        except Exception as e:
+            logger.warning(f"Speculative generation for {state.meta.request_id} failed ({e}); generating again")
+    return generator_agent(state)
+
+
+async def agenerate(state: AgentState) -> dict:
+    future = _take(state)
+    if future is not None:
+        try:
+            update = await asyncio.wrap_future(future)
+            logger.info(f"Using speculative generation for {state.meta.request_id}")
+            return update
+        except Exception as e:
+            logger.warning(f"Speculative generation for {state.meta.request_id} failed ({e}); generating again")
+    return await agenerator_agent(state)
@@ -1,59 +1,135 @@
+import asyncio
+import logging
 from datetime import datetime
+from langchain_core.messages import RemoveMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langgraph.prebuilt import ToolNode
-from state.state import AgentState, MetaState, RequestState, PlanState
-from agents.orchestrator import orchestrator_agent
-from agents.generator import generator_agent
-from agents.analyzer import analyzer_agent
-from agents.executor import executor_agent
-from agents.error_refiner import error_refiner_agent
+from langgraph.types import Command
+from state.state import AgentState, MetaState, RequestState, PlanState, WorkflowStatus
+from agents.orchestrator import orchestrator_agent, aorchestrator_agent
+from agents.analyzer import analyzer_agent, aanalyzer_agent
+from agents.executor import executor_agent, aexecutor_agent
+from agents.error_refiner import error_refiner_agent, aerror_refiner_agent
 from utils.tools import AVAILABLE_TOOLS
+from utils_llm.llm import warm_llms
 
 
-from workflows.approval import await_initial_approval, await_approval, await_proceed
+from workflows.approval import (
+    approvals_mode,
+    await_initial_approval,
+    await_approval,
+    await_proceed,
+    aawait_initial_approval,
+    aawait_approval,
+    aawait_proceed,
+)
 from workflows.routing import (
     route_after_initial_approval,
     route_after_approval,
     route_from_execution,
     route_from_step,
     route_from_proceed,
+    route_from_schedule,
+    route_from_estimate,
+    route_from_refine,
 )
+from workflows.scheduler import schedule_steps, aschedule_steps
+from workflows.speculation import generate, agenerate, start_speculation
+from workflows.cost_estimation import estimate_costs, aestimate_costs
+from workflows.checkpointing import get_checkpointer, async_checkpointer
+
+logger = logging.getLogger(__name__)
+
+
+class StaleApprovalResponse(ValueError):
+    """Raised when a response does not answer the approval the workflow is paused on."""
+
 
-def build_workflow() -> StateGraph:
+def response_matches(pending: dict | None, response: dict) -> bool:
+    """
+    Whether an approval response answers the pending approval: same stage and interrupt id.
+    Pub/Sub delivers at least once, so a redelivered response for an earlier pause (or an
+    earlier round of the same stage) must not be applied to the current one.
+    """
+    return (
+        pending is not None
+        and response.get("stage") == pending["stage"]
+        and response.get("interrupt_id") == pending["interrupt_id"]
+    )
+
+
+def _pending(snapshot) -> dict | None:
+    # Stage and interrupt id of the approval a checkpointed snapshot is paused on
+    if not snapshot.interrupts:
+        return None
+    return {"stage": snapshot.interrupts[0].value.get("stage"), "interrupt_id": snapshot.interrupts[0].id}
+
+
+def _check_response(request_id: str, pending: dict | None, response: dict):
+    if pending is None:
+        raise StaleApprovalResponse(f"Workflow {request_id} is not waiting for approval")
+    if not response_matches(pending, response):
+        raise StaleApprovalResponse(
+            f"Response for {response.get('stage')} ({response.get('interrupt_id')}) does not answer "
+            f"{request_id}'s pending {pending['stage']} approval ({pending['interrupt_id']})"
+        )
+
+
+def _node(func, afunc) -> RunnableLambda:
+    # Same node serves workflow.invoke (func) and workflow.ainvoke/astream (afunc)
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+
+def build_workflow(checkpointer=None) -> StateGraph:
 
     graph = StateGraph(AgentState)
-    
-    graph.add_node("initial_plan", orchestrator_agent)
-    graph.add_node("await_initial_approval", await_initial_approval)
-    graph.add_node("generate", generator_agent)
-    graph.add_node("await_approval", await_approval)
-    graph.add_node("await_proceed", await_proceed)
-    graph.add_node("analyze", analyzer_agent)
-    graph.add_node("execute", executor_agent)
-    graph.add_node("tools", ToolNode(AVAILABLE_TOOLS)) 
-    graph.add_node("refine", error_refiner_agent)
-    
+
+    graph.add_node("initial_plan", _node(orchestrator_agent, aorchestrator_agent))
+    graph.add_node("await_initial_approval", _node(await_initial_approval, aawait_initial_approval))
+    graph.add_node("generate", _node(generate, agenerate))
+    graph.add_node("estimate_costs", _node(estimate_costs, aestimate_costs))
+    graph.add_node("await_approval", _node(await_approval, aawait_approval))
+    graph.add_node("await_proceed", _node(await_proceed, aawait_proceed))
+    graph.add_node("analyze", _node(analyzer_agent, aanalyzer_agent))
+    graph.add_node("execute", _node(executor_agent, aexecutor_agent))
+    graph.add_node("tools", ToolNode(AVAILABLE_TOOLS))
+    graph.add_node("schedule", _node(schedule_steps, aschedule_steps))
+    graph.add_node("refine", _node(error_refiner_agent, aerror_refiner_agent))
+
     graph.set_entry_point("initial_plan")
     graph.add_edge("initial_plan", "await_initial_approval")
     graph.add_conditional_edges("await_initial_approval", route_after_initial_approval)
-    graph.add_edge("generate", "await_approval")
+    graph.add_edge("generate", "estimate_costs")
+    graph.add_conditional_edges("estimate_costs", route_from_estimate)
     graph.add_conditional_edges("await_approval", route_after_approval)
     graph.add_conditional_edges("execute", route_from_execution)
     graph.add_edge("tools", "execute")
+    graph.add_conditional_edges("schedule", route_from_schedule)
     graph.add_conditional_edges("analyze", route_from_step)
-    graph.add_edge("refine", "await_approval")
+    graph.add_conditional_edges("refine", route_from_refine)
     graph.add_conditional_edges("await_proceed", route_from_proceed)
-    
-    return graph.compile()
+
+    return graph.compile(checkpointer=checkpointer)
 
 class WorkflowRunner:
+    """
+    Runs workflows on a checkpointed graph, one LangGraph thread per request_id.
+    With interrupt-based approvals a run returns as soon as the graph pauses for a
+    human; the approval request is published then and resume() continues the thread
+    from its checkpoint when the response arrives, so paused workflows hold no compute.
+    """
     def __init__(self, config: dict):
         self.config = config
-        self.workflow = build_workflow()
+        self.checkpointer = get_checkpointer()
+        if self.checkpointer is None and approvals_mode() == "interrupt":
+            raise ValueError("Interrupt-based approvals require a checkpointer; set approvals.mode to 'poll'")
+        self.workflow = build_workflow(self.checkpointer)
+        warm_llms({"executor": AVAILABLE_TOOLS})
 
-    def run(self, user_request: str, request_id: str, project_id: str, plan_path: str | None = None) -> dict:
-        
-        initial_state = AgentState(
+    def _initial_state(self, user_request: str, request_id: str, project_id: str, plan_path: str | None) -> AgentState:
+        return AgentState(
             meta=MetaState(
                 request_id=request_id,
                 project_id=project_id,
@@ -64,18 +140,153 @@ class WorkflowRunner:
             request=RequestState(
                 original_prompt=user_request or "Loaded predefined plan"
             ),
-            plan=PlanState()
+            plan=PlanState(),
+            # messages append via their reducer; a rerun of a finished request starts a fresh history
+            messages=[RemoveMessage(id=REMOVE_ALL_MESSAGES)]
         )
-        
-        result = self.workflow.invoke(initial_state)
+
+    def _thread_config(self, request_id: str) -> dict:
+        return {"configurable": {"thread_id": request_id}}
+
+    def _build_result(self, result) -> dict:
         if isinstance(result, dict):
+            result = {k: v for k, v in result.items() if not k.startswith("__")}
             final_state = AgentState(**result)
         else:
             final_state = result
-        
+
         return {
             "status": final_state.meta.status,
             "plan": final_state.plan.model_dump(mode='json') if final_state.plan else None,
             "execution": final_state.execution.model_dump(mode='json') if final_state.execution else None,
-            "results": final_state.results.model_dump(mode='json') if final_state.results else None
-        }
\ No newline at end of file
+            "results": final_state.results.model_dump(mode='json') if final_state.results else None,
+            "usage": final_state.usage.summary() if final_state.usage else None
+        }
+
+    def _paused_result(self, snapshot) -> dict | None:
+        # Publish the approval request for a graph paused at an approval interrupt
+        if not snapshot.interrupts:
+            return None
+        from utils.notifications import send_approval_request
+        pending = snapshot.interrupts[0].value
+        state = AgentState(**snapshot.values)
+        state.meta.status = WorkflowStatus(pending["status"])
+        send_approval_request(state, pending["stage"], snapshot.interrupts[0].id)
+        if pending["stage"] == "initial":
+            start_speculation(state)
+        logger.info(f"Workflow {state.meta.request_id} paused for {pending['stage']} approval")
+
+        result = self._build_result(state)
+        result["awaiting"] = pending["stage"]
+        result["interrupt_id"] = snapshot.interrupts[0].id
+        return result
+
+    def _check_not_paused(self, workflow, request_id: str):
+        if self.checkpointer is None:
+            return
+        snapshot = workflow.get_state(self._thread_config(request_id))
+        if snapshot.next:
+            raise ValueError(f"Workflow {request_id} is already in progress; use resume()")
+
+    def _progress_event(self, node: str, update) -> dict:
+        # Compact per-node progress record: which state sections the node touched
+        if node == "__interrupt__":
+            return {"node": node, "awaiting": update[0].value.get("stage") if update else None}
+        event = {"node": node, "updated": sorted(update.keys()) if isinstance(update, dict) else []}
+        meta = update.get("meta") if isinstance(update, dict) else None
+        status = getattr(meta, "status", None) or (meta.get("status") if isinstance(meta, dict) else None)
+        if status is not None:
+            event["status"] = getattr(status, "value", status)
+        return event
+
+    def _invoke(self, graph_input, config: dict, on_event=None):
+        """invoke(), or stream() node updates to on_event while running."""
+        if on_event is None:
+            return self.workflow.invoke(graph_input, config)
+        result = None
+        for mode, chunk in self.workflow.stream(graph_input, config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                result = chunk
+                continue
+            for node, update in chunk.items():
+                on_event(self._progress_event(node, update))
+        return result
+
+    def run(self, user_request: str, request_id: str, project_id: str, plan_path: str | None = None, on_event=None) -> dict:
+        self._check_not_paused(self.workflow, request_id)
+        initial_state = self._initial_state(user_request, request_id, project_id, plan_path)
+        config = self._thread_config(request_id)
+        result = self._invoke(initial_state, config, on_event)
+        if self.checkpointer is not None:
+            paused = self._paused_result(self.workflow.get_state(config))
+            if paused:
+                return paused
+        return self._build_result(result)
+
+    def current_state(self, request_id: str) -> AgentState | None:
+        """Latest checkpointed state for a request, if any."""
+        if self.checkpointer is None:
+            return None
+        snapshot = self.workflow.get_state(self._thread_config(request_id))
+        return AgentState(**snapshot.values) if snapshot.values else None
+
+    def awaiting(self, request_id: str) -> str | None:
+        """Approval stage a paused request is waiting on, if any."""
+        if self.checkpointer is None:
+            return None
+        pending = self.pending_approval(request_id)
+        return pending["stage"] if pending else None
+
+    def pending_approval(self, request_id: str) -> dict | None:
+        """Stage and interrupt id of the approval a paused request is waiting on, if any."""
+        if self.checkpointer is None:
+            return None
+        return _pending(self.workflow.get_state(self._thread_config(request_id)))
+
+    def resume(self, request_id: str, response: dict, on_event=None) -> dict:
+        """
+        Continue a paused workflow from its checkpoint with an approval response.
+        Raises StaleApprovalResponse unless the response answers the pending approval.
+        """
+        if self.checkpointer is None:
+            raise ValueError("Resuming workflows requires a checkpointer")
+        config = self._thread_config(request_id)
+        _check_response(request_id, _pending(self.workflow.get_state(config)), response)
+        result = self._invoke(Command(resume=response), config, on_event)
+        return self._paused_result(self.workflow.get_state(config)) or self._build_result(result)
+
+    async def _astream(self, workflow, graph_input, config: dict):
+        result = None
+        async for result in workflow.astream(graph_input, config, stream_mode="values"):
+            logger.debug(f"Workflow {config['configurable']['thread_id']} state updated")
+        return result
+
+    async def arun(self, user_request: str, request_id: str, project_id: str, plan_path: str | None = None) -> dict:
+        """
+        Async counterpart of run(). Nodes use their async implementations, so many
+        workflows can share one event loop while they wait on LLMs, BigQuery, GCS and approvals.
+        """
+        config = self._thread_config(request_id)
+        async with async_checkpointer() as saver:
+            workflow = build_workflow(saver)
+            if saver is not None and (await workflow.aget_state(config)).next:
+                raise ValueError(f"Workflow {request_id} is already in progress; use aresume()")
+            initial_state = self._initial_state(user_request, request_id, project_id, plan_path)
+            result = await self._astream(workflow, initial_state, config)
+            if saver is not None:
+                paused = await asyncio.to_thread(self._paused_result, await workflow.aget_state(config))
+                if paused:
+                    return paused
+        return self._build_result(result)
+
+    async def aresume(self, request_id: str, response: dict) -> dict:
+        """Async counterpart of resume()."""
+        config = self._thread_config(request_id)
+        async with async_checkpointer() as saver:
+            if saver is None:
+                raise ValueError("Resuming workflows requires a checkpointer")
+            workflow = build_workflow(saver)
+            _check_response(request_id, _pending(await workflow.aget_state(config)), response)
+            result = await self._astream(workflow, Command(resume=response), config)
+            paused = await asyncio.to_thread(self._paused_result, await workflow.aget_state(config))
+            return paused or self._build_result(result)
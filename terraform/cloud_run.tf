@@ -24,6 +24,11 @@ resource "google_cloud_run_v2_service" "workflow" {
           cpu    = var.cloud_run_cpu
           memory = var.cloud_run_memory
         }
+        # Instance-based CPU allocation. /run and /resume return 202 and the workflow runs in a
+        # background job; with request-based allocation (cpu_idle = true) the CPU is throttled
+        # once the 202 is sent and the job stalls until another request arrives. The instance
+        # is billed while up, but still scales to zero (min_instance_count = 0) when idle.
+        cpu_idle = false
       }
       
       # Environment variables
@@ -42,10 +47,32 @@ resource "google_cloud_run_v2_service" "workflow" {
         value = google_storage_bucket.workflow_data.name
       }
       
+      env {
+        name  = "BLOB_STORE_URI"
+        value = "gs://${google_storage_bucket.workflow_data.name}/blobs"
+      }
+      
       env {
         name  = "APPROVAL_TIMEOUT_SECONDS"
         value = tostring(var.approval_timeout)
       }
+      
+      # Paused workflows are checkpointed in Postgres: the container disk does not
+      # survive scale-to-zero (the service refuses to start with a non-durable store)
+      env {
+        name  = "CHECKPOINT_BACKEND"
+        value = "postgres"
+      }
+      
+      env {
+        name = "CHECKPOINT_DB_URI"
+        value_source {
+          secret_key_ref {
+            secret  = var.checkpoint_db_uri_secret
+            version = "latest"
+          }
+        }
+      }
     }
     
     timeout = "${var.cloud_run_timeout}s"
@@ -24,8 +24,8 @@ output "approval_request_topic" {
 }
 
 output "approval_response_subscription" {
-  description = "Pub/Sub subscription for approval responses"
-  value       = google_pubsub_subscription.approval_responses_pull.id
+  description = "Pub/Sub subscription for approval responses (push to /resume, or pull for the approval router)"
+  value       = var.approval_push_enabled ? google_pubsub_subscription.approval_responses_push[0].id : google_pubsub_subscription.approval_responses_pull[0].id
 }
 
 output "docker_image_path" {
@@ -27,6 +27,12 @@ resource "google_pubsub_subscription" "approval_requests_pull" {
   
   message_retention_duration = "604800s"  # 7 days
   ack_deadline_seconds       = 600        # 10 minutes for human to respond
+
+  # Back off before redelivering a nacked request (e.g. one the approval CLI could not decode)
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "600s"
+  }
   
   dead_letter_policy {
     dead_letter_topic     = google_pubsub_topic.approval_requests_dlq.id
@@ -64,12 +70,16 @@ resource "google_pubsub_topic" "approval_responses_dlq" {
   }
 }
 
+# Read by the approval router (utils/approval_router.py) when responses are not pushed to /resume.
+# Only one of the pull and push subscriptions exists: an unread pull subscription would grow its
+# backlog without limit, and a router started next to the push would get every response twice.
 resource "google_pubsub_subscription" "approval_responses_pull" {
+  count = var.approval_push_enabled ? 0 : 1
   name  = "approval-responses-pull-${var.environment}"
   topic = google_pubsub_topic.approval_responses.name
   
   message_retention_duration = "604800s"  # 7 days
-  ack_deadline_seconds       = 20         # Workflow polls frequently
+  ack_deadline_seconds       = 20         # Approval router streams and acks on receipt
   
   dead_letter_policy {
     dead_letter_topic     = google_pubsub_topic.approval_responses_dlq.id
@@ -80,7 +90,37 @@ resource "google_pubsub_subscription" "approval_responses_pull" {
     environment = var.environment
     service     = var.service_name
     type        = "pull"
-    purpose     = "workflow-polling"
+    purpose     = "approval-router"
+  }
+}
+
+# Pushes approval responses to the service's /resume endpoint so workflows paused
+# at an approval interrupt continue from their checkpoint without polling
+resource "google_pubsub_subscription" "approval_responses_push" {
+  count = var.approval_push_enabled ? 1 : 0
+  name  = "approval-responses-push-${var.environment}"
+  topic = google_pubsub_topic.approval_responses.name
+
+  message_retention_duration = "604800s"  # 7 days
+  ack_deadline_seconds       = 600        # /resume acks once the job is queued; failed resumes re-publish
+
+  push_config {
+    push_endpoint = "${google_cloud_run_v2_service.workflow.uri}/resume"
+    oidc_token {
+      service_account_email = google_service_account.workflow_runner.email
+    }
+  }
+
+  dead_letter_policy {
+    dead_letter_topic     = google_pubsub_topic.approval_responses_dlq.id
+    max_delivery_attempts = 5
+  }
+
+  labels = {
+    environment = var.environment
+    service     = var.service_name
+    type        = "push"
+    purpose     = "workflow-resume"
   }
 }
 
@@ -97,7 +137,8 @@ resource "google_pubsub_topic_iam_member" "workflow_approval_request_publisher"
 
 # Grant Cloud Run service account permission to subscribe to approval responses
 resource "google_pubsub_subscription_iam_member" "workflow_approval_response_subscriber" {
-  subscription = google_pubsub_subscription.approval_responses_pull.name
+  count        = var.approval_push_enabled ? 0 : 1
+  subscription = google_pubsub_subscription.approval_responses_pull[0].name
   role         = "roles/pubsub.subscriber"
   member       = "serviceAccount:${google_service_account.workflow_runner.email}"
 }
@@ -132,3 +173,23 @@ resource "google_pubsub_topic_iam_member" "human_approval_response_publisher" {
   role   = "roles/pubsub.publisher"
   member = "group:data-approvers@${var.domain}"
 }
+
+# Allow the push subscription to invoke /resume and to mint OIDC tokens for it
+data "google_project" "current" {
+  project_id = var.project_id
+}
+
+resource "google_cloud_run_v2_service_iam_member" "approval_push_invoker" {
+  count    = var.approval_push_enabled ? 1 : 0
+  name     = google_cloud_run_v2_service.workflow.name
+  location = google_cloud_run_v2_service.workflow.location
+  role     = "roles/run.invoker"
+  member   = "serviceAccount:${google_service_account.workflow_runner.email}"
+}
+
+resource "google_service_account_iam_member" "pubsub_token_creator" {
+  count              = var.approval_push_enabled ? 1 : 0
+  service_account_id = google_service_account.workflow_runner.name
+  role               = "roles/iam.serviceAccountTokenCreator"
+  member             = "serviceAccount:service-${data.google_project.current.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
+}
@@ -29,3 +29,10 @@ resource "google_project_iam_member" "workflow_ai_user" {
   role    = "roles/aiplatform.user"
   member  = "serviceAccount:${google_service_account.workflow_runner.email}"
 }
+
+resource "google_secret_manager_secret_iam_member" "workflow_checkpoint_db_uri" {
+  project   = var.project_id
+  secret_id = var.checkpoint_db_uri_secret
+  role      = "roles/secretmanager.secretAccessor"
+  member    = "serviceAccount:${google_service_account.workflow_runner.email}"
+}
@@ -56,3 +56,14 @@ variable "domain" {
   type        = string
   default     = ""
 }
+
+variable "approval_push_enabled" {
+  description = "Push approval responses to /resume (interrupt-based approvals); false creates the pull subscription for the approval router instead"
+  type        = bool
+  default     = true
+}
+
+variable "checkpoint_db_uri_secret" {
+  description = "Secret Manager secret holding the Postgres connection URI for workflow checkpoints"
+  type        = string
+}